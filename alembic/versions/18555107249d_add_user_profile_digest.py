@@ -0,0 +1,28 @@
+"""Add user profile digest
+
+Revision ID: 18555107249d
+Revises: e3f4ffd6f6e7
+Create Date: 2026-10-17 13:05:52.640218
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "18555107249d"
+down_revision: Union[str, None] = "e3f4ffd6f6e7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing rows stay NULL and get their digest on the next sync
+    op.add_column("users", sa.Column("profile_digest", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("users", "profile_digest")
@@ -0,0 +1,34 @@
+"""Add scores leaderboard index
+
+Revision ID: 27f81ae166e0
+Revises: 1d6739ef8856
+Create Date: 2026-10-17 09:12:04.318552
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "27f81ae166e0"
+down_revision: Union[str, None] = "1d6739ef8856"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Partial index so the all-time leaderboard is an index scan over qualified players only.
+    op.create_index(
+        "ix_scores_leaderboard",
+        "scores",
+        [sa.text("score DESC")],
+        postgresql_where=sa.text("total_attempts >= 10"),
+        sqlite_where=sa.text("total_attempts >= 10"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_scores_leaderboard", table_name="scores")
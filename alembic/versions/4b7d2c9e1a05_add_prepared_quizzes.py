@@ -0,0 +1,43 @@
+"""Add prepared quizzes
+
+Revision ID: 4b7d2c9e1a05
+Revises: 18555107249d
+Create Date: 2026-10-17 15:12:08.214731
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4b7d2c9e1a05"
+down_revision: Union[str, None] = "18555107249d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "prepared_quizzes",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("team_id", sa.String(), nullable=False),
+        sa.Column("correct_user_id", sa.String(), nullable=False),
+        sa.Column("option_ids", sa.String(), nullable=False),
+        sa.Column("difficulty", sa.String(), nullable=False),
+        sa.Column("grid_bytes", sa.LargeBinary(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_prepared_quizzes_user", "prepared_quizzes", ["user_id", "created_at"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_prepared_quizzes_user", table_name="prepared_quizzes")
+    op.drop_table("prepared_quizzes")
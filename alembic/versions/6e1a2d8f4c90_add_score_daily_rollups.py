@@ -0,0 +1,48 @@
+"""Add score daily rollups and score history indexes
+
+Revision ID: 6e1a2d8f4c90
+Revises: 9c3e5f1a7b22
+Create Date: 2026-10-17 18:02:41.530218
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "6e1a2d8f4c90"
+down_revision: Union[str, None] = "9c3e5f1a7b22"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_score_history_created_at", "score_history", ["created_at"])
+    op.create_index(
+        "ix_score_history_user_created", "score_history", ["user_id", "created_at"]
+    )
+    op.create_table(
+        "score_daily",
+        sa.Column("team_id", sa.String(), nullable=False),
+        sa.Column("day", sa.DateTime(), nullable=False),
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("score", sa.Integer(), nullable=True),
+        sa.Column("total_attempts", sa.Integer(), nullable=True),
+        sa.Column("correct_attempts", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("team_id", "day", "user_id"),
+    )
+    op.create_index("ix_score_daily_day", "score_daily", ["day"])
+    # Rows are backfilled from score_history by backfill_score_daily() at startup.
+    # Day and week boards now come from score_daily; leaderboard_entries keeps all-time rows.
+    op.execute("DELETE FROM leaderboard_entries WHERE period <> 'all'")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_score_daily_day", table_name="score_daily")
+    op.drop_table("score_daily")
+    op.drop_index("ix_score_history_user_created", table_name="score_history")
+    op.drop_index("ix_score_history_created_at", table_name="score_history")
@@ -0,0 +1,28 @@
+"""Add user DM channel ID
+
+Revision ID: 9c3e5f1a7b22
+Revises: 4b7d2c9e1a05
+Create Date: 2026-10-17 17:31:44.108352
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9c3e5f1a7b22"
+down_revision: Union[str, None] = "4b7d2c9e1a05"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Filled in lazily the first time the bot opens a DM with each user
+    op.add_column("users", sa.Column("dm_channel_id", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("users", "dm_channel_id")
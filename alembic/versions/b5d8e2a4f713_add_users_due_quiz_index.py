@@ -0,0 +1,28 @@
+"""Add users due quiz index
+
+Revision ID: b5d8e2a4f713
+Revises: 6e1a2d8f4c90
+Create Date: 2026-10-17 18:47:19.662034
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b5d8e2a4f713"
+down_revision: Union[str, None] = "6e1a2d8f4c90"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_users_due_quiz", "users", ["opted_in", "next_random_quiz_at", "id"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_due_quiz", table_name="users")
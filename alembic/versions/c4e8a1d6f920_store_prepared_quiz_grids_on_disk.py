@@ -0,0 +1,33 @@
+"""Store prepared quiz grids on disk
+
+Revision ID: c4e8a1d6f920
+Revises: b5d8e2a4f713
+Create Date: 2026-10-17 21:04:51.308417
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4e8a1d6f920"
+down_revision: Union[str, None] = "b5d8e2a4f713"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Prepared quizzes are disposable: a hard-mode quiz that loses its grid here gets it
+    # rendered again when it is sent
+    op.add_column("prepared_quizzes", sa.Column("grid_file", sa.String(), nullable=True))
+    op.drop_column("prepared_quizzes", "grid_bytes")
+
+
+def downgrade() -> None:
+    op.add_column(
+        "prepared_quizzes", sa.Column("grid_bytes", sa.LargeBinary(), nullable=True)
+    )
+    op.drop_column("prepared_quizzes", "grid_file")
@@ -0,0 +1,45 @@
+"""Add leaderboard entries
+
+Revision ID: e3f4ffd6f6e7
+Revises: 27f81ae166e0
+Create Date: 2026-10-17 10:41:27.905113
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e3f4ffd6f6e7"
+down_revision: Union[str, None] = "27f81ae166e0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "leaderboard_entries",
+        sa.Column("team_id", sa.String(), nullable=False),
+        sa.Column("period", sa.String(), nullable=False),
+        sa.Column("period_start", sa.DateTime(), nullable=False),
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("score", sa.Integer(), nullable=True),
+        sa.Column("total_attempts", sa.Integer(), nullable=True),
+        sa.Column("correct_attempts", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("team_id", "period", "period_start", "user_id"),
+    )
+    op.create_index(
+        "ix_leaderboard_entries_rank",
+        "leaderboard_entries",
+        ["team_id", "period", "period_start", sa.text("score DESC")],
+    )
+    # Rows are backfilled from scores/score_history by backfill_leaderboard_entries() at startup.
+
+
+def downgrade() -> None:
+    op.drop_index("ix_leaderboard_entries_rank", table_name="leaderboard_entries")
+    op.drop_table("leaderboard_entries")
@@ -2,13 +2,22 @@ import json
 import logging
 import os
 import secrets
-import threading
 import time
 
 from flask import Flask, jsonify, redirect, request, session
 
+from background import background_tasks
+from cache import (
+    dm_channel_cache,
+    grid_file_cache,
+    leaderboard_cache,
+    workspace_client_cache,
+)
 from database_helpers import (
     add_workspace,
+    backfill_leaderboard_entries,
+    backfill_score_daily,
+    compact_score_history,
     delete_user_score,
     does_workspace_exist,
     get_global_stats,
@@ -23,7 +32,10 @@ from database_helpers import (
     wipe_all_scores,
 )
 from db import engine
-from models import Base
+from history_buffer import score_history_buffer
+from models import Base, get_decrypt_cache_stats
+from quiz_store import prepared_quizzes
+from rate_limiter import interactive_calls, slack_rate_limiter
 
 # Configure logging
 logging.basicConfig(
@@ -55,7 +67,11 @@ last_sync_times = {}
 from slack_sdk.errors import SlackApiError  # noqa: E402
 
 from app_home import publish_home_view  # noqa: E402
-from game_manager import handle_quiz_response, send_quiz_to_user  # noqa: E402
+from game_manager import (  # noqa: E402
+    handle_quiz_response,
+    random_quiz_stats,
+    send_quiz_to_user,
+)
 from leaderboard import get_leaderboard_blocks  # noqa: E402
 from slack_client import (  # noqa: E402
     get_slack_client,
@@ -64,7 +80,7 @@ from slack_client import (  # noqa: E402
     is_user_workspace_admin,
     verify_slack_signature,
 )
-from update_db_schema import add_columns  # noqa: E402
+from update_db_schema import add_columns, add_indexes  # noqa: E402
 from utils import (  # noqa: E402
     extract_user_id_from_text,
     fetch_and_store_single_user,
@@ -75,6 +91,9 @@ from utils import (  # noqa: E402
 with app.app_context():
     Base.metadata.create_all(bind=engine)  # Create all tables associated with the Base metadata
     add_columns()  # Run schema updates (migrations)
+    add_indexes()
+    backfill_leaderboard_entries()  # One-off after upgrading; no-op once populated
+    backfill_score_daily()  # Likewise for the daily score rollups
     # initialize_database()  # Optional: add initial setup logic if needed
     # fetch_and_store_users_for_all_workspaces(update_existing=True)
 
@@ -172,7 +191,37 @@ def index():
     return "FaceSinq is running!"
 
 
+# Bearer token for /metrics; the route is disabled (404) when unset
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Cache and prepared-quiz counters, for tuning cache sizes and TTLs."""
+    if not METRICS_TOKEN:
+        return jsonify({"error": "Not found"}), 404
+    if not secrets.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"
+    ):
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(
+        {
+            "decrypt_cache": get_decrypt_cache_stats(),
+            "leaderboard_cache": leaderboard_cache.stats(),
+            "workspace_client_cache": workspace_client_cache.stats(),
+            "grid_file_cache": grid_file_cache.stats(),
+            "dm_channel_cache": dm_channel_cache.stats(),
+            "prepared_quizzes": prepared_quizzes.stats(),
+            "background_tasks": background_tasks.stats(),
+            "random_quizzes": random_quiz_stats,
+            "slack_rate_limiter": slack_rate_limiter.stats(),
+            "score_history_buffer": score_history_buffer.stats(),
+        }
+    ), 200
+
+
 @app.route("/slack/actions", methods=["POST"])
+@interactive_calls()
 def slack_actions():
     # verify signature
     if not verify_slack_signature(request):
@@ -215,7 +264,19 @@ def slack_actions():
     elif action["action_id"] == "next_quiz":
         # Handle the "Next Quiz" button click
         # Execute in background thread to avoid 3s timeout
-        threading.Thread(target=send_quiz_to_user, args=(user_id, team_id)).start()
+        key = ("send_quiz", user_id)
+        if background_tasks.submit(send_quiz_to_user, user_id, team_id, key=key) is None:
+            if not background_tasks.in_flight(key):
+                # Queue full: keep the button enabled so the user can try again
+                try:
+                    client.chat_postEphemeral(
+                        channel=channel_id,
+                        user=user_id,
+                        text="⏳ FaceSinq is busy right now. Please press *Next Quiz* again in a moment.",
+                    )
+                except SlackApiError as e:
+                    logger.error(f"Error sending busy message: {e.response['error']}")
+                return "", 200
 
         # Modify the original message to disable the "Next Quiz" button
         original_blocks = payload["message"]["blocks"]
@@ -262,7 +323,17 @@ def slack_actions():
             except Exception as e:
                 logger.error(f"Error starting quiz from home thread: {e}")
 
-        threading.Thread(target=start_quiz_wrapper, args=(user_id, team_id)).start()
+        key = ("send_quiz", user_id)
+        if background_tasks.submit(start_quiz_wrapper, user_id, team_id, key=key) is None:
+            if not background_tasks.in_flight(key):
+                # Queue full: App Home has no message to answer in, so DM the user
+                try:
+                    client.chat_postMessage(
+                        channel=user_id,
+                        text="⏳ FaceSinq is busy right now. Please press *Start Quiz* again in a moment.",
+                    )
+                except SlackApiError as e:
+                    logger.error(f"Error sending busy message: {e.response['error']}")
 
         # Refresh Home View (to update potential states or show a "Quiz Sent" message if we added that)
         publish_home_view(user_id, team_id, client)
@@ -297,7 +368,7 @@ def slack_actions():
 
     elif action["action_id"] == "view_leaderboard_home":
         # Open Leaderboard Modal
-        leaderboard_blocks = get_leaderboard_blocks()
+        leaderboard_blocks = get_leaderboard_blocks(team_id)
 
         # Wrap blocks in a modal view
         view = {
@@ -335,6 +406,7 @@ def slack_actions():
 
 
 @app.route("/slack/commands", methods=["POST"])
+@interactive_calls()
 def slack_commands():
 
     # Verify the request signature
@@ -403,7 +475,7 @@ def slack_commands():
                 ), 200
 
             logger.info("Got leaderboard request. Channel: " + channel_id)
-            leaderboard_blocks = get_leaderboard_blocks()
+            leaderboard_blocks = get_leaderboard_blocks(team_id)
             return jsonify(response_type="in_channel", blocks=leaderboard_blocks), 200
         elif text == "sync-users":
             handle_sync_users_command(user_id, team_id)
@@ -490,7 +562,13 @@ def slack_commands():
                 ), 200
 
             # Execute wipe all
-            threading.Thread(target=wipe_all_scores).start()
+            key = ("wipe_all_scores",)
+            if background_tasks.submit(wipe_all_scores, key=key) is None:
+                if background_tasks.in_flight(key):
+                    text = "⚠️ A wipe of all scores is already in progress."
+                else:
+                    text = "⏳ FaceSinq is busy right now, so no scores were wiped. Please try again in a moment."
+                return jsonify(response_type="ephemeral", text=text), 200
             return jsonify(
                 response_type="ephemeral", text="⚠️ Wiping all scores in the background..."
             ), 200
@@ -538,6 +616,7 @@ def slack_commands():
 
 
 @app.route("/slack/events", methods=["POST"])
+@interactive_calls()
 def slack_events():
     # Get the request body and headers
     body = request.get_data()
@@ -671,6 +750,8 @@ scheduler.add_job(
     fetch_and_store_users_for_all_workspaces, "interval", hours=1, kwargs={"update_existing": True}
 )
 scheduler.add_job(process_random_quizzes, "interval", minutes=5)
+scheduler.add_job(compact_score_history, "interval", hours=24)
+scheduler.add_job(prepared_quizzes.prune, "interval", hours=1)
 scheduler.start()
 logger.info("BackgroundScheduler started.")
 
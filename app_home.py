@@ -2,10 +2,11 @@ import logging
 
 from slack_sdk.errors import SlackApiError
 
+from cache import leaderboard_cache
 from database_helpers import (
     get_fun_stats,
     get_global_stats,
-    get_top_scores,
+    get_team_leaderboard,
     get_user,
     get_user_score,
     has_user_opted_in,
@@ -33,8 +34,11 @@ def get_home_view(user_id, team_id):
     # Get Global Stats
     global_stats = get_global_stats()
 
-    # Get Leaderboard (Top 3 for Home View)
-    top_scores = get_top_scores(limit=3)
+    # Get Leaderboard (Top 3 of this workspace for Home View), shared across App Home opens
+    top_scores = leaderboard_cache.get((team_id, "home"))
+    if top_scores is None:
+        top_scores = get_team_leaderboard(team_id, "all", limit=3)
+        leaderboard_cache.set((team_id, "home"), top_scores)
 
     # Hero Section
     blocks = [
@@ -129,7 +133,7 @@ def get_home_view(user_id, team_id):
     blocks.append({"type": "divider"})
 
     # Game Stats Section
-    fun_stats = get_fun_stats()
+    fun_stats = get_fun_stats(team_id)
 
     streak_master_text = "None"
     if "streak_master" in fun_stats:
@@ -0,0 +1,157 @@
+# avatar_cache.py
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+class AvatarCache:
+    """On-disk cache of decoded avatar thumbnails, keyed by image URL.
+
+    Each entry is a raw RGB pixel dump (so reads skip JPEG decoding and resizing) plus a JSON
+    sidecar holding the thumbnail size and the ETag/Last-Modified validators from the CDN.
+    Entries younger than max_age are served without touching the network; older ones are
+    revalidated with a conditional GET by the caller. Total size is capped at max_bytes by
+    evicting the least recently used entries (tracked through file mtimes).
+    """
+
+    def __init__(self, directory, max_bytes, max_age):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._total_bytes = None  # Computed lazily from the directory on first write
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + ".rgb", base + ".json"
+
+    def load(self, url):
+        """Return (image, meta) for a cached URL, or (None, None) on a miss."""
+        pixels_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(pixels_path, "rb") as f:
+                image = Image.frombytes("RGB", tuple(meta["size"]), f.read())
+            os.utime(pixels_path)  # Mark as recently used for LRU eviction
+            return image, meta
+        except FileNotFoundError:
+            return None, None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable avatar cache entry for {url}: {e}")
+            return None, None
+
+    def is_fresh(self, meta):
+        return time.time() - meta.get("fetched_at", 0) < self.max_age
+
+    def store(self, url, image, etag=None, last_modified=None):
+        """Write a thumbnail and its validators, then evict old entries if over budget."""
+        pixels_path, meta_path = self._paths(url)
+        image = image.convert("RGB")
+        meta = {
+            "size": list(image.size),
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+        }
+        pixels = image.tobytes()
+        meta_bytes = json.dumps(meta).encode()
+        with self._lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                if self._total_bytes is None:
+                    self._total_bytes = self._scan_size()
+                # An entry replaced after revalidation must not be counted twice
+                replaced = self._file_size(pixels_path) + self._file_size(meta_path)
+                self._write_atomic(pixels_path, pixels)
+                self._write_atomic(meta_path, meta_bytes)
+            except OSError as e:
+                logger.warning(f"Could not write avatar cache entry for {url}: {e}")
+                self._total_bytes = None  # Recount on the next write
+                return
+
+            self._total_bytes += len(pixels) + len(meta_bytes) - replaced
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    @staticmethod
+    def _file_size(path):
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def touch(self, url):
+        """Record a successful revalidation (HTTP 304) so the entry is fresh again."""
+        _, meta_path = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            meta["fetched_at"] = time.time()
+            self._write_atomic(meta_path, json.dumps(meta).encode())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not refresh avatar cache entry for {url}: {e}")
+
+    def _write_atomic(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _entries(self):
+        """(last used, bytes on disk including the sidecar, pixels path) for every entry."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".rgb"):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                sidecar = self._file_size(path[: -len(".rgb")] + ".json")
+                entries.append((stat.st_mtime, stat.st_size + sidecar, path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Delete least recently used entries until the cache is at 90% of its budget."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            for stale in (path, path[: -len(".rgb")] + ".json"):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            evicted += 1
+        self._total_bytes = total
+        logger.info(f"Evicted {evicted} avatar cache entries ({total} bytes remain).")
+
+
+avatar_cache = AvatarCache(
+    os.environ.get(
+        "AVATAR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "facesinq-avatar-cache")
+    ),
+    max_bytes=int(os.environ.get("AVATAR_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+    max_age=int(os.environ.get("AVATAR_CACHE_MAX_AGE", "86400")),
+)
@@ -0,0 +1,97 @@
+# background.py
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundExecutor:
+    """
+    Shared, bounded thread pool for work that must outlive a Slack request.
+
+    At most max_queue tasks may be queued or running at once, and a task submitted with a
+    key is dropped while another task with the same key is still in flight.
+    """
+
+    def __init__(self, max_workers, max_queue):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.submitted = 0
+        self.started = 0
+        self.rejected = 0
+        self.deduplicated = 0
+        self.failed = 0
+        self.completed = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+        self._pending = 0
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="background"
+        )
+
+    def submit(self, fn, *args, key=None):
+        """Queue fn(*args); returns its Future, or None if the task was dropped."""
+        with self._lock:
+            if key is not None and key in self._in_flight:
+                self.deduplicated += 1
+                logger.info(f"Skipping {fn.__name__}: {key} is already in flight")
+                return None
+            if self._pending >= self.max_queue:
+                self.rejected += 1
+                logger.warning(f"Background queue full ({self.max_queue}); dropping {fn.__name__}")
+                return None
+            self._pending += 1
+            self.submitted += 1
+            if key is not None:
+                self._in_flight.add(key)
+
+        return self._executor.submit(self._run, fn, args, key, time.monotonic())
+
+    def in_flight(self, key):
+        """Whether a task submitted with key is still queued or running."""
+        with self._lock:
+            return key in self._in_flight
+
+    def _run(self, fn, args, key, queued_at):
+        waited = time.monotonic() - queued_at
+        with self._lock:
+            self.started += 1
+            self._queue_wait_total += waited
+            self._queue_wait_max = max(self._queue_wait_max, waited)
+        try:
+            return fn(*args)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            logger.error(f"Background task {fn.__name__} failed: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+                self._in_flight.discard(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "deduplicated": self.deduplicated,
+                "queue_wait_avg": self._queue_wait_total / self.started if self.started else 0.0,
+                "queue_wait_max": self._queue_wait_max,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+            }
+
+
+background_tasks = BackgroundExecutor(
+    max_workers=int(os.environ.get("BACKGROUND_WORKERS", "8")),
+    max_queue=int(os.environ.get("BACKGROUND_MAX_QUEUE", "100")),
+)
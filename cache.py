@@ -0,0 +1,109 @@
+# cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe cache whose entries expire ttl seconds after being stored.
+
+    With maxsize set, at most maxsize entries are kept and the least recently used ones are
+    evicted first, so entries that are never read again cannot accumulate.
+    """
+
+    def __init__(self, ttl, maxsize=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+    def invalidate(self, predicate=None):
+        """Drop every entry whose key matches predicate (all entries when predicate is None)."""
+        with self._lock:
+            if predicate is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "evictions": self.evictions,
+                "ttl": self.ttl,
+            }
+
+
+# Rendered leaderboard blocks keyed by (team_id, view). team_id None is the global leaderboard.
+leaderboard_cache = TTLCache(int(os.environ.get("LEADERBOARD_CACHE_TTL", "60")))
+
+
+def invalidate_leaderboard_cache(team_id=None):
+    """Drop cached leaderboards for team_id (plus the global one), or all when team_id is None."""
+    if team_id is None:
+        leaderboard_cache.invalidate()
+    else:
+        leaderboard_cache.invalidate(lambda key: key[0] in (team_id, None))
+
+
+# Authenticated Slack WebClients keyed by team_id. add_workspace invalidates on token rotation;
+# the TTL bounds staleness when the token is rotated by another process.
+workspace_client_cache = TTLCache(int(os.environ.get("WORKSPACE_CLIENT_CACHE_TTL", "3600")))
+
+
+def invalidate_workspace_client(team_id):
+    workspace_client_cache.invalidate(lambda key: key == team_id)
+
+
+# Slack file IDs of uploaded hard-mode grids keyed by grid_file_key(), so a repeated grid is
+# neither re-rendered nor re-uploaded.
+grid_file_cache = TTLCache(
+    int(os.environ.get("GRID_FILE_CACHE_TTL", "86400")),
+    maxsize=int(os.environ.get("GRID_FILE_CACHE_MAX_ENTRIES", "5000")),
+)
+
+
+def grid_file_key(team_id, options):
+    """Identify a grid by team and its ordered options, including their current avatars."""
+    return (team_id, tuple((option.id, option.image) for option in options))
+
+
+# Bot DM channel IDs keyed by user_id, in front of users.dm_channel_id
+dm_channel_cache = TTLCache(
+    int(os.environ.get("DM_CHANNEL_CACHE_TTL", "86400")),
+    maxsize=int(os.environ.get("DM_CHANNEL_CACHE_MAX_ENTRIES", "10000")),
+)
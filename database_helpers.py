@@ -1,13 +1,38 @@
 # database_helpers.py
 import logging
+from datetime import datetime, timedelta
+from itertools import islice
 
+from sqlalchemy import delete, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
+from cache import invalidate_leaderboard_cache, invalidate_workspace_client
 from db import Session
-from models import QuizSession, Score, ScoreHistory, User, Workspace, decrypt_value
+from history_buffer import score_history_buffer
+from models import (
+    LEADERBOARD_MIN_ATTEMPTS,
+    LeaderboardEntry,
+    PreparedQuiz,
+    QuizSession,
+    Score,
+    ScoreDaily,
+    ScoreHistory,
+    User,
+    Workspace,
+    decrypt_value,
+    profile_digest,
+)
 
 logger = logging.getLogger(__name__)
 
+# leaderboard_entries only holds all-time rows, which share a fixed start; day and week
+# boards are summed from score_daily.
+ALL_TIME_PERIOD_START = datetime(1970, 1, 1)
+# Raw score_history rows older than this are deleted; score_daily keeps their totals.
+SCORE_HISTORY_RETENTION_DAYS = 90
+
 
 def add_workspace(team_id, team_name, access_token):
     """Add a new workspace to the database or update an existing one."""
@@ -23,6 +48,7 @@ def add_workspace(team_id, team_name, access_token):
                 session.add(new_workspace)
 
             session.commit()
+            invalidate_workspace_client(team_id)
         except IntegrityError as e:
             session.rollback()
             logger.error(f"Failed to add/update workspace {team_id}: {str(e)}")
@@ -70,12 +96,6 @@ def does_workspace_exist(team_id):
         return session.query(Workspace).filter_by(id=team_id).one_or_none() is not None
 
 
-def get_user_name(user_id):
-    with Session() as session:
-        user = session.query(User).filter_by(id=user_id).one_or_none()
-        return user.name if user else "Unknown"
-
-
 def has_user_opted_in(user_id):
     session = Session()
     try:
@@ -180,28 +200,153 @@ def get_user(user_id):
         return session.query(User).filter_by(id=user_id).one_or_none()
 
 
+def get_period_start(period, now=None):
+    """Return the UTC start of the leaderboard period containing now."""
+    now = now or datetime.utcnow()
+    start_of_day = datetime(now.year, now.month, now.day)
+    if period == "day":
+        return start_of_day
+    if period == "week":
+        return start_of_day - timedelta(days=now.weekday())  # Monday
+    if period == "all":
+        return ALL_TIME_PERIOD_START
+    raise ValueError(f"Unknown leaderboard period: {period}")
+
+
+def _increment_counters(session, model, key, points, is_correct):
+    """
+    Add one answer to model's score/total_attempts/correct_attempts row for key with a single
+    INSERT ... ON CONFLICT DO UPDATE, so concurrent answers never overwrite each other.
+    """
+    insert = pg_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    table = model.__table__
+    stmt = insert(table).values(
+        **key, score=points, total_attempts=1, correct_attempts=1 if is_correct else 0
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key),
+        set_={
+            "score": table.c.score + stmt.excluded.score,
+            "total_attempts": table.c.total_attempts + 1,
+            "correct_attempts": table.c.correct_attempts + stmt.excluded.correct_attempts,
+        },
+    )
+    session.execute(stmt)
+
+
+def _bump_leaderboard_entries(session, team_id, user_id, points, is_correct, now):
+    """Add one answer to the user's daily rollup and all-time leaderboard row."""
+    daily_key = {"team_id": team_id, "day": get_period_start("day", now), "user_id": user_id}
+    _increment_counters(session, ScoreDaily, daily_key, points, is_correct)
+    all_time_key = {
+        "team_id": team_id,
+        "period": "all",
+        "period_start": ALL_TIME_PERIOD_START,
+        "user_id": user_id,
+    }
+    _increment_counters(session, LeaderboardEntry, all_time_key, points, is_correct)
+
+
+def _add_score(session, user_id, team_id, points, is_correct, now):
+    """
+    Add one answer to the user's score, history and leaderboard rows (no commit).
+
+    With the score history buffer enabled the history row is not written here; it is
+    returned for the caller to hand to score_history_buffer once the commit succeeds.
+    """
+    _increment_counters(session, Score, {"user_id": user_id}, points, is_correct)
+
+    history = {"user_id": user_id, "score": points, "is_correct": is_correct, "created_at": now}
+    if score_history_buffer.enabled:
+        deferred_history = history
+    else:
+        session.add(ScoreHistory(**history))
+        deferred_history = None
+
+    if team_id:
+        _bump_leaderboard_entries(session, team_id, user_id, points, is_correct, now)
+    else:
+        logger.warning(f"User {user_id} not found; leaderboard rows not updated.")
+
+    return deferred_history
+
+
 def update_score(user_id, points, is_correct=False):
-    from datetime import datetime
-
-    with Session() as session:
-        score = session.query(Score).filter(Score.user_id == user_id).one_or_none()
-        if score:
-            score.score += points
-            score.total_attempts += 1
-            if is_correct:
-                score.correct_attempts += 1
-        else:
-            correct_cnt = 1 if is_correct else 0
-            score = Score(
-                user_id=user_id, score=points, total_attempts=1, correct_attempts=correct_cnt
+    with Session() as session:
+        team_id = session.query(User.team_id).filter_by(id=user_id).scalar()
+        history = _add_score(session, user_id, team_id, points, is_correct, datetime.utcnow())
+        session.commit()
+
+    if history:
+        score_history_buffer.add(history)
+    invalidate_leaderboard_cache(team_id)
+
+
+def record_quiz_answer(user_id, selected_user_id, calculate_points):
+    """
+    Score a quiz answer in one transaction.
+
+    Claims the user's quiz session by deleting it (so a double click is only scored once),
+    computes the new streak and points with calculate_points(user, is_correct, now), and
+    writes the streak, score, history and leaderboard rows with a single commit.
+
+    Returns None when there is no active quiz session, otherwise a dict with correct_user_id,
+    is_correct, streak, points and names ({user_id: name} for the player, the correct
+    answer and the selected option).
+    """
+    now = datetime.utcnow()
+    with Session() as session:
+        try:
+            correct_user_id = (
+                session.execute(
+                    delete(QuizSession)
+                    .where(QuizSession.user_id == user_id)
+                    .returning(QuizSession.correct_user_id)
+                    .execution_options(synchronize_session=False)
+                )
+                .scalars()
+                .first()
             )
-            session.add(score)
+            if not correct_user_id:
+                session.rollback()
+                return None
+
+            # The player, the correct answer and the selected option in one query
+            users = {
+                user.id: user
+                for user in session.query(User).filter(
+                    User.id.in_({user_id, correct_user_id, selected_user_id})
+                )
+            }
+            user = users.get(user_id)
+            if user is None:
+                session.rollback()
+                logger.warning(f"User {user_id} not found when recording a quiz answer.")
+                return None
+
+            is_correct = selected_user_id == correct_user_id
+            streak, points = calculate_points(user, is_correct, now)
+            user.current_streak = streak
+            user.last_answered_at = now
+            team_id = user.team_id
+            history = _add_score(session, user_id, team_id, points, is_correct, now)
+            names = {uid: answer_user.name for uid, answer_user in users.items()}
+            session.commit()
+        except SQLAlchemyError as e:
+            session.rollback()
+            logger.error(f"Error recording quiz answer for user {user_id}: {str(e)}")
+            raise
 
-        history = ScoreHistory(
-            user_id=user_id, score=points, is_correct=is_correct, created_at=datetime.utcnow()
-        )
-        session.add(history)
-        session.commit()
+    if history:
+        score_history_buffer.add(history)
+    invalidate_leaderboard_cache(team_id)
+    return {
+        "correct_user_id": correct_user_id,
+        "is_correct": is_correct,
+        "streak": streak,
+        "points": points,
+        "names": names,
+    }
 
 
 def update_user_opt_in(user_id, opt_in):
@@ -281,12 +426,18 @@ def reset_quiz_session(user_id):
 
 def delete_user_score(user_id):
     """Deletes the score, history, and active quiz session for a user."""
+    # Write buffered history first so none of it lands after the delete
+    score_history_buffer.flush()
     with Session() as session:
         try:
             session.query(QuizSession).filter_by(user_id=user_id).delete()
             session.query(Score).filter_by(user_id=user_id).delete()
             session.query(ScoreHistory).filter_by(user_id=user_id).delete()
+            session.query(ScoreDaily).filter_by(user_id=user_id).delete()
+            session.query(LeaderboardEntry).filter_by(user_id=user_id).delete()
+            session.query(PreparedQuiz).filter_by(user_id=user_id).delete()
             session.commit()
+            invalidate_leaderboard_cache()
             logger.info(f"Successfully deleted score and history for user {user_id}.")
             return True
 
@@ -297,10 +448,14 @@ def delete_user_score(user_id):
 
 
 def get_top_scores(limit=10):
-    """Fetch the top scoring users along with their decrypted scores."""
+    """Fetch the top scoring users along with their decrypted scores.
+
+    Threshold, ordering and LIMIT are applied in SQL (served by ix_scores_leaderboard), so only
+    the winning rows are decrypted.
+    """
     with Session() as session:
         try:
-            all_scores = (
+            top_scores = (
                 session.query(
                     User.name_encrypted,
                     User.image_encrypted,
@@ -310,6 +465,9 @@ def get_top_scores(limit=10):
                     Score.correct_attempts,
                 )
                 .join(Score)
+                .filter(Score.total_attempts >= LEADERBOARD_MIN_ATTEMPTS)
+                .order_by(Score.score.desc())
+                .limit(limit)
                 .all()
             )
 
@@ -321,135 +479,346 @@ def get_top_scores(limit=10):
                 total_attempts,
                 current_streak,
                 correct_attempts,
-            ) in all_scores:
-                if total_attempts < 10:
-                    continue
-
+            ) in top_scores:
                 try:
                     name_decrypted = decrypt_value(name_encrypted)
                     image_decrypted = decrypt_value(image_encrypted)
                     percentage = (correct_attempts / total_attempts) * 100
                     processed_scores.append(
-                        {
-                            "name": name_decrypted,
-                            "score": score,
-                            "total_attempts": total_attempts,
-                            "percentage": percentage,
-                            "image_url": image_decrypted,
-                            "current_streak": current_streak,
-                        }
+                        (
+                            name_decrypted,
+                            percentage,
+                            image_decrypted,
+                            score,
+                            total_attempts,
+                            current_streak,
+                        )
                     )
                 except Exception as e:
                     logger.warning(f"Error processing score for user: {str(e)}")
                     continue
 
-            processed_scores.sort(key=lambda x: x["score"], reverse=True)
-            return [
-                (
-                    s["name"],
-                    s["percentage"],
-                    s["image_url"],
-                    s["score"],
-                    s["total_attempts"],
-                    s["current_streak"],
-                )
-                for s in processed_scores[:limit]
-            ]
+            return processed_scores
 
         except SQLAlchemyError as e:
             logger.error(f"Error fetching top scores: {str(e)}")
             return []
 
 
-def get_top_scores_period(start_date, limit=5):
-    """Fetch top scores since a specific date."""
-    from sqlalchemy import case, func
+def get_team_leaderboard(team_id, period, limit=10):
+    """Fetch the top players of one workspace for the current day, week or all time.
+
+    All-time rankings read the precomputed leaderboard_entries rows and require
+    LEADERBOARD_MIN_ATTEMPTS. Day and week rankings sum the workspace's score_daily rows since
+    the period start (at most seven per player). Either way the ranking and LIMIT happen in
+    SQL, and the cost does not depend on the size of score_history.
+    """
+    from sqlalchemy import func
 
+    period_start = get_period_start(period)
     with Session() as session:
         try:
+            if period == "all":
+                ranked = session.query(
+                    LeaderboardEntry.user_id,
+                    LeaderboardEntry.score,
+                    LeaderboardEntry.total_attempts,
+                    LeaderboardEntry.correct_attempts,
+                ).filter(
+                    LeaderboardEntry.team_id == team_id,
+                    LeaderboardEntry.period == period,
+                    LeaderboardEntry.period_start == period_start,
+                    LeaderboardEntry.total_attempts >= LEADERBOARD_MIN_ATTEMPTS,
+                )
+            else:
+                ranked = (
+                    session.query(
+                        ScoreDaily.user_id,
+                        func.sum(ScoreDaily.score).label("score"),
+                        func.sum(ScoreDaily.total_attempts).label("total_attempts"),
+                        func.sum(ScoreDaily.correct_attempts).label("correct_attempts"),
+                    )
+                    .filter(ScoreDaily.team_id == team_id, ScoreDaily.day >= period_start)
+                    .group_by(ScoreDaily.user_id)
+                )
+            ranked = ranked.subquery()
             results = (
                 session.query(
-                    ScoreHistory.user_id,
-                    func.sum(ScoreHistory.score).label("total_score"),
-                    func.count(ScoreHistory.id).label("total_attempts"),
-                    func.sum(case((ScoreHistory.is_correct == True, 1), else_=0)).label(  # noqa: E712
-                        "correct_attempts"
-                    ),
                     User.name_encrypted,
                     User.image_encrypted,
+                    ranked.c.score,
+                    ranked.c.total_attempts,
                     User.current_streak,
+                    ranked.c.correct_attempts,
                 )
-                .join(User)
-                .filter(ScoreHistory.created_at >= start_date)
-                .group_by(
+                .join(User, ranked.c.user_id == User.id)
+                .order_by(ranked.c.score.desc())
+                .limit(limit)
+                .all()
+            )
+
+            processed_scores = []
+            for (
+                name_encrypted,
+                image_encrypted,
+                score,
+                total_attempts,
+                current_streak,
+                correct_attempts,
+            ) in results:
+                try:
+                    percentage = (correct_attempts / total_attempts) * 100
+                    processed_scores.append(
+                        (
+                            decrypt_value(name_encrypted),
+                            percentage,
+                            decrypt_value(image_encrypted),
+                            score,
+                            total_attempts,
+                            current_streak,
+                        )
+                    )
+                except Exception as e:
+                    logger.warning(f"Error processing leaderboard entry: {str(e)}")
+                    continue
+
+            return processed_scores
+
+        except SQLAlchemyError as e:
+            logger.error(f"Error fetching {period} leaderboard for team {team_id}: {str(e)}")
+            return []
+
+
+def backfill_leaderboard_entries():
+    """Populate the all-time leaderboard_entries rows from scores if the table is empty.
+
+    Only needed once after upgrading; update_score keeps the table current afterwards.
+    """
+    with Session() as session:
+        try:
+            if session.query(LeaderboardEntry).first() is not None:
+                return 0
+
+            entries = [
+                LeaderboardEntry(
+                    team_id=team_id,
+                    period="all",
+                    period_start=ALL_TIME_PERIOD_START,
+                    user_id=user_id,
+                    score=score or 0,
+                    total_attempts=total_attempts or 0,
+                    correct_attempts=correct_attempts or 0,
+                )
+                for user_id, team_id, score, total_attempts, correct_attempts in (
+                    session.query(
+                        Score.user_id,
+                        User.team_id,
+                        Score.score,
+                        Score.total_attempts,
+                        Score.correct_attempts,
+                    )
+                    .join(User)
+                    .all()
+                )
+            ]
+            session.add_all(entries)
+            session.commit()
+            logger.info(f"Backfilled {len(entries)} leaderboard entries.")
+            return len(entries)
+        except SQLAlchemyError as e:
+            session.rollback()
+            logger.error(f"Error backfilling leaderboard entries: {str(e)}")
+            return 0
+
+
+def backfill_score_daily():
+    """Populate score_daily from score_history if the table is empty.
+
+    Only needed once after upgrading; update_score keeps the rollups current afterwards.
+    """
+    with Session() as session:
+        try:
+            if session.query(ScoreDaily).first() is not None:
+                return 0
+
+            totals = {}
+            for user_id, team_id, score, is_correct, created_at in (
+                session.query(
                     ScoreHistory.user_id,
+                    User.team_id,
+                    ScoreHistory.score,
+                    ScoreHistory.is_correct,
+                    ScoreHistory.created_at,
+                )
+                .join(User)
+                .yield_per(1000)
+            ):
+                day = get_period_start("day", created_at)
+                total = totals.setdefault((team_id, day, user_id), [0, 0, 0])
+                total[0] += score or 0
+                total[1] += 1
+                total[2] += 1 if is_correct else 0
+
+            session.add_all(
+                ScoreDaily(
+                    team_id=team_id,
+                    day=day,
+                    user_id=user_id,
+                    score=score,
+                    total_attempts=total_attempts,
+                    correct_attempts=correct_attempts,
+                )
+                for (team_id, day, user_id), (score, total_attempts, correct_attempts) in (
+                    totals.items()
+                )
+            )
+            session.commit()
+            logger.info(f"Backfilled {len(totals)} daily score rollups.")
+            return len(totals)
+        except SQLAlchemyError as e:
+            session.rollback()
+            logger.error(f"Error backfilling daily score rollups: {str(e)}")
+            return 0
+
+
+def compact_score_history():
+    """
+    Delete score_history rows from before the SCORE_HISTORY_RETENTION_DAYS window.
+
+    Every answer is added to score_daily when it is recorded, so the deleted rows are
+    already folded into the rollups; only the per-answer detail is lost.
+    """
+    cutoff = get_period_start("day") - timedelta(days=SCORE_HISTORY_RETENTION_DAYS)
+    with Session() as session:
+        try:
+            deleted = (
+                session.query(ScoreHistory)
+                .filter(ScoreHistory.created_at < cutoff)
+                .delete(synchronize_session=False)
+            )
+            session.commit()
+            logger.info(f"Compacted {deleted} score history rows older than {cutoff:%Y-%m-%d}.")
+            return deleted
+        except SQLAlchemyError as e:
+            session.rollback()
+            logger.error(f"Error compacting score history: {str(e)}")
+            return 0
+
+
+def get_top_scores_period(start_date, limit=5):
+    """
+    Fetch top scores since a specific date.
+
+    Whole days are summed from the score_daily rollups. When start_date falls part-way
+    through a day, the rest of that day is read from score_history. Totals are ranked and
+    limited in SQL, so only the winning rows are decrypted.
+    """
+    from sqlalchemy import case, func
+
+    first_day = get_period_start("day", start_date)
+    if first_day < start_date:
+        first_day += timedelta(days=1)
+
+    with Session() as session:
+        try:
+            answers = (
+                session.query(
+                    ScoreDaily.user_id.label("user_id"),
+                    func.sum(ScoreDaily.score).label("score"),
+                    func.sum(ScoreDaily.total_attempts).label("total_attempts"),
+                    func.sum(ScoreDaily.correct_attempts).label("correct_attempts"),
+                )
+                .filter(ScoreDaily.day >= first_day)
+                .group_by(ScoreDaily.user_id)
+            )
+            if first_day > start_date:
+                answers = answers.union_all(
+                    session.query(
+                        ScoreHistory.user_id,
+                        func.sum(ScoreHistory.score),
+                        func.count(ScoreHistory.id),
+                        func.sum(case((ScoreHistory.is_correct == True, 1), else_=0)),  # noqa: E712
+                    )
+                    .filter(
+                        ScoreHistory.created_at >= start_date, ScoreHistory.created_at < first_day
+                    )
+                    .group_by(ScoreHistory.user_id)
+                )
+            answers = answers.subquery()
+            totals = (
+                session.query(
+                    answers.c.user_id,
+                    func.sum(answers.c.score).label("score"),
+                    func.sum(answers.c.total_attempts).label("total_attempts"),
+                    func.sum(answers.c.correct_attempts).label("correct_attempts"),
+                )
+                .group_by(answers.c.user_id)
+                .subquery()
+            )
+            results = (
+                session.query(
                     User.name_encrypted,
                     User.image_encrypted,
+                    totals.c.score,
+                    totals.c.total_attempts,
                     User.current_streak,
+                    totals.c.correct_attempts,
                 )
+                .join(User, totals.c.user_id == User.id)
+                .filter(totals.c.total_attempts >= 1)
+                .order_by(totals.c.score.desc())
+                .limit(limit)
                 .all()
             )
 
             processed_scores = []
             for (
-                user_id,
-                score,
-                total_attempts,
-                correct_attempts,
                 name_encrypted,
                 image_encrypted,
+                score,
+                total_attempts,
                 current_streak,
+                correct_attempts,
             ) in results:
-                if total_attempts < 1:
-                    continue
-
                 try:
-                    name_decrypted = decrypt_value(name_encrypted)
-                    image_decrypted = decrypt_value(image_encrypted)
-                    percentage = (correct_attempts / total_attempts) * 100
+                    percentage = ((correct_attempts or 0) / total_attempts) * 100
                     processed_scores.append(
-                        {
-                            "name": name_decrypted,
-                            "score": score,
-                            "total_attempts": total_attempts,
-                            "percentage": percentage,
-                            "image_url": image_decrypted,
-                            "current_streak": current_streak,
-                        }
+                        (
+                            decrypt_value(name_encrypted),
+                            percentage,
+                            decrypt_value(image_encrypted),
+                            score or 0,
+                            total_attempts,
+                            current_streak,
+                        )
                     )
-                except Exception:
+                except Exception as e:
+                    logger.warning(f"Error processing period score: {str(e)}")
                     continue
 
-            processed_scores.sort(key=lambda x: x["score"], reverse=True)
-            return [
-                (
-                    s["name"],
-                    s["percentage"],
-                    s["image_url"],
-                    s["score"],
-                    s["total_attempts"],
-                    s["current_streak"],
-                )
-                for s in processed_scores[:limit]
-            ]
+            return processed_scores
 
         except SQLAlchemyError as e:
-            logger.error(f"Error fetching period scores: {str(e)}")
+            logger.error(f"Error fetching top scores since {start_date}: {str(e)}")
             return []
 
 
 def add_or_update_user(user_id, name, image, team_id):
-    """Add a new user or update an existing one in the database for a specific team."""
+    """Add a new user or update an existing one in the database for a specific team.
+
+    Rows whose stored profile digest already matches are left untouched.
+    """
     with Session() as session:
         try:
             existing_user = session.query(User).filter_by(id=user_id, team_id=team_id).one_or_none()
             if existing_user:
-                existing_user.name = name
-                existing_user.image = image
+                if existing_user.profile_digest == profile_digest(name, image):
+                    logger.debug(f"Profile for user {user_id} unchanged, skipping update.")
+                    return
+                existing_user.set_profile(name, image)
             else:
                 new_user = User(id=user_id, team_id=team_id, opted_in=False)
-                new_user.name = name
-                new_user.image = image
+                new_user.set_profile(name, image)
                 session.add(new_user)
 
             session.commit()
@@ -461,58 +830,187 @@ def add_or_update_user(user_id, name, image, team_id):
             logger.error(f"Database error while adding/updating user {user_id}: {str(e)}")
 
 
+def sync_team_users(team_id, profiles):
+    """Bulk add/update users of one team from (user_id, name, image) tuples.
+
+    The stored rows for these IDs are loaded in one query and diffed in memory by profile digest;
+    only changed fields are re-encrypted, and all writes go out in a single transaction. Cost is proportional
+    to the batch, so callers can stream a large workspace through it page by page.
+    Returns a dict with the number of added, updated and unchanged users.
+    """
+    counts = {"added": 0, "updated": 0, "unchanged": 0}
+    profiles = {user_id: (name, image) for user_id, name, image in profiles}
+    if not profiles:
+        return counts
+
+    with Session() as session:
+        try:
+            existing = {
+                user.id: user
+                for user in session.query(User).filter(User.id.in_(list(profiles))).all()
+            }
+
+            for user_id, (name, image) in profiles.items():
+                if not name:
+                    # name_encrypted is NOT NULL, and one failed row would roll back the page
+                    logger.error(f"Skipping user {user_id}: profile has no name")
+                    continue
+                user = existing.get(user_id)
+                if user is not None and user.team_id != team_id:
+                    # add_or_update_user fails on these too (IntegrityError on the primary key)
+                    logger.error(f"Skipping user {user_id}: already registered to another team")
+                    continue
+                if user is None:
+                    user = User(id=user_id, team_id=team_id, opted_in=False)
+                    user.set_profile(name, image)
+                    session.add(user)
+                    counts["added"] += 1
+                    continue
+
+                digest = profile_digest(name, image)
+                if user.profile_digest == digest:
+                    counts["unchanged"] += 1
+                    continue
+
+                # Digest missing (row predates it) or stale: compare plaintexts field by field
+                changed = False
+                if user.name != name:
+                    user.name = name
+                    changed = True
+                if user.image != (image or None):
+                    user.image = image
+                    changed = True
+                user.profile_digest = digest
+                counts["updated" if changed else "unchanged"] += 1
+
+            session.commit()
+        except SQLAlchemyError as e:
+            session.rollback()
+            logger.error(f"Database error while syncing users for team {team_id}: {str(e)}")
+            return {"added": 0, "updated": 0, "unchanged": 0}
+
+    logger.info(
+        f"Synced users for team {team_id}: {counts['added']} added, "
+        f"{counts['updated']} updated, {counts['unchanged']} unchanged"
+    )
+    return counts
+
+
 def does_user_exist(team_id):
     """Check if users already exist in the database for a specific team."""
     with Session() as session:
         return session.query(User).filter_by(team_id=team_id).count() > 0
 
 
-def get_users_due_for_quiz():
-    """Fetch users who are opted in and due for a random quiz."""
-    from datetime import datetime
-
-    with Session() as session:
-        now = datetime.utcnow()
-        return (
-            session.query(User)
-            .filter(
-                User.opted_in == True,  # noqa: E712
-                (User.next_random_quiz_at == None) | (User.next_random_quiz_at <= now),  # noqa: E711
-            )
-            .all()
+def iter_users_due_for_quiz(batch_size=500, now=None):
+    """
+    Yield (user_id, team_id) for every opted-in user due for a random quiz.
+
+    Users who were never scheduled come first, then the rest by next_random_quiz_at. Pages
+    of batch_size rows are keyed on the last row seen instead of OFFSET, and each page is a
+    range scan of ix_users_due_quiz, so the cost follows the number of due users rather
+    than the size of the users table.
+    """
+    now = now or datetime.utcnow()
+    opted_in = User.opted_in == True  # noqa: E712
+
+    last_id = None
+    while True:
+        query = select(User.id, User.team_id).where(opted_in, User.next_random_quiz_at == None)  # noqa: E711
+        if last_id is not None:
+            query = query.where(User.id > last_id)
+        with Session() as session:
+            rows = session.execute(query.order_by(User.id).limit(batch_size)).all()
+        yield from ((user_id, team_id) for user_id, team_id in rows)
+        if len(rows) < batch_size:
+            break
+        last_id = rows[-1][0]
+
+    last_key = None
+    while True:
+        query = select(User.id, User.team_id, User.next_random_quiz_at).where(
+            opted_in, User.next_random_quiz_at <= now
         )
+        if last_key is not None:
+            query = query.where(tuple_(User.next_random_quiz_at, User.id) > last_key)
+        with Session() as session:
+            rows = session.execute(
+                query.order_by(User.next_random_quiz_at, User.id).limit(batch_size)
+            ).all()
+        yield from ((user_id, team_id) for user_id, team_id, _ in rows)
+        if len(rows) < batch_size:
+            break
+        last_key = (rows[-1][2], rows[-1][0])
+
+
+def claim_users_due_for_quiz(limit, lease_until):
+    """
+    Atomically claim up to `limit` opted-in users due for a random quiz.
+
+    Candidates come from the first page of iter_users_due_for_quiz. A single
+    UPDATE ... RETURNING then pushes their next_random_quiz_at to lease_until, re-checking
+    that they are still due, so overlapping ticks and other workers skip them. Returns
+    (user_id, team_id) tuples.
+    """
+    now = datetime.utcnow()
+    candidates = [user_id for user_id, _ in islice(iter_users_due_for_quiz(limit, now), limit)]
+    if not candidates:
+        return []
+    with Session() as session:
+        try:
+            rows = session.execute(
+                update(User)
+                .where(
+                    User.id.in_(candidates),
+                    User.opted_in == True,  # noqa: E712
+                    (User.next_random_quiz_at == None) | (User.next_random_quiz_at <= now),  # noqa: E711
+                )
+                .values(next_random_quiz_at=lease_until, last_quiz_sent_at=now)
+                .returning(User.id, User.team_id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            session.commit()
+            return [(user_id, team_id) for user_id, team_id in rows]
+        except SQLAlchemyError as e:
+            session.rollback()
+            logger.error(f"Error claiming users due for a random quiz: {str(e)}")
+            return []
 
 
-def update_user_quiz_schedule(user_id, next_quiz_at):
-    """Update the next scheduled quiz time for a user."""
-    from datetime import datetime
-
+def schedule_next_random_quizzes(next_quiz_times):
+    """Set next_random_quiz_at for many users at once, from a {user_id: datetime} dict."""
+    if not next_quiz_times:
+        return
     with Session() as session:
         try:
-            user = session.query(User).filter_by(id=user_id).one_or_none()
-            if user:
-                user.last_quiz_sent_at = datetime.utcnow()
-                user.next_random_quiz_at = next_quiz_at
-                session.commit()
+            session.execute(
+                update(User),
+                [
+                    {"id": user_id, "next_random_quiz_at": next_quiz_at}
+                    for user_id, next_quiz_at in next_quiz_times.items()
+                ],
+            )
+            session.commit()
         except SQLAlchemyError as e:
             session.rollback()
-            logger.error(f"Error updating quiz schedule for user {user_id}: {str(e)}")
+            logger.error(f"Error scheduling next random quizzes: {str(e)}")
+
+
+def get_dm_channel_id(user_id):
+    """Return the stored DM channel ID for a user, or None."""
+    with Session() as session:
+        return session.query(User.dm_channel_id).filter(User.id == user_id).scalar()
 
 
-def update_user_streak(user_id, streak, last_answered_at):
-    """Update the user's current streak and last answered time."""
+def set_dm_channel_id(user_id, channel_id):
+    """Store (or clear, with None) the DM channel ID for a user."""
     with Session() as session:
         try:
-            user = session.query(User).filter_by(id=user_id).one_or_none()
-            if user:
-                user.current_streak = streak
-                user.last_answered_at = last_answered_at
-                session.commit()
-            else:
-                logger.warning(f"User {user_id} not found when updating streak.")
+            session.query(User).filter(User.id == user_id).update({User.dm_channel_id: channel_id})
+            session.commit()
         except SQLAlchemyError as e:
             session.rollback()
-            logger.error(f"Error updating streak for user {user_id}: {str(e)}")
+            logger.error(f"Error storing DM channel for user {user_id}: {str(e)}")
 
 
 def update_user_difficulty_mode(user_id, mode):
@@ -521,6 +1019,9 @@ def update_user_difficulty_mode(user_id, mode):
         try:
             user = session.query(User).filter_by(id=user_id).one_or_none()
             if user:
+                if user.difficulty_mode != mode:
+                    # Prepared quizzes were built for the old mode (grid or no grid)
+                    session.query(PreparedQuiz).filter_by(user_id=user_id).delete()
                 user.difficulty_mode = mode
                 session.commit()
                 return True
@@ -533,13 +1034,13 @@ def update_user_difficulty_mode(user_id, mode):
             return False
 
 
-def get_fun_stats():
-    """Fetch fun statistics like Streak Master and Most Dedicated player."""
+def get_fun_stats(team_id):
+    """Fetch fun statistics like Streak Master and Most Dedicated player of one workspace."""
     with Session() as session:
         try:
             streak_master = (
                 session.query(User)
-                .filter(User.current_streak > 0)
+                .filter(User.team_id == team_id, User.current_streak > 0)
                 .order_by(User.current_streak.desc())
                 .first()
             )
@@ -547,7 +1048,7 @@ def get_fun_stats():
             most_dedicated = (
                 session.query(User.name_encrypted, Score.total_attempts)
                 .join(Score)
-                .filter(Score.total_attempts > 0)
+                .filter(User.team_id == team_id, Score.total_attempts > 0)
                 .order_by(Score.total_attempts.desc())
                 .first()
             )
@@ -567,19 +1068,23 @@ def get_fun_stats():
             return stats
 
         except SQLAlchemyError as e:
-            logger.error(f"Error fetching fun stats: {str(e)}")
+            logger.error(f"Error fetching fun stats for team {team_id}: {str(e)}")
             return {}
 
 
 def wipe_all_scores():
     """Wipes all scores, history, and streaks for all users."""
+    score_history_buffer.flush()
     with Session() as session:
         try:
             session.query(Score).delete()
             session.query(ScoreHistory).delete()
+            session.query(ScoreDaily).delete()
+            session.query(LeaderboardEntry).delete()
             session.query(QuizSession).delete()
             session.query(User).update({User.current_streak: 0, User.last_answered_at: None})
             session.commit()
+            invalidate_leaderboard_cache()
             logger.info("Successfully wiped all scores and reset streaks.")
             return True
         except SQLAlchemyError as e:
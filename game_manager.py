@@ -1,33 +1,55 @@
 # game_manager.py
 import logging
+import os
 import random
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 
 from slack_sdk.errors import SlackApiError
+from sqlalchemy.exc import SQLAlchemyError
 
+from background import background_tasks
+from cache import dm_channel_cache, grid_file_cache, grid_file_key
 from database_helpers import (
     create_or_update_quiz_session,
     delete_quiz_session,
     get_active_quiz_session,
     get_colleagues_excluding_user,
+    get_dm_channel_id,
     get_user,
-    get_user_name,
-    update_score,
+    record_quiz_answer,
+    set_dm_channel_id,
 )
 from image_utils import generate_grid_image_bytes
+from quiz_store import prepared_quizzes
 from slack_client import get_slack_client
 
 logger = logging.getLogger(__name__)
 
-# Cache to store pre-generated quizzes: {user_id: quiz_data}
-# quiz_data = {
-#   'correct_choice': User object,
-#   'options': [User objects,...],
-#   'uploaded_file_id': str (optional),
-#   'difficulty': str
-# }
-PENDING_QUIZZES = {}
+# Random-quiz dispatch: users are claimed in batches and sent on a bounded pool, with at most
+# RANDOM_QUIZ_TEAM_CONCURRENCY concurrent sends per workspace.
+RANDOM_QUIZ_BATCH_SIZE = int(os.environ.get("RANDOM_QUIZ_BATCH_SIZE", "100"))
+RANDOM_QUIZ_WORKERS = int(os.environ.get("RANDOM_QUIZ_WORKERS", "8"))
+RANDOM_QUIZ_TEAM_CONCURRENCY = int(os.environ.get("RANDOM_QUIZ_TEAM_CONCURRENCY", "2"))
+# Stop claiming new batches after this many seconds, so 5-minute ticks do not overlap
+RANDOM_QUIZ_TICK_BUDGET = float(os.environ.get("RANDOM_QUIZ_TICK_BUDGET", "240"))
+# Claimed users are not due again for this long, even if the tick dies before rescheduling
+RANDOM_QUIZ_CLAIM_LEASE = timedelta(minutes=30)
+
+# Kept apart from background_tasks on purpose: that queue is bounded, deduplicated and
+# rejects work when full, which would silently drop claimed users, and a 100-user batch
+# would fill it and turn away interactive Next Quiz presses for the whole tick.
+_dispatch_executor = ThreadPoolExecutor(
+    max_workers=RANDOM_QUIZ_WORKERS, thread_name_prefix="random-quiz"
+)
+_team_slots = {}
+_team_slots_lock = threading.Lock()
+
+# Throughput of the most recent process_random_quizzes tick, for /metrics
+random_quiz_stats = {}
 
 
 def generate_quiz_data(user_id, team_id):
@@ -62,30 +84,32 @@ def generate_quiz_data(user_id, team_id):
     # Pre-generate grids for Hard Mode (Bytes only)
     grid_bytes = None
     if difficulty == "hard":
-        # Hard Mode: Pre-generate the grid
-        image_urls = [opt.image for opt in options]
-        grid_bytes = generate_grid_image_bytes(image_urls)
+        # Hard Mode: an identical grid that was already uploaded is reused at send time,
+        # so only pre-generate when there is none
+        if not grid_file_cache.get(grid_file_key(team_id, options)):
+            image_urls = [opt.image for opt in options]
+            grid_bytes = generate_grid_image_bytes(image_urls)
 
     return {
         "correct_choice": correct_choice,
         "options": options,
-        "uploaded_file_id": None,
-        "uploaded_file_url": None,
         "grid_bytes": grid_bytes,
         "difficulty": difficulty,
     }
 
 
 def prepare_next_quiz(user_id, team_id):
-    """Background task to generate the next quiz and store it in cache."""
+    """Background task to top up the user's prepared quizzes in the quiz store."""
     try:
-        logger.info(f"Preparing next quiz for user {user_id}...")
-        quiz_data = generate_quiz_data(user_id, team_id)
-        if quiz_data:
-            PENDING_QUIZZES[user_id] = quiz_data
-            logger.info(f"Next quiz prepared and cached for user {user_id}.")
-        else:
-            logger.warning(f"Failed to prepare next quiz for {user_id} (insufficient data?)")
+        missing = prepared_quizzes.per_user - prepared_quizzes.count(user_id)
+        for _ in range(missing):
+            logger.info(f"Preparing next quiz for user {user_id}...")
+            quiz_data = generate_quiz_data(user_id, team_id)
+            if not quiz_data:
+                logger.warning(f"Failed to prepare next quiz for {user_id} (insufficient data?)")
+                return
+            prepared_quizzes.push(user_id, team_id, quiz_data)
+            logger.info(f"Next quiz prepared and stored for user {user_id}.")
     except Exception as e:
         logger.error(f"Error preparing next quiz for {user_id}: {e}")
 
@@ -108,10 +132,10 @@ def send_quiz_to_user(user_id, team_id):
         return False, "You already have an active quiz!"
 
     # 1. Retrieve or Generate Quiz Data
-    quiz_data = PENDING_QUIZZES.pop(user_id, None)
+    quiz_data = prepared_quizzes.pop(user_id)
 
     if quiz_data:
-        logger.info(f"Using cached quiz for user {user_id}!")
+        logger.info(f"Using prepared quiz for user {user_id}!")
     else:
         logger.info(f"No cached quiz for user {user_id}. Generating on the fly...")
         quiz_data = generate_quiz_data(user_id, team_id)
@@ -131,6 +155,78 @@ def send_quiz_to_user(user_id, team_id):
 
     # 3. Construct Wrapper Blocks (Question + Buttons)
     # Note: For Hard Mode, the Image Grid is sent as a separate file upload message!
+    blocks = build_quiz_blocks(difficulty, correct_choice, options)
+
+    # Note: We do NOT adding the 'Next Quiz' button yet. It appears after answering.
+
+    # 4. Send Message (Upload + Blocks)
+    try:
+        # Hard Mode: upload the grid privately and show it in the quiz message itself,
+        # so it always appears above the buttons without waiting for a channel share.
+        grid_file_id = None
+        grid_key = grid_file_key(team_id, options)
+        if difficulty == "hard":
+            grid_file_id = grid_file_cache.get(grid_key)
+            if not grid_file_id:
+                if grid_bytes is None:
+                    # Prepared against a cached upload that has since expired
+                    grid_bytes = generate_grid_image_bytes([opt.image for opt in options])
+                if grid_bytes:
+                    grid_file_id = upload_grid_file(client, grid_bytes)
+                if grid_file_id:
+                    grid_file_cache.set(grid_key, grid_file_id)
+
+        import json
+
+        logger.info(f"Sending quiz blocks: {json.dumps(blocks)}")
+
+        if difficulty == "hard" and not grid_file_id and not grid_bytes:
+            # Without a grid the numbered Hard Mode buttons cannot be answered
+            logger.warning(f"No grid for {user_id}'s Hard Mode quiz; sending it in Easy Mode")
+            blocks = build_quiz_blocks("easy", correct_choice, options)
+
+        if grid_file_id:
+            try:
+                response = post_dm_message(
+                    client,
+                    user_id,
+                    text="Time for a quiz!",
+                    blocks=[blocks[0], grid_image_block(grid_file_id)] + blocks[1:],
+                )
+            except SlackApiError as e:
+                logger.error(f"Failed to post quiz with embedded grid, sharing it instead: {e}")
+                grid_file_cache.invalidate(lambda key: key == grid_key)
+                if grid_bytes is None:
+                    grid_bytes = generate_grid_image_bytes([opt.image for opt in options])
+                if grid_bytes:
+                    share_grid_file(client, get_dm_channel(client, user_id), grid_bytes)
+                else:
+                    blocks = build_quiz_blocks("easy", correct_choice, options)
+                response = post_dm_message(client, user_id, text="Time for a quiz!", blocks=blocks)
+        else:
+            if difficulty == "hard" and grid_bytes:
+                share_grid_file(client, get_dm_channel(client, user_id), grid_bytes)
+            response = post_dm_message(client, user_id, text="Time for a quiz!", blocks=blocks)
+        logger.info(f"Quiz sent to user {user_id}, ts: {response['ts']}")
+
+        # 5. TRIGGER BACKGROUND PREPARATION FOR NEXT QUIZ
+        background_tasks.submit(prepare_next_quiz, user_id, team_id, key=("prepare_quiz", user_id))
+
+        return True, "Quiz sent!"
+
+    except Exception as e:
+        logger.error(f"Error sending quiz to {user_id}: {e}")
+        # CRITICAL: Clean up the session if sending failed so user isn't stuck
+        delete_quiz_session(user_id)
+        return False, "An error occurred while sending the quiz."
+    except SlackApiError as e:
+        logger.error(f"Error sending quiz to {user_id}: {e.response['error']}")
+        delete_quiz_session(user_id)  # Ensure cleanup here too
+        return False, f"Error: {e.response['error']}"
+
+
+def build_quiz_blocks(difficulty, correct_choice, options):
+    """Question and answer-button blocks for a quiz; Hard Mode's grid is added separately."""
     if difficulty == "hard":
         blocks = [
             {
@@ -184,79 +280,156 @@ def send_quiz_to_user(user_id, team_id):
                 }
             )
 
-    # Note: We do NOT adding the 'Next Quiz' button yet. It appears after answering.
+    return blocks
 
-    # 4. Send Message (Upload + Blocks)
-    try:
-        # Open DM Channel
-        resp = client.conversations_open(users=[user_id])
-        channel_id = resp["channel"]["id"]
 
-        # If Hard Mode and we have bytes, upload directly to the channel
-        if difficulty == "hard" and grid_bytes:
-            try:
-                logger.info(f"Uploading 2x2 grid directly to channel {channel_id}...")
-                client.files_upload_v2(
-                    channel=channel_id,  # Post directly to channel
-                    file=grid_bytes,
-                    filename="quiz_2x2.jpg",
-                    title="Who is this?",
-                    initial_comment="🧠 *Hard Mode Grid*",  # Optional context
-                )
-                time.sleep(2)  # Ensure image appears before blocks
-            except SlackApiError as e:
-                logger.error(f"Failed to upload grid image: {e}")
-                # We continue to send the blocks, user will see error there or missing image.
-                # Maybe fallback blocks?
-                pass
-            except Exception as e:
-                logger.error(f"Unexpected error uploading grid image: {e}")
-                pass
+def grid_image_block(file_id):
+    """Image block showing an uploaded grid file inside a message."""
+    return {
+        "type": "image",
+        "slack_file": {"id": file_id},
+        "alt_text": "Four colleagues, numbered 1 to 4",
+    }
 
-        import json
 
-        logger.info(f"Sending quiz blocks: {json.dumps(blocks)}")
+def upload_grid_file(client, grid_bytes):
+    """Upload the grid without sharing it anywhere; returns the Slack file ID or None."""
+    try:
+        response = client.files_upload_v2(
+            file=grid_bytes, filename="quiz_2x2.jpg", title="Who is this?"
+        )
+        return response["file"]["id"]
+    except SlackApiError as e:
+        logger.error(f"Failed to upload grid image: {e}")
+    except Exception as e:
+        logger.error(f"Unexpected error uploading grid image: {e}")
+    return None
+
 
-        response = client.chat_postMessage(
-            channel=channel_id, text="Time for a quiz!", blocks=blocks
+def share_grid_file(client, channel_id, grid_bytes):
+    """Fallback: post the grid to the channel as a file message of its own."""
+    try:
+        logger.info(f"Uploading 2x2 grid directly to channel {channel_id}...")
+        client.files_upload_v2(
+            channel=channel_id,
+            file=grid_bytes,
+            filename="quiz_2x2.jpg",
+            title="Who is this?",
+            initial_comment="🧠 *Hard Mode Grid*",
         )
-        logger.info(f"Quiz sent to user {user_id}, ts: {response['ts']}")
+    except SlackApiError as e:
+        # We continue to send the blocks, user will see a missing image.
+        logger.error(f"Failed to upload grid image: {e}")
+    except Exception as e:
+        logger.error(f"Unexpected error uploading grid image: {e}")
 
-        # 5. TRIGGER BACKGROUND PREPARATION FOR NEXT QUIZ
-        threading.Thread(target=prepare_next_quiz, args=(user_id, team_id)).start()
 
-        return True, "Quiz sent!"
+def get_dm_channel(client, user_id, refresh=False):
+    """
+    Return the bot's DM channel ID with user_id: from memory, then the users table,
+    and only on a miss (or with refresh) from conversations_open.
+    """
+    if not refresh:
+        channel_id = dm_channel_cache.get(user_id) or get_dm_channel_id(user_id)
+        if channel_id:
+            dm_channel_cache.set(user_id, channel_id)
+            return channel_id
 
-    except Exception as e:
-        logger.error(f"Error sending quiz to {user_id}: {e}")
-        # CRITICAL: Clean up the session if sending failed so user isn't stuck
-        delete_quiz_session(user_id)
-        return False, "An error occurred while sending the quiz."
+    response = client.conversations_open(users=[user_id])
+    channel_id = response["channel"]["id"]
+    dm_channel_cache.set(user_id, channel_id)
+    set_dm_channel_id(user_id, channel_id)
+    return channel_id
+
+
+def post_dm_message(client, user_id, **kwargs):
+    """chat_postMessage to the user's DM, reopening it once if the stored channel is gone."""
+    try:
+        return client.chat_postMessage(channel=get_dm_channel(client, user_id), **kwargs)
     except SlackApiError as e:
-        logger.error(f"Error sending quiz to {user_id}: {e.response['error']}")
-        delete_quiz_session(user_id)  # Ensure cleanup here too
-        return False, f"Error: {e.response['error']}"
+        if e.response.get("error") != "channel_not_found":
+            raise
+        logger.info(f"Stored DM channel for user {user_id} not found; reopening it")
+        return client.chat_postMessage(
+            channel=get_dm_channel(client, user_id, refresh=True), **kwargs
+        )
 
 
 def send_message_to_user(client, user_id, message_text):
     """Helper function to send a message to a user."""
     try:
-        response = client.conversations_open(users=[user_id])
-        channel_id = response["channel"]["id"]
-
-        client.chat_postMessage(channel=channel_id, text=message_text)
+        post_dm_message(client, user_id, text=message_text)
     except SlackApiError as e:
         logger.error(f"Error sending message to user {user_id}: {e.response['error']}")
 
 
+def calculate_answer_points(user, is_correct, now):
+    """Returns (new_streak, total_points) for an answer given by user at now."""
+    current_streak = user.current_streak if user.current_streak else 0
+    last_answered = user.last_answered_at
+
+    new_streak = current_streak
+
+    # Check streak logic
+    if last_answered:
+        # Check if last answered was yesterday (or today)
+        # Using simple day difference for now
+        last_date = last_answered.date()
+        today_date = now.date()
+
+        if last_date == today_date:
+            # Already answered today, keep streak
+            pass
+        elif last_date == today_date - timedelta(days=1):
+            # Answered yesterday, increment streak
+            new_streak += 1
+        else:
+            # Missed a day or more, reset streak
+            new_streak = 1
+    else:
+        # First time playing
+        new_streak = 1
+
+    # Check difficulty mode for scoring multiplier
+    is_hard_mode = getattr(user, "difficulty_mode", "easy") == "hard"
+    multiplier = 2 if is_hard_mode else 1
+
+    if is_correct:
+        base_points = 10 * multiplier
+        total_points = base_points + streak_bonus(new_streak)
+    else:
+        # Playing (even wrong) maintains/increments the streak count,
+        # but the streak bonus is only added to correct answers.
+        base_points = 2 * multiplier
+        total_points = base_points
+
+    return new_streak, total_points
+
+
+def streak_bonus(streak):
+    # Cap streak bonus at 10 days (50 points)
+    return min(streak, 10) * 5
+
+
 def handle_quiz_response(user_id, selected_user_id, payload, team_id):
     """Handles the user's quiz response, updates scores, and modifies the Slack message to reflect the answer."""
     # Set up the Slack client with the correct access token
     client = get_slack_client(team_id)
 
-    # Fetch the user's active quiz session
-    quiz_session = get_active_quiz_session(user_id)
-    if not quiz_session or not quiz_session.correct_user_id:
+    # Claim the quiz session and record the answer in one transaction
+    try:
+        answer = record_quiz_answer(user_id, selected_user_id, calculate_answer_points)
+    except SQLAlchemyError:
+        # Already logged and rolled back, so the session is still there to answer again
+        try:
+            client.chat_postMessage(
+                channel=user_id,
+                text="Sorry, we couldn't record your answer. Please try again in a moment.",
+            )
+        except SlackApiError as e:
+            logger.error(f"Error sending retry message to user {user_id}: {e.response['error']}")
+        return
+    if answer is None:
         try:
             client.chat_postMessage(channel=user_id, text="Sorry, your quiz session has expired.")
         except SlackApiError as e:
@@ -265,215 +438,187 @@ def handle_quiz_response(user_id, selected_user_id, payload, team_id):
             )
         return
 
-    correct_user_id = quiz_session.correct_user_id
+    correct_user_id = answer["correct_user_id"]
+    is_correct = answer["is_correct"]
+    new_streak = answer["streak"]
+    total_points = answer["points"]
+    streak_points = streak_bonus(new_streak)
+    names = answer["names"]
+
+    # Prepare to update the original message
+    original_blocks = payload["message"]["blocks"]
+    action_id = payload["actions"][0]["action_id"]
+    # selected_option_index unused; action_id used directly for button labelling
+    _ = int(action_id.split("_")[-1])
+
+    # Iterate through all blocks to find and update ALL answer buttons
+    # This handles both the "grouped" layout (block_id='answer_buttons') and the "interleaved" layout (multiple action blocks)
+    answer_blocks_found = False
+
+    for block in original_blocks:
+        if block.get("type") == "actions":
+            elements = block.get("elements", [])
+            # Check if this block contains quiz response buttons
+            # We match if ANY element in the block has an action_id starting with 'quiz_response_'
+            if any(el.get("action_id", "").startswith("quiz_response_") for el in elements):
+                answer_blocks_found = True
+
+                for idx, element in enumerate(elements):
+                    # Only modify buttons that are part of the quiz (safety check)
+                    if element.get("action_id", "").startswith("quiz_response_"):
+                        # Assign a new action_id to disable further interaction
+                        # We append the existing suffix to keep it unique-ish or just random
+                        element["action_id"] = f"disabled_{element['action_id']}"
+
+                        if "text" in element:
+                            element["text"]["emoji"] = True
+
+                        # Style the buttons based on correctness
+                        if element["value"] == correct_user_id:
+                            element["style"] = "primary"  # Correct answer in green
+                        elif element["value"] == selected_user_id:
+                            element["style"] = "danger"  # User's incorrect selection in red
+                        else:
+                            element.pop("style", None)  # Remove 'style' if any
+
+    if not answer_blocks_found:
+        logger.warning("No answer action blocks found to update.")
+        return
 
-    try:
-        # Determine if the user's selection is correct
-        is_correct = selected_user_id == correct_user_id
+    # Add feedback text at the top
+    first_block_text = original_blocks[0]["text"]["text"]
+    is_hard_mode = "Hard Mode" in first_block_text
 
-        # Calculate points and streak
-        from datetime import datetime, timedelta
+    if is_correct:
+        streak_msg = (
+            f" 🔥 {new_streak} Day Streak! (+{streak_points} pts)" if new_streak > 1 else ""
+        )
+        feedback_text = f"🎉 *Correct!* You really know your colleagues! 🌟\n*+{total_points} Points!*{streak_msg}"
+    else:
+        correct_name = names.get(correct_user_id, "Unknown")
+        if is_hard_mode:
+            selected_name = names.get(selected_user_id, "Unknown")
+            feedback_text = f"❌ *Nope!* You selected *{selected_name}*. We were looking for *{correct_name}*! 🍀\n*+{total_points} Points for participating!*"
+        else:
+            feedback_text = f"❌ *Nope!* This is your amazing colleague *{correct_name}*. Better luck next time! 🍀\n*+{total_points} Points for participating!*"
 
-        from database_helpers import get_user, update_user_streak
+    # Insert feedback and Next Quiz button at the BOTTOM
+    original_blocks.append({"type": "divider"})
 
-        user = get_user(user_id)
-        now = datetime.utcnow()
+    original_blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": feedback_text}})
 
-        current_streak = user.current_streak if user.current_streak else 0
-        last_answered = user.last_answered_at
-
-        new_streak = current_streak
-
-        # Check streak logic
-        if last_answered:
-            # Check if last answered was yesterday (or today)
-            # Using simple day difference for now
-            last_date = last_answered.date()
-            today_date = now.date()
-
-            if last_date == today_date:
-                # Already answered today, keep streak
-                pass
-            elif last_date == today_date - timedelta(days=1):
-                # Answered yesterday, increment streak
-                new_streak += 1
-            else:
-                # Missed a day or more, reset streak
-                new_streak = 1
-        else:
-            # First time playing
-            new_streak = 1
+    original_blocks.append(
+        {
+            "type": "actions",
+            "block_id": "next_quiz_block",
+            "elements": [
+                {
+                    "type": "button",
+                    "text": {"type": "plain_text", "text": "Next Quiz"},
+                    "value": "next_quiz",
+                    "action_id": "next_quiz",
+                    "style": "primary",
+                }
+            ],
+        }
+    )
+
+    # Extract channel ID and message timestamp from payload
+    channel_id = payload["channel"]["id"]
+    message_ts = payload["message"]["ts"]
+    if channel_id.startswith("D"):
+        logger.debug(f"DM detected, sending response to user ID: {channel_id}")
+    else:
+        logger.debug(f"Sending response to channel ID: {channel_id}")
+    try:
+        logger.debug(
+            f"Updating quiz response for user_id: {user_id}, team_id: {team_id}, channel_id: {channel_id}, message_ts: {message_ts}"
+        )
+        client.chat_update(
+            channel=channel_id, ts=message_ts, blocks=original_blocks, text=feedback_text
+        )
+    except SlackApiError as e:
+        logger.error(
+            f"Slack API Error while updating message for user {user_id}: {e.response['error']}"
+        )
+    except Exception as e:
+        logger.error(f"Unexpected error while updating message: {str(e)}")
 
-        # Cap streak bonus at 10 days (50 points)
-        streak_bonus_multiplier = min(new_streak, 10)
-        streak_points = streak_bonus_multiplier * 5
 
-        # Check difficulty mode for scoring multiplier
-        is_hard_mode = getattr(user, "difficulty_mode", "easy") == "hard"
-        multiplier = 2 if is_hard_mode else 1
+def _within_office_hours(now):
+    # Simple check for office hours (08:00 - 18:00 UTC for now)
+    # TODO: Support user timezones
+    return 8 <= now.hour < 18
 
-        if is_correct:
-            base_points = 10 * multiplier
-            total_points = base_points + streak_points
-        else:
-            base_points = 2 * multiplier
-            total_points = base_points
-            # Plan example: "Day 1 = 10 pts. Day 2 = 10 + 5 = 15 pts." implying bonus is added to correct answer.
-            # Plan example: "Day 1 = 10 pts. Day 2 = 10 + 5 = 15 pts." implying bonus is added to correct answer.
-            # Let's assume streak bonus is only for correct answers to prevent farming points with wrong answers?
-            # Actually, "Participation Points: Users get points even if they answer incorrectly".
-            # Let's give base participation points (2) for incorrect, but maybe NO streak bonus?
-            # "Streak System: Rewards users for playing on consecutive days."
-            # If I get it wrong, do I keep my streak? Most games say yes if you play.
-            # So I should update the streak regardless of correctness?
-            # Plan says: "Verify DB last_answered_at is updated and current_streak becomes 1."
-            # It doesn't explicitly say if wrong answer updates streak.
-            # Usually, just *playing* maintains the streak.
-            # But *points* for streak usually go on top of *winning*.
-            # Let's implement: Streak increments if you PLAY. Bonus points only if you WIN.
-            # Wait, if I answer wrong, do I get streak bonus points?
-            # "Day 1 = 10 pts." -> Correct answer.
-            # Let's stick to simple: Streak Bonus only on Correct Answer.
-            # But playing (even wrong) maintains/increments streak count.
-
-            total_points = base_points
-
-        # Update streak in DB
-        update_user_streak(user_id, new_streak, now)
-
-        # Update the user's score and attempts
-        update_score(user_id, total_points, is_correct=is_correct)
-
-        # Prepare to update the original message
-        original_blocks = payload["message"]["blocks"]
-        action_id = payload["actions"][0]["action_id"]
-        # selected_option_index unused; action_id used directly for button labelling
-        _ = int(action_id.split("_")[-1])
-
-        # Iterate through all blocks to find and update ALL answer buttons
-        # This handles both the "grouped" layout (block_id='answer_buttons') and the "interleaved" layout (multiple action blocks)
-        answer_blocks_found = False
-
-        for block in original_blocks:
-            if block.get("type") == "actions":
-                elements = block.get("elements", [])
-                # Check if this block contains quiz response buttons
-                # We match if ANY element in the block has an action_id starting with 'quiz_response_'
-                if any(el.get("action_id", "").startswith("quiz_response_") for el in elements):
-                    answer_blocks_found = True
-
-                    for idx, element in enumerate(elements):
-                        # Only modify buttons that are part of the quiz (safety check)
-                        if element.get("action_id", "").startswith("quiz_response_"):
-                            # Assign a new action_id to disable further interaction
-                            # We append the existing suffix to keep it unique-ish or just random
-                            element["action_id"] = f"disabled_{element['action_id']}"
-
-                            if "text" in element:
-                                element["text"]["emoji"] = True
-
-                            # Style the buttons based on correctness
-                            if element["value"] == correct_user_id:
-                                element["style"] = "primary"  # Correct answer in green
-                            elif element["value"] == selected_user_id:
-                                element["style"] = "danger"  # User's incorrect selection in red
-                            else:
-                                element.pop("style", None)  # Remove 'style' if any
-
-        if not answer_blocks_found:
-            logger.warning("No answer action blocks found to update.")
-            return
-
-        # Add feedback text at the top
-        first_block_text = original_blocks[0]["text"]["text"]
-        is_hard_mode = "Hard Mode" in first_block_text
-
-        if is_correct:
-            streak_msg = (
-                f" 🔥 {new_streak} Day Streak! (+{streak_points} pts)" if new_streak > 1 else ""
-            )
-            feedback_text = f"🎉 *Correct!* You really know your colleagues! 🌟\n*+{total_points} Points!*{streak_msg}"
-        else:
-            correct_name = get_user_name(correct_user_id)
-            if is_hard_mode:
-                selected_name = get_user_name(selected_user_id)
-                feedback_text = f"❌ *Nope!* You selected *{selected_name}*. We were looking for *{correct_name}*! 🍀\n*+{total_points} Points for participating!*"
-            else:
-                feedback_text = f"❌ *Nope!* This is your amazing colleague *{correct_name}*. Better luck next time! 🍀\n*+{total_points} Points for participating!*"
-
-        # Insert feedback and Next Quiz button at the BOTTOM
-        original_blocks.append({"type": "divider"})
-
-        original_blocks.append(
-            {"type": "section", "text": {"type": "mrkdwn", "text": feedback_text}}
-        )
 
-        original_blocks.append(
-            {
-                "type": "actions",
-                "block_id": "next_quiz_block",
-                "elements": [
-                    {
-                        "type": "button",
-                        "text": {"type": "plain_text", "text": "Next Quiz"},
-                        "value": "next_quiz",
-                        "action_id": "next_quiz",
-                        "style": "primary",
-                    }
-                ],
-            }
-        )
+@contextmanager
+def _team_slot(team_id):
+    """Limit concurrent random-quiz sends per workspace."""
+    with _team_slots_lock:
+        slot = _team_slots.get(team_id)
+        if slot is None:
+            slot = _team_slots[team_id] = threading.BoundedSemaphore(RANDOM_QUIZ_TEAM_CONCURRENCY)
+    with slot:
+        yield
 
-        # Extract channel ID and message timestamp from payload
-        channel_id = payload["channel"]["id"]
-        message_ts = payload["message"]["ts"]
-        if channel_id.startswith("D"):
-            logger.debug(f"DM detected, sending response to user ID: {channel_id}")
-        else:
-            logger.debug(f"Sending response to channel ID: {channel_id}")
+
+def _send_random_quiz(user_id, team_id):
+    with _team_slot(team_id):
+        logger.info(f"Sending random quiz to user {user_id} (Team: {team_id})")
         try:
-            logger.debug(
-                f"Updating quiz response for user_id: {user_id}, team_id: {team_id}, channel_id: {channel_id}, message_ts: {message_ts}"
-            )
-            client.chat_update(
-                channel=channel_id, ts=message_ts, blocks=original_blocks, text=feedback_text
-            )
-        except SlackApiError as e:
-            logger.error(
-                f"Slack API Error while updating message for user {user_id}: {e.response['error']}"
-            )
+            success, _ = send_quiz_to_user(user_id, team_id)
+            return success
         except Exception as e:
-            logger.error(f"Unexpected error while updating message: {str(e)}")
-
-    finally:
-        # Remove the stored answer (delete the quiz session)
-        delete_quiz_session(user_id)
+            logger.error(f"Error sending random quiz to {user_id}: {e}")
+            return False
 
 
 def process_random_quizzes():
-    """Check for users due for a random quiz and send it."""
-    from datetime import datetime, timedelta
-
-    from database_helpers import get_users_due_for_quiz, update_user_quiz_schedule
+    """
+    Send random quizzes to every due user, claiming them in batches and fanning the
+    sends out over a bounded pool. Stops claiming once the tick budget is used up;
+    anyone left over is picked up by the next tick.
+    """
+    from database_helpers import claim_users_due_for_quiz, schedule_next_random_quizzes
 
-    now = datetime.utcnow()
-    # Simple check for office hours (08:00 - 18:00 UTC for now)
-    # TODO: Support user timezones
-    if not (8 <= now.hour < 18):
+    if not _within_office_hours(datetime.utcnow()):
         logger.info("Outside office hours, skipping random quizzes.")
         return
 
-    users = get_users_due_for_quiz()
-    logger.info(f"Found {len(users)} users due for a random quiz.")
+    started = time.monotonic()
+    claimed = sent = 0
+    while time.monotonic() - started < RANDOM_QUIZ_TICK_BUDGET:
+        batch = claim_users_due_for_quiz(
+            RANDOM_QUIZ_BATCH_SIZE, datetime.utcnow() + RANDOM_QUIZ_CLAIM_LEASE
+        )
+        if not batch:
+            break
+        claimed += len(batch)
 
-    for user in users:
-        logger.info(f"Sending random quiz to user {user.id} (Team: {user.team_id})")
-        success, msg = send_quiz_to_user(user.id, user.team_id)
+        futures = [_dispatch_executor.submit(_send_random_quiz, *claim) for claim in batch]
+        sent += sum(1 for future in futures if future.result())
 
         # Schedule next quiz regardless of success (to avoid retry loops on error)
         # Random interval between 30 mins and 4 hours
-        minutes = random.randint(30, 240)
-        next_quiz_at = now + timedelta(minutes=minutes)
-
-        update_user_quiz_schedule(user.id, next_quiz_at)
-        logger.info(f"Scheduled next quiz for user {user.id} at {next_quiz_at} (in {minutes} mins)")
+        now = datetime.utcnow()
+        schedule_next_random_quizzes(
+            {user_id: now + timedelta(minutes=random.randint(30, 240)) for user_id, _ in batch}
+        )
+        if len(batch) < RANDOM_QUIZ_BATCH_SIZE:
+            break
+
+    elapsed = time.monotonic() - started
+    random_quiz_stats.update(
+        {
+            "last_tick_at": datetime.utcnow().isoformat(),
+            "claimed": claimed,
+            "sent": sent,
+            "failed": claimed - sent,
+            "seconds": round(elapsed, 3),
+            "per_second": round(claimed / elapsed, 2) if elapsed else 0.0,
+        }
+    )
+    logger.info(
+        f"Random quiz tick: {sent}/{claimed} sent in {elapsed:.1f}s "
+        f"({random_quiz_stats['per_second']} quizzes/s)"
+    )
@@ -0,0 +1,9 @@
+# gunicorn.conf.py
+# Picked up automatically by `gunicorn app:app` when started from the project directory.
+
+
+def worker_exit(server, worker):
+    """Write any buffered score_history rows before the worker goes away."""
+    from history_buffer import score_history_buffer
+
+    score_history_buffer.close()
@@ -0,0 +1,149 @@
+# history_buffer.py
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from db import Session
+from models import ScoreHistory
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryBuffer:
+    """
+    Optional write-behind queue for score_history rows.
+
+    Enabled by a positive flush_interval. Answers then hand their history row to add()
+    after their own commit, and a background thread bulk-inserts the queued rows every
+    flush_interval seconds or as soon as batch_size rows are waiting. At most max_queue
+    rows are held; further rows are dropped and counted. When disabled, callers write
+    history rows in their own transaction.
+    """
+
+    def __init__(self, batch_size, flush_interval, max_queue):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.queued = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        self.max_lag = 0.0
+        self._rows = deque()  # (queued_at, row)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.flush_interval > 0
+
+    def add(self, row):
+        """Queue a score_history row (a dict of column values); returns False if dropped."""
+        with self._lock:
+            if len(self._rows) >= self.max_queue:
+                self.dropped += 1
+                logger.warning(f"Score history buffer full ({self.max_queue}); dropping a row")
+                return False
+            self._rows.append((time.monotonic(), row))
+            self.queued += 1
+            if len(self._rows) >= self.batch_size:
+                self._wakeup.set()
+        self._ensure_started()
+        return True
+
+    def _ensure_started(self):
+        if self._thread is not None or self._stopped.is_set():
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="score-history-flush", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Bulk-insert every queued row now; returns the number of rows written."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._rows:
+                        break
+                    batch = [
+                        self._rows.popleft() for _ in range(min(self.batch_size, len(self._rows)))
+                    ]
+                lag = time.monotonic() - batch[0][0]
+                with Session() as session:
+                    try:
+                        session.execute(insert(ScoreHistory), [row for _, row in batch])
+                        session.commit()
+                    except SQLAlchemyError as e:
+                        session.rollback()
+                        logger.error(f"Error flushing {len(batch)} score history rows: {str(e)}")
+                        with self._lock:
+                            self.failed_flushes += 1
+                            self.dropped += len(batch)
+                        continue
+                written += len(batch)
+                with self._lock:
+                    self.flushes += 1
+                    self.flushed += len(batch)
+                    self.max_lag = max(self.max_lag, lag)
+        return written
+
+    def close(self):
+        """Stop the flush thread and write whatever is still queued."""
+        self._stopped.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=self.flush_interval + 5)
+        written = self.flush()
+        if written:
+            logger.info(f"Flushed {written} score history rows on shutdown.")
+        return written
+
+    def stats(self):
+        with self._lock:
+            oldest = self._rows[0][0] if self._rows else None
+            return {
+                "enabled": self.enabled,
+                "pending": len(self._rows),
+                "lag_seconds": round(time.monotonic() - oldest, 3) if oldest else 0.0,
+                "max_lag_seconds": round(self.max_lag, 3),
+                "queued": self.queued,
+                "flushed": self.flushed,
+                "flushes": self.flushes,
+                "dropped": self.dropped,
+                "failed_flushes": self.failed_flushes,
+                "batch_size": self.batch_size,
+                "flush_interval": self.flush_interval,
+                "max_queue": self.max_queue,
+            }
+
+
+score_history_buffer = HistoryBuffer(
+    batch_size=int(os.environ.get("SCORE_HISTORY_BATCH_SIZE", "200")),
+    # 0 (the default) writes history rows in the answer's own transaction
+    flush_interval=int(os.environ.get("SCORE_HISTORY_FLUSH_MS", "0")) / 1000,
+    max_queue=int(os.environ.get("SCORE_HISTORY_MAX_QUEUE", "10000")),
+)
+
+# gunicorn.conf.py closes the buffer on worker exit; this covers other entry points.
+atexit.register(score_history_buffer.close)
@@ -1,13 +1,58 @@
 import io
 import ipaddress
 import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as RenderTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from urllib.parse import urlparse
 
 import requests
 from PIL import Image, ImageDraw, ImageFont
+from requests.adapters import HTTPAdapter
+
+from avatar_cache import avatar_cache
 
 logger = logging.getLogger(__name__)
 
+# Size of each quadrant of the 2x2 grid; avatars are cached at this size
+TILE_SIZE = (400, 400)
+
+# Resampling filter for avatar thumbnails: "lanczos" (sharpest), or "bicubic"/"bilinear"/"box"
+# for a cheaper fast path on CPU-constrained pods
+AVATAR_RESAMPLE = os.environ.get("AVATAR_RESAMPLE", "lanczos")
+try:
+    RESAMPLE_FILTER = Image.Resampling[AVATAR_RESAMPLE.upper()]
+except KeyError:
+    logger.warning(f"Unknown AVATAR_RESAMPLE filter {AVATAR_RESAMPLE!r}, using lanczos")
+    RESAMPLE_FILTER = Image.Resampling.LANCZOS
+
+# Overall time budget for downloading the avatars of one grid; late images become placeholders.
+GRID_FETCH_DEADLINE = float(os.environ.get("GRID_FETCH_DEADLINE", "5"))
+AVATAR_FETCH_WORKERS = int(os.environ.get("AVATAR_FETCH_WORKERS", "8"))
+
+# Avatar downloads share one keep-alive session and a small pool of download threads
+http_session = requests.Session()
+http_session.mount("https://", HTTPAdapter(pool_maxsize=AVATAR_FETCH_WORKERS))
+_fetch_executor = ThreadPoolExecutor(
+    max_workers=AVATAR_FETCH_WORKERS, thread_name_prefix="avatar-fetch"
+)
+
+# Optional process pool for grid composition and JPEG encoding, keeping that CPU work off
+# the GIL shared with request threads. 0 renders inline on the calling thread.
+GRID_RENDER_PROCESSES = int(os.environ.get("GRID_RENDER_PROCESSES", "0"))
+# At most this many grids may be queued or rendering at once; further callers wait for a
+# free slot for up to GRID_RENDER_QUEUE_TIMEOUT seconds, then render inline instead.
+GRID_RENDER_MAX_PENDING = int(os.environ.get("GRID_RENDER_MAX_PENDING", "8"))
+GRID_RENDER_QUEUE_TIMEOUT = float(os.environ.get("GRID_RENDER_QUEUE_TIMEOUT", "2"))
+GRID_RENDER_TIMEOUT = float(os.environ.get("GRID_RENDER_TIMEOUT", "30"))
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+_render_slots = threading.BoundedSemaphore(GRID_RENDER_MAX_PENDING)
+
 # Allowlist of hostnames that serve Slack user profile images.
 _ALLOWED_IMAGE_HOSTS = {
     "avatars.slack-edge.com",
@@ -49,93 +94,226 @@ def _is_safe_image_url(url: str) -> bool:
         return False
 
 
+def decode_thumbnail(content):
+    """Decode image bytes into a TILE_SIZE RGB thumbnail."""
+    img = Image.open(io.BytesIO(content))
+    if img.format == "JPEG":
+        # Let libjpeg decode straight to RGB, scaled down by 1/2, 1/4 or 1/8 where
+        # that still leaves at least TILE_SIZE pixels
+        img.draft("RGB", TILE_SIZE)
+    return img.convert("RGB").resize(TILE_SIZE, RESAMPLE_FILTER)
+
+
+def fetch_image(url, timeout=GRID_FETCH_DEADLINE):
+    """
+    Return one avatar as a TILE_SIZE thumbnail, or None if it is blocked or unavailable.
+    Served from avatar_cache when fresh; stale entries are revalidated with a conditional GET.
+    """
+    if not _is_safe_image_url(url):
+        logger.warning(f"Blocked image fetch for disallowed URL: {url}")
+        return None
+
+    cached, meta = avatar_cache.load(url)
+    if cached is not None and avatar_cache.is_fresh(meta):
+        return cached
+
+    headers = {}
+    if meta:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        resp = http_session.get(url, timeout=timeout, headers=headers)
+        if resp.status_code == 304 and cached is not None:
+            avatar_cache.touch(url)
+            return cached
+        if resp.status_code != 200:
+            logger.warning(f"Failed to fetch image: {url} - Status: {resp.status_code}")
+            return cached  # A stale thumbnail beats a placeholder
+        # Decode and resize here, on the download thread
+        thumbnail = decode_thumbnail(resp.content)
+        avatar_cache.store(
+            url,
+            thumbnail,
+            etag=resp.headers.get("ETag"),
+            last_modified=resp.headers.get("Last-Modified"),
+        )
+        return thumbnail
+    except Exception as e:
+        logger.error(f"Error fetching image {url}: {e}")
+        return cached
+
+
+def fetch_images(image_urls, deadline=GRID_FETCH_DEADLINE):
+    """
+    Download all images concurrently, waiting at most `deadline` seconds overall.
+    Returns a list aligned with image_urls, with None for any image that failed or was late.
+    """
+    futures = [_fetch_executor.submit(fetch_image, url, deadline) for url in image_urls]
+    done, _ = wait(futures, timeout=deadline)
+
+    images = []
+    for url, future in zip(image_urls, futures):
+        if future in done:
+            images.append(future.result())
+        else:
+            future.cancel()
+            logger.warning(f"Image fetch missed the {deadline}s grid deadline: {url}")
+            images.append(None)
+    return images
+
+
+# Quadrant labels: an outlined digit drawn at this offset from each tile's top-left corner
+LABEL_OFFSET = (20, 10)
+LABEL_OUTLINE = 3
+
+
+def _label_font():
+    try:
+        # Big font for visibility (Pillow >= 10.0.0)
+        return ImageFont.load_default(size=80)
+    except TypeError:
+        # Fallback for older Pillow
+        return ImageFont.load_default()
+
+
+def _render_label_sprite(text, font):
+    """Render one outlined label onto a transparent RGBA sprite."""
+    thick = LABEL_OUTLINE
+    _, _, right, bottom = font.getbbox(text)
+    sprite = Image.new("RGBA", (right + 2 * thick, bottom + 2 * thick), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(sprite)
+
+    # Simple outline/shadow for contrast against photos
+    for off_x in range(-thick, thick + 1):
+        for off_y in range(-thick, thick + 1):
+            draw.text((thick + off_x, thick + off_y), text, font=font, fill="black")
+    draw.text((thick, thick), text, font=font, fill="cyan")
+    return sprite
+
+
+# The four labels never change, so they are rendered once and composited onto every grid
+_font = _label_font()
+LABEL_SPRITES = [_render_label_sprite(str(n), _font) for n in range(1, 5)]
+del _font
+
+
+def compose_grid(images):
+    """
+    Stitch up to 4 tiles into a labelled 2x2 grid, drawing a placeholder for missing ones.
+    Returns the grid as an RGB PIL image.
+    """
+    target_size = TILE_SIZE  # Each quadrant size
+    grid_img = Image.new("RGB", (target_size[0] * 2, target_size[1] * 2), color="white")
+    draw = ImageDraw.Draw(grid_img)
+
+    positions = [
+        (0, 0),
+        (target_size[0], 0),
+        (0, target_size[1]),
+        (target_size[0], target_size[1]),
+    ]
+
+    for idx, img_obj in enumerate(images[:4]):
+        x, y = positions[idx]
+
+        if img_obj:
+            # Resize (cached thumbnails are already tile-sized) and Paste
+            if img_obj.size != target_size:
+                img_obj = img_obj.resize(target_size, RESAMPLE_FILTER)
+            grid_img.paste(img_obj, (x, y))
+        else:
+            # Draw placeholder
+            draw.rectangle([x, y, x + target_size[0], y + target_size[1]], fill="grey")
+            draw.text((x + 50, y + 50), "N/A", fill="white")
+
+        # Overlay the pre-rendered number, using its alpha channel as the mask
+        sprite = LABEL_SPRITES[idx]
+        origin = (x + LABEL_OFFSET[0] - LABEL_OUTLINE, y + LABEL_OFFSET[1] - LABEL_OUTLINE)
+        grid_img.paste(sprite, origin, sprite)
+
+    return grid_img
+
+
+def render_grid_bytes(images):
+    """Compose the grid and encode it as JPEG bytes. Runs in a render process when enabled."""
+    grid_img = compose_grid(images)
+    output = io.BytesIO()
+    grid_img.save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+
+def _get_render_pool():
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            # spawn rather than fork: the parent is a threaded gunicorn worker
+            _render_pool = ProcessPoolExecutor(
+                max_workers=GRID_RENDER_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _render_pool
+
+
+def _reset_render_pool(pool):
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def render_grid(images):
+    """
+    Render grid JPEG bytes, on the process pool when GRID_RENDER_PROCESSES is set.
+
+    Renders inline instead when no pool slot frees up within GRID_RENDER_QUEUE_TIMEOUT or
+    the pool render times out or dies, so a saturated pool slows a quiz down rather than
+    sending it without its grid.
+    """
+    if GRID_RENDER_PROCESSES <= 0:
+        return render_grid_bytes(images)
+
+    if not _render_slots.acquire(timeout=GRID_RENDER_QUEUE_TIMEOUT):
+        logger.warning(
+            f"Grid render queue full ({GRID_RENDER_MAX_PENDING} pending); rendering inline"
+        )
+        return render_grid_bytes(images)
+
+    pool = _get_render_pool()
+    try:
+        future = pool.submit(render_grid_bytes, images)
+    except BrokenProcessPool:
+        _render_slots.release()
+        logger.error("Grid render pool is broken; restarting it and rendering inline")
+        _reset_render_pool(pool)
+        return render_grid_bytes(images)
+    except BaseException:
+        _render_slots.release()
+        raise
+    # Free the slot when rendering finishes, even if this caller has stopped waiting
+    future.add_done_callback(lambda _: _render_slots.release())
+
+    try:
+        return future.result(timeout=GRID_RENDER_TIMEOUT)
+    except RenderTimeoutError:
+        logger.warning(f"Grid render took over {GRID_RENDER_TIMEOUT}s; rendering inline")
+    except BrokenProcessPool:
+        logger.error("Grid render process died; restarting the render pool and rendering inline")
+        _reset_render_pool(pool)
+    return render_grid_bytes(images)
+
+
 def generate_grid_image_bytes(image_urls):
     """
-    Downloads 4 images and stitches them into a 2x2 grid.
+    Downloads 4 images concurrently and stitches them into a 2x2 grid.
     Returns the bytes of the resulting execution-safe JPEG.
     """
     try:
-        images = []
-        for url in image_urls:
-            if not _is_safe_image_url(url):
-                logger.warning(f"Blocked image fetch for disallowed URL: {url}")
-                images.append(None)
-                continue
-            try:
-                resp = requests.get(url, timeout=5)
-                if resp.status_code == 200:
-                    img = Image.open(io.BytesIO(resp.content))
-                    images.append(img)
-                else:
-                    logger.warning(f"Failed to fetch image: {url} - Status: {resp.status_code}")
-                    images.append(None)
-            except Exception as e:
-                logger.error(f"Error fetching image {url}: {e}")
-                images.append(None)
-
-        # Create a blank canvas (e.g., 512x512 or 1024x1024 depending on input)
-        # Let's standardize on 512x512 quadrants -> 1024x1024 total
-
-        target_size = (400, 400)  # Each quadrant size
-        grid_width = target_size[0] * 2
-        grid_height = target_size[1] * 2
-
-        grid_img = Image.new("RGB", (grid_width, grid_height), color="white")
-
-        draw = ImageDraw.Draw(grid_img)
-        # Font for numbers - simplified to just position/shapes if font missing
-
-        positions = [
-            (0, 0),
-            (target_size[0], 0),
-            (0, target_size[1]),
-            (target_size[0], target_size[1]),
-        ]
-
-        for idx, img_obj in enumerate(images):
-            if idx >= 4:
-                break
-
-            x, y = positions[idx]
-
-            if img_obj:
-                # Resize and Paste
-                img_resized = img_obj.resize(target_size, Image.LANCZOS)
-                grid_img.paste(img_resized, (x, y))
-            else:
-                # Draw placeholder
-                draw.rectangle([x, y, x + target_size[0], y + target_size[1]], fill="grey")
-                draw.text((x + 50, y + 50), "N/A", fill="white")
-
-            # Draw number (large, overlaid, no box)
-            try:
-                # Big font for visibility (Pillow >= 10.0.0)
-                font = ImageFont.load_default(size=80)
-            except TypeError:
-                # Fallback for older Pillow
-                font = ImageFont.load_default()
-
-            text = str(idx + 1)
-            text_x = x + 20
-            text_y = y + 10
-
-            # Simple outline/shadow for contrast against photos
-            shadow_color = "black"
-            main_color = "cyan"
-            thick = 3
-
-            # Draw outline
-            for off_x in range(-thick, thick + 1):
-                for off_y in range(-thick, thick + 1):
-                    draw.text((text_x + off_x, text_y + off_y), text, font=font, fill=shadow_color)
-
-            # Draw main text
-            draw.text((text_x, text_y), text, font=font, fill=main_color)
-
-        # Convert to bytes
-        output = io.BytesIO()
-        grid_img.save(output, format="JPEG", quality=85)
-        return output.getvalue()
+        images = fetch_images(image_urls)
+        return render_grid(images)
 
     except Exception as e:
         logger.error(f"Grid generation failed: {e}")
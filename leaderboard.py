@@ -1,7 +1,13 @@
+import copy
 import logging
-from datetime import datetime, timedelta
 
-from database_helpers import get_top_scores, get_top_scores_period
+from cache import leaderboard_cache
+from database_helpers import (
+    get_period_start,
+    get_team_leaderboard,
+    get_top_scores,
+    get_top_scores_period,
+)
 
 logging.basicConfig(level=logging.INFO)
 
@@ -48,41 +54,56 @@ def create_ranking_section(title, scores, empty_message="_No scores yet._"):
     return blocks
 
 
-def get_leaderboard_blocks():
-    # Calculate time ranges
-    now = datetime.utcnow()
-    start_of_day = datetime(now.year, now.month, now.day)
-    start_of_week = start_of_day - timedelta(days=now.weekday())  # Monday
+# period -> (title, number of places, message shown when nobody qualifies)
+RANKING_SECTIONS = {
+    "day": ("📅 Daily Top 3", 3, "_No scores yet._"),
+    "week": ("🗓️ Weekly Top 3", 3, "_No scores yet._"),
+    "all": ("🏆 All-Time Legends", 10, "_Need 10+ attempts to qualify._"),
+}
 
-    # Get scores
-    daily_scores = get_top_scores_period(start_of_day, limit=3)
-    weekly_scores = get_top_scores_period(start_of_week, limit=3)
 
-    # All time requires 10 attempts min, as per original logic in database_helpers.py
-    # But for display consistency, we might want to check if we should keep that limit.
-    # The original call: get_top_scores(10)
-    all_time_scores = get_top_scores(10)
+def _render_ranking_section(team_id, period):
+    title, limit, empty_message = RANKING_SECTIONS[period]
+    if team_id:
+        # Precomputed per-workspace rankings
+        scores = get_team_leaderboard(team_id, period, limit=limit)
+    elif period == "all":
+        # All time requires 10 attempts min, as per original logic in database_helpers.py
+        scores = get_top_scores(limit)
+    else:
+        scores = get_top_scores_period(get_period_start(period), limit=limit)
+    return create_ranking_section(title, scores, empty_message)
+
+
+def get_ranking_section(team_id, period):
+    """Return the ranking blocks for one period, served from leaderboard_cache when fresh."""
+    key = (team_id, period)
+    blocks = leaderboard_cache.get(key)
+    if blocks is None:
+        blocks = _render_ranking_section(team_id, period)
+        leaderboard_cache.set(key, blocks)
+    # Callers may embed and mutate the blocks, so never hand out the cached objects
+    return copy.deepcopy(blocks)
 
+
+def get_leaderboard_blocks(team_id=None):
+    """Build the leaderboard blocks, scoped to team_id when given (global otherwise)."""
     blocks = []
 
     # Daily
-    blocks.extend(create_ranking_section("📅 Daily Top 3", daily_scores))
+    blocks.extend(get_ranking_section(team_id, "day"))
     blocks.append(
         {"type": "section", "text": {"type": "plain_text", "text": " ", "emoji": True}}
     )  # Spacer around
 
     # Weekly
-    blocks.extend(create_ranking_section("🗓️ Weekly Top 3", weekly_scores))
+    blocks.extend(get_ranking_section(team_id, "week"))
     blocks.append(
         {"type": "section", "text": {"type": "plain_text", "text": " ", "emoji": True}}
     )  # Spacer around
 
     # All Time
-    blocks.extend(
-        create_ranking_section(
-            "🏆 All-Time Legends", all_time_scores, "_Need 10+ attempts to qualify._"
-        )
-    )
+    blocks.extend(get_ranking_section(team_id, "all"))
 
     # Footer
     blocks.append(
@@ -1,10 +1,22 @@
 # models.py
 import binascii
+import hashlib
+import hmac
 import logging
 import os
+import threading
+from collections import OrderedDict
 
 from cryptography.fernet import Fernet
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+)
 from sqlalchemy.orm import relationship
 
 from db import Base
@@ -42,16 +54,24 @@ class User(Base):
     team_id = Column(String, nullable=False)  # Track which Slack team this user belongs to
     name_encrypted = Column(String, nullable=False)
     image_encrypted = Column(String)
+    # Keyed digest of the plaintext name/image, so syncs can detect changes without decrypting
+    profile_digest = Column(String, nullable=True)
     opted_in = Column(Boolean, default=False)
     last_quiz_sent_at = Column(DateTime, nullable=True)
     next_random_quiz_at = Column(DateTime, nullable=True)
     current_streak = Column(Integer, default=0)
     last_answered_at = Column(DateTime, nullable=True)
     difficulty_mode = Column(String, default="easy")
+    dm_channel_id = Column(String, nullable=True)  # Bot's DM channel with the user
 
     scores = relationship("Score", back_populates="user")
     quiz_sessions = relationship("QuizSession", back_populates="user")
 
+    __table_args__ = (
+        # Range scans for the random quiz scheduler's due-user pages (see iter_users_due_for_quiz)
+        Index("ix_users_due_quiz", opted_in, next_random_quiz_at, id),
+    )
+
     @property
     def name(self):
         # Decrypt name when accessed
@@ -72,10 +92,20 @@ class User(Base):
         # Encrypt image when setting it
         self.image_encrypted = encrypt_value(value)
 
+    def set_profile(self, name, image):
+        """Encrypt and store name and image together with their digest."""
+        self.name = name
+        self.image = image
+        self.profile_digest = profile_digest(name, image)
+
     def __repr__(self):
         return f"<User {self.name}>"
 
 
+# Minimum attempts before a player appears on the all-time leaderboard.
+LEADERBOARD_MIN_ATTEMPTS = 10
+
+
 class Score(Base):
     __tablename__ = "scores"
     user_id = Column(String, ForeignKey("users.id"), primary_key=True)
@@ -84,6 +114,16 @@ class Score(Base):
     correct_attempts = Column(Integer, default=0)
     user = relationship("User", back_populates="scores")
 
+    __table_args__ = (
+        # Partial index backing the all-time leaderboard's ORDER BY score DESC LIMIT n.
+        Index(
+            "ix_scores_leaderboard",
+            score.desc(),
+            postgresql_where=total_attempts >= LEADERBOARD_MIN_ATTEMPTS,
+            sqlite_where=total_attempts >= LEADERBOARD_MIN_ATTEMPTS,
+        ),
+    )
+
     def __repr__(self):
         return f"<Score {self.user_id}: {self.score}>"
 
@@ -108,6 +148,84 @@ class ScoreHistory(Base):
 
     user = relationship("User")
 
+    __table_args__ = (
+        Index("ix_score_history_created_at", created_at),
+        Index("ix_score_history_user_created", user_id, created_at),
+    )
+
+
+class ScoreDaily(Base):
+    """Per-user answer totals for one UTC day, maintained by update_score.
+
+    Day and week leaderboards (per workspace and global) sum these instead of score_history,
+    whose rows are compacted away after SCORE_HISTORY_RETENTION_DAYS. The key leads with
+    team_id and day so a workspace's board is an indexed range scan.
+    """
+
+    __tablename__ = "score_daily"
+    team_id = Column(String, primary_key=True)
+    day = Column(DateTime, primary_key=True)  # Midnight UTC
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    score = Column(Integer, default=0)
+    total_attempts = Column(Integer, default=0)
+    correct_attempts = Column(Integer, default=0)
+
+    user = relationship("User")
+
+    __table_args__ = (Index("ix_score_daily_day", day),)
+
+    def __repr__(self):
+        return f"<ScoreDaily {self.user_id} {self.day:%Y-%m-%d}: {self.score}>"
+
+
+class LeaderboardEntry(Base):
+    """Precomputed per-workspace all-time ranking row, maintained by update_score.
+
+    One row per (team, period, period start, user). Only "all" rows (at ALL_TIME_PERIOD_START)
+    are written; day and week boards are summed from ScoreDaily.
+    """
+
+    __tablename__ = "leaderboard_entries"
+    team_id = Column(String, primary_key=True)
+    period = Column(String, primary_key=True)  # "all"
+    period_start = Column(DateTime, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    score = Column(Integer, default=0)
+    total_attempts = Column(Integer, default=0)
+    correct_attempts = Column(Integer, default=0)
+
+    user = relationship("User")
+
+    __table_args__ = (
+        Index("ix_leaderboard_entries_rank", team_id, period, period_start, score.desc()),
+    )
+
+    def __repr__(self):
+        return f"<LeaderboardEntry {self.team_id}/{self.period} {self.user_id}: {self.score}>"
+
+
+class PreparedQuiz(Base):
+    """A quiz generated ahead of time, waiting to be sent to user_id.
+
+    Options are stored as user IDs and resolved when the quiz is sent. The hard-mode grid
+    lives on disk (see quiz_store) so the table stays small.
+    """
+
+    __tablename__ = "prepared_quizzes"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    team_id = Column(String, nullable=False)
+    correct_user_id = Column(String, nullable=False)
+    option_ids = Column(String, nullable=False)  # Comma-separated user IDs, in button order
+    difficulty = Column(String, nullable=False)
+    grid_file = Column(String, nullable=True)  # Hard-mode 2x2 grid JPEG, under the grid directory
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (Index("ix_prepared_quizzes_user", user_id, created_at),)
+
+    def __repr__(self):
+        return f"<PreparedQuiz {self.id} for {self.user_id}>"
+
 
 # # Define relationships after all classes are defined
 # User.scores = db.relationship('Score', back_populates='user')
@@ -135,9 +253,89 @@ class Workspace(Base):
         self.access_token_encrypted = fernet.encrypt(value.encode()).decode()
 
 
+class DecryptCache:
+    """Thread-safe, size-bounded LRU cache of plaintexts keyed by their Fernet ciphertext.
+
+    Fernet ciphertexts are randomized, so a ciphertext maps to exactly one plaintext for the
+    lifetime of the key and entries never go stale; rewritten columns simply get a new key.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, ciphertext):
+        """Return the cached plaintext for ciphertext, or None on a miss."""
+        with self._lock:
+            plaintext = self._entries.get(ciphertext)
+            if plaintext is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(ciphertext)
+            self.hits += 1
+            return plaintext
+
+    def put(self, ciphertext, plaintext):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[ciphertext] = plaintext
+            self._entries.move_to_end(ciphertext)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+# Process-wide cache in front of decrypt_value; set DECRYPT_CACHE_SIZE=0 to disable.
+decrypt_cache = DecryptCache(int(os.environ.get("DECRYPT_CACHE_SIZE", "10000")))
+
+
 def encrypt_value(value):
     return fernet.encrypt(value.encode()).decode() if value else None
 
 
 def decrypt_value(value):
-    return fernet.decrypt(value.encode()).decode() if value else None
+    if not value:
+        return None
+
+    plaintext = decrypt_cache.get(value)
+    if plaintext is None:
+        plaintext = fernet.decrypt(value.encode()).decode()
+        decrypt_cache.put(value, plaintext)
+    return plaintext
+
+
+# Separate key for profile digests, derived from ENCRYPTION_KEY so no new secret is needed
+_DIGEST_KEY = hmac.new(ENCRYPTION_KEY.encode(), b"facesinq-profile-digest", hashlib.sha256).digest()
+
+
+def profile_digest(name, image):
+    """HMAC-SHA256 of a user's plaintext profile fields, hex encoded.
+
+    Fernet ciphertexts are randomized, so comparing them cannot tell whether a profile changed.
+    The digest is keyed so it cannot be used to confirm guesses about the plaintext.
+    """
+    message = f"{name or ''}\x1f{image or ''}".encode()
+    return hmac.new(_DIGEST_KEY, message, hashlib.sha256).hexdigest()
+
+
+def get_decrypt_cache_stats():
+    """Return hit/miss counters and occupancy of the decrypted-identity cache."""
+    return decrypt_cache.stats()
@@ -0,0 +1,297 @@
+# quiz_store.py
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+
+from avatar_cache import avatar_cache
+from db import Session
+from models import PreparedQuiz, User
+
+logger = logging.getLogger(__name__)
+
+
+class PreparedQuizStore:
+    """
+    Quizzes generated ahead of time, kept in the prepared_quizzes table so they survive
+    restarts and are shared by every worker using the same database.
+
+    Holds at most per_user quizzes per user and max_rows overall; quizzes older than
+    ttl seconds are never served. Hard-mode grids are written as JPEG files under grid_dir
+    and only their file names are stored; a grid that is missing when the quiz is popped
+    (e.g. it was prepared by a pod with another volume) comes back as None and is rendered
+    again by the caller.
+    """
+
+    def __init__(self, per_user, ttl, max_rows, grid_dir):
+        self.per_user = per_user
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.grid_dir = grid_dir
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter, n=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + n)
+
+    def _cutoff(self):
+        return datetime.utcnow() - timedelta(seconds=self.ttl)
+
+    def _write_grid(self, grid_bytes):
+        """Save a grid under grid_dir and return its file name, or None if it could not be saved."""
+        name = f"{uuid.uuid4().hex}.jpg"
+        try:
+            os.makedirs(self.grid_dir, exist_ok=True)
+            with open(os.path.join(self.grid_dir, name), "wb") as f:
+                f.write(grid_bytes)
+        except OSError as e:
+            logger.warning(f"Could not save prepared quiz grid: {e}")
+            return None
+        return name
+
+    def _read_grid(self, name):
+        if name is None:
+            return None
+        try:
+            with open(os.path.join(self.grid_dir, name), "rb") as f:
+                return f.read()
+        except OSError as e:
+            logger.info(f"Prepared quiz grid {name} is unavailable: {e}")
+            return None
+
+    def _remove_grids(self, names):
+        for name in names:
+            if name is None:
+                continue
+            try:
+                os.remove(os.path.join(self.grid_dir, name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove prepared quiz grid {name}: {e}")
+
+    def _delete(self, session, query):
+        """Delete the rows matched by query; return how many went and the grids they held."""
+        rows = query.with_entities(PreparedQuiz.id, PreparedQuiz.grid_file).all()
+        if not rows:
+            return 0, []
+        deleted = (
+            session.query(PreparedQuiz)
+            .filter(PreparedQuiz.id.in_([quiz_id for quiz_id, _ in rows]))
+            .delete(synchronize_session=False)
+        )
+        return deleted, [grid_file for _, grid_file in rows]
+
+    def count(self, user_id):
+        """Number of unexpired quizzes waiting for user_id."""
+        with Session() as session:
+            return (
+                session.query(func.count(PreparedQuiz.id))
+                .filter(PreparedQuiz.user_id == user_id, PreparedQuiz.created_at > self._cutoff())
+                .scalar()
+            )
+
+    def push(self, user_id, team_id, quiz_data):
+        """Store a quiz from generate_quiz_data, evicting the user's oldest beyond per_user."""
+        grid_bytes = quiz_data.get("grid_bytes")
+        grid_file = self._write_grid(grid_bytes) if grid_bytes else None
+        with Session() as session:
+            try:
+                session.add(
+                    PreparedQuiz(
+                        user_id=user_id,
+                        team_id=team_id,
+                        correct_user_id=quiz_data["correct_choice"].id,
+                        option_ids=",".join(option.id for option in quiz_data["options"]),
+                        difficulty=quiz_data["difficulty"],
+                        grid_file=grid_file,
+                        created_at=datetime.utcnow(),
+                    )
+                )
+                session.flush()
+
+                evicted, stale_grids = self._delete(
+                    session,
+                    session.query(PreparedQuiz)
+                    .filter(PreparedQuiz.user_id == user_id)
+                    .order_by(PreparedQuiz.created_at.desc(), PreparedQuiz.id.desc())
+                    .offset(self.per_user),
+                )
+                session.commit()
+            except SQLAlchemyError as e:
+                session.rollback()
+                logger.error(f"Error storing prepared quiz for user {user_id}: {str(e)}")
+                self._remove_grids([grid_file])
+                return False
+
+        self._remove_grids(stale_grids)
+        self._count("stored")
+        self._count("evicted", evicted)
+        return True
+
+    def pop(self, user_id):
+        """
+        Claim the user's oldest unexpired quiz and return it in generate_quiz_data's shape,
+        or None. Quizzes whose options no longer resolve to users are discarded.
+        """
+        with Session() as session:
+            try:
+                expired, stale_grids = self._delete(
+                    session,
+                    session.query(PreparedQuiz).filter(
+                        PreparedQuiz.user_id == user_id, PreparedQuiz.created_at <= self._cutoff()
+                    ),
+                )
+                quiz = None
+                for candidate in (
+                    session.query(PreparedQuiz)
+                    .filter(PreparedQuiz.user_id == user_id)
+                    .order_by(PreparedQuiz.created_at, PreparedQuiz.id)
+                    .all()
+                ):
+                    # Claim by deleting; another worker may have taken it first
+                    claimed = (
+                        session.query(PreparedQuiz)
+                        .filter(PreparedQuiz.id == candidate.id)
+                        .delete(synchronize_session=False)
+                    )
+                    if claimed:
+                        quiz = {
+                            "id": candidate.id,
+                            "correct_user_id": candidate.correct_user_id,
+                            "option_ids": candidate.option_ids.split(","),
+                            "difficulty": candidate.difficulty,
+                            "grid_file": candidate.grid_file,
+                        }
+                        break
+                session.commit()
+            except SQLAlchemyError as e:
+                session.rollback()
+                logger.error(f"Error loading prepared quiz for user {user_id}: {str(e)}")
+                quiz = None
+                expired, stale_grids = 0, []
+
+            if quiz is not None:
+                # The row is gone, so the file is ours to read and delete
+                quiz["grid_bytes"] = self._read_grid(quiz["grid_file"])
+                stale_grids.append(quiz["grid_file"])
+            quiz_data = self._resolve(session, quiz) if quiz is not None else None
+
+        self._remove_grids(stale_grids)
+        self._count("evicted", expired)
+        self._count("hits" if quiz_data else "misses")
+        return quiz_data
+
+    def _resolve(self, session, quiz):
+        correct_user_id = quiz["correct_user_id"]
+        option_ids = quiz["option_ids"]
+        users = {
+            user.id: user
+            for user in session.query(User).filter(User.id.in_(option_ids + [correct_user_id]))
+        }
+        if correct_user_id not in users or any(uid not in users for uid in option_ids):
+            logger.info(f"Discarding prepared quiz {quiz['id']}: an option user no longer exists")
+            return None
+        return {
+            "correct_choice": users[correct_user_id],
+            "options": [users[uid] for uid in option_ids],
+            "grid_bytes": quiz["grid_bytes"],
+            "difficulty": quiz["difficulty"],
+        }
+
+    def discard(self, user_id=None):
+        """Drop the prepared quizzes of user_id (all quizzes when user_id is None)."""
+        with Session() as session:
+            try:
+                query = session.query(PreparedQuiz)
+                if user_id is not None:
+                    query = query.filter(PreparedQuiz.user_id == user_id)
+                deleted, stale_grids = self._delete(session, query)
+                session.commit()
+            except SQLAlchemyError as e:
+                session.rollback()
+                logger.error(f"Error discarding prepared quizzes for {user_id}: {str(e)}")
+                return 0
+        self._remove_grids(stale_grids)
+        self._count("evicted", deleted)
+        return deleted
+
+    def prune(self):
+        """
+        Delete expired quizzes, then the oldest ones beyond max_rows, then grid files older
+        than the TTL that no quiz can still be using (left behind by a crash or a failed push).
+        """
+        with Session() as session:
+            try:
+                deleted, stale_grids = self._delete(
+                    session,
+                    session.query(PreparedQuiz).filter(PreparedQuiz.created_at <= self._cutoff()),
+                )
+                overflow, overflow_grids = self._delete(
+                    session,
+                    session.query(PreparedQuiz)
+                    .order_by(PreparedQuiz.created_at.desc(), PreparedQuiz.id.desc())
+                    .offset(self.max_rows),
+                )
+                session.commit()
+            except SQLAlchemyError as e:
+                session.rollback()
+                logger.error(f"Error pruning prepared quizzes: {str(e)}")
+                return 0
+        deleted += overflow
+        self._remove_grids(stale_grids + overflow_grids)
+        self._remove_grids(self._orphaned_grids())
+        self._count("evicted", deleted)
+        logger.info(f"Pruned {deleted} prepared quizzes.")
+        return deleted
+
+    def _orphaned_grids(self):
+        cutoff = time.time() - self.ttl
+        try:
+            names = os.listdir(self.grid_dir)
+        except FileNotFoundError:
+            return []
+        orphans = []
+        for name in names:
+            try:
+                if os.stat(os.path.join(self.grid_dir, name)).st_mtime <= cutoff:
+                    orphans.append(name)
+            except FileNotFoundError:
+                continue
+        return orphans
+
+    def stats(self):
+        with Session() as session:
+            size = session.query(func.count(PreparedQuiz.id)).scalar()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stored": self.stored,
+                "evicted": self.evicted,
+                "per_user": self.per_user,
+                "ttl": self.ttl,
+                "max_rows": self.max_rows,
+            }
+
+
+prepared_quizzes = PreparedQuizStore(
+    per_user=int(os.environ.get("PREPARED_QUIZZES_PER_USER", "1")),
+    ttl=int(os.environ.get("PREPARED_QUIZ_TTL", "86400")),
+    max_rows=int(os.environ.get("PREPARED_QUIZ_MAX_ROWS", "5000")),
+    grid_dir=os.environ.get(
+        "PREPARED_QUIZ_GRID_DIR", os.path.join(avatar_cache.directory, "prepared-grids")
+    ),
+)
@@ -0,0 +1,170 @@
+# rate_limiter.py
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Sustained calls per minute for each rate-limited Slack API method, following Slack's
+# published tiers (Tier 3 = 50+/min, Tier 4 = 100+/min). chat.postMessage is limited per
+# channel rather than by tier; every quiz goes to a different DM, so it gets a higher budget.
+# files_upload_v2 is two API calls: getUploadURLExternal and completeUploadExternal.
+METHOD_RATE_LIMITS = {
+    "chat.postMessage": 300,
+    "chat.update": 50,
+    "conversations.open": 50,
+    "files.getUploadURLExternal": 100,
+    "files.completeUploadExternal": 100,
+    "views.publish": 100,
+}
+
+# Seconds of sustained rate that may be spent at once after an idle period
+SLACK_RATE_LIMIT_BURST = float(os.environ.get("SLACK_RATE_LIMIT_BURST", "5"))
+
+# Calls made while Slack waits (3s) for our response to a command, button press or event
+# wait at most this many seconds for a token and are then sent anyway.
+SLACK_INTERACTIVE_MAX_WAIT = float(os.environ.get("SLACK_INTERACTIVE_MAX_WAIT", "0.5"))
+
+# Set inside interactive_calls(). Worker threads (background_tasks, the scheduler, the
+# random-quiz pool) start with a fresh context, so their calls are always paced in full.
+_interactive = contextvars.ContextVar("slack_interactive_calls", default=False)
+
+
+@contextmanager
+def interactive_calls():
+    """Mark Slack calls made in this block as answering a request Slack is waiting on.
+
+    Also usable as a decorator on the Flask views Slack calls.
+    """
+    token = _interactive.set(True)
+    try:
+        yield
+    finally:
+        _interactive.reset(token)
+
+
+def in_interactive_call():
+    return _interactive.get()
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token if one is available; otherwise return how long to wait for one."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Tolerate float drift so a refill that lands just short of 1 still counts
+            if self._tokens >= 1 - 1e-9:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, max_wait=None):
+        """
+        Wait for and take one token; returns the number of seconds spent waiting.
+
+        With max_wait, gives up instead of waiting longer than that in total and returns None.
+        """
+        waited = 0.0
+        while True:
+            delay = self._reserve()
+            if delay <= 0:
+                return waited
+            if max_wait is not None and waited + delay > max_wait:
+                time.sleep(max(0.0, max_wait - waited))
+                return None
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        """Hand out no tokens for `seconds` (Slack's Retry-After), then restart empty."""
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self._paused_until:
+                self._paused_until = until
+                self._tokens = 0
+                self._updated = until
+
+
+class SlackRateLimiter:
+    """Token buckets keyed by (team_id, API method), for the methods in METHOD_RATE_LIMITS."""
+
+    def __init__(self, limits, burst):
+        self.limits = limits
+        self.burst = burst
+        self.calls = 0
+        self.throttled = 0
+        self.rate_limited = 0
+        self.unpaced = 0
+        self.wait_seconds = 0.0
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, team_id, method):
+        per_minute = self.limits.get(method)
+        if per_minute is None:
+            return None
+        key = (team_id, method)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                rate = per_minute / 60
+                bucket = self._buckets[key] = TokenBucket(rate, max(1.0, rate * self.burst))
+            return bucket
+
+    def acquire(self, team_id, method, max_wait=None):
+        """
+        Block until team_id may call method again. Unlisted methods pass straight through.
+
+        With max_wait, waits at most that long; returns False if no token was free by then
+        (the caller goes ahead unpaced) and True otherwise.
+        """
+        bucket = self._bucket(team_id, method)
+        if bucket is None:
+            return True
+        waited = bucket.acquire(max_wait)
+        with self._lock:
+            self.calls += 1
+            if waited is None:
+                self.unpaced += 1
+                self.wait_seconds += max_wait
+                return False
+            if waited:
+                self.throttled += 1
+                self.wait_seconds += waited
+        return True
+
+    def backoff(self, team_id, method, retry_after):
+        """Record a 429 from Slack and stop calling method for retry_after seconds."""
+        with self._lock:
+            self.rate_limited += 1
+        bucket = self._bucket(team_id, method)
+        if bucket is not None:
+            bucket.pause(retry_after)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "rate_limited": self.rate_limited,
+                "unpaced": self.unpaced,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "buckets": len(self._buckets),
+            }
+
+
+slack_rate_limiter = SlackRateLimiter(METHOD_RATE_LIMITS, SLACK_RATE_LIMIT_BURST)
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark for the quiz grid renderer.
+
+Compares the previous approach (load the font and draw each outlined label with
+49 text calls per quadrant) against compositing the pre-rendered label sprites.
+Avatars are synthetic, so no network access is needed.
+
+    python scripts/benchmark_grid.py [iterations]
+"""
+
+import io
+import os
+import random
+import sys
+import timeit
+
+sys.path.append(os.getcwd())
+
+from PIL import Image, ImageDraw, ImageFont  # noqa: E402
+
+from image_utils import TILE_SIZE, compose_grid  # noqa: E402
+
+
+def legacy_compose_grid(images):
+    """The grid renderer as it was before label sprites were introduced."""
+    grid_img = Image.new("RGB", (TILE_SIZE[0] * 2, TILE_SIZE[1] * 2), color="white")
+    draw = ImageDraw.Draw(grid_img)
+    positions = [(0, 0), (TILE_SIZE[0], 0), (0, TILE_SIZE[1]), (TILE_SIZE[0], TILE_SIZE[1])]
+
+    for idx, img_obj in enumerate(images[:4]):
+        x, y = positions[idx]
+        grid_img.paste(img_obj, (x, y))
+
+        try:
+            font = ImageFont.load_default(size=80)
+        except TypeError:
+            font = ImageFont.load_default()
+
+        text = str(idx + 1)
+        text_x, text_y = x + 20, y + 10
+        thick = 3
+        for off_x in range(-thick, thick + 1):
+            for off_y in range(-thick, thick + 1):
+                draw.text((text_x + off_x, text_y + off_y), text, font=font, fill="black")
+        draw.text((text_x, text_y), text, font=font, fill="cyan")
+
+    return grid_img
+
+
+def _tiles():
+    rng = random.Random(0)
+    return [
+        Image.frombytes("RGB", TILE_SIZE, rng.randbytes(TILE_SIZE[0] * TILE_SIZE[1] * 3))
+        for _ in range(4)
+    ]
+
+
+def _encode(grid_img):
+    output = io.BytesIO()
+    grid_img.save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+
+def benchmark(iterations=50):
+    tiles = _tiles()
+    cases = [
+        ("legacy labels", lambda: legacy_compose_grid(tiles)),
+        ("label sprites", lambda: compose_grid(tiles)),
+        ("legacy labels + JPEG", lambda: _encode(legacy_compose_grid(tiles))),
+        ("label sprites + JPEG", lambda: _encode(compose_grid(tiles))),
+    ]
+    print(f"Grid render time over {iterations} iterations (best of 3):")
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=iterations, repeat=3)) / iterations
+        print(f"  {name:<22} {best * 1000:8.2f} ms/grid")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,117 @@
+"""
+Concurrent-answer benchmark for score updates.
+
+Runs `threads` workers that each record `answers` answers for the same user, first
+with the previous read-modify-write of the Score row, then with the
+INSERT ... ON CONFLICT DO UPDATE that replaced it, and finally with the whole of
+update_score (score, history and leaderboard rows). Reports throughput, failed
+answers and answers lost to overwrites. Uses a throwaway SQLite file unless DATABASE_URL is set.
+
+    python scripts/benchmark_scores.py [threads] [answers]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.getcwd())
+
+if not os.environ.get("DATABASE_URL"):
+    _db_dir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir}/benchmark_scores.db"
+if not os.environ.get("ENCRYPTION_KEY"):
+    from cryptography.fernet import Fernet
+
+    os.environ["ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+
+from sqlalchemy.exc import SQLAlchemyError  # noqa: E402
+
+from database_helpers import (  # noqa: E402
+    _increment_counters,
+    add_or_update_user,
+    get_user_score,
+    update_score,
+)
+from db import Session, engine  # noqa: E402
+from models import Base, Score, ScoreHistory  # noqa: E402
+
+USER_ID = "UBENCH"
+
+
+def legacy_update_score(user_id, points, is_correct=False):
+    """The Score update as it was before the upsert: SELECT, add in Python, UPDATE."""
+    with Session() as session:
+        score = session.query(Score).filter(Score.user_id == user_id).one_or_none()
+        if score:
+            score.score += points
+            score.total_attempts += 1
+            if is_correct:
+                score.correct_attempts += 1
+        else:
+            session.add(
+                Score(
+                    user_id=user_id,
+                    score=points,
+                    total_attempts=1,
+                    correct_attempts=int(is_correct),
+                )
+            )
+        session.commit()
+
+
+def upsert_score(user_id, points, is_correct=False):
+    """The Score update update_score now performs, on its own for a like-for-like comparison."""
+    with Session() as session:
+        _increment_counters(session, Score, {"user_id": user_id}, points, is_correct)
+        session.commit()
+
+
+def _reset():
+    with Session() as session:
+        session.query(ScoreHistory).delete()
+        session.query(Score).delete()
+        session.commit()
+
+
+def _run(update, threads, answers):
+    _reset()
+    failures = []
+
+    def worker():
+        for _ in range(answers):
+            try:
+                update(USER_ID, 1, is_correct=True)
+            except SQLAlchemyError:
+                failures.append(1)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    expected = threads * answers - len(failures)
+    recorded = get_user_score(USER_ID)[1]
+    return expected / elapsed, len(failures), expected - recorded
+
+
+def benchmark(threads=8, answers=200):
+    Base.metadata.create_all(bind=engine)
+    add_or_update_user(USER_ID, "Benchmark", "http://example.com/bench.jpg", "TBENCH")
+    cases = [
+        ("read-modify-write", legacy_update_score),
+        ("upsert", upsert_score),
+        ("full update_score", update_score),
+    ]
+    print(f"{threads} threads x {answers} answers for one user on {engine.dialect.name}:")
+    for name, update in cases:
+        rate, failed, lost = _run(update, threads, answers)
+        print(f"  {name:<20} {rate:8.0f} answers/s  {failed:5d} failed  {lost:5d} lost")
+
+
+if __name__ == "__main__":
+    benchmark(*(int(arg) for arg in sys.argv[1:3]))
@@ -1,23 +1,147 @@
 # slack_client.py
+import email.message
+import io
 import logging
 import os
+import time
+from urllib.error import HTTPError, URLError
 
+import requests
+from requests.adapters import HTTPAdapter
 from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
+from slack_sdk.errors import SlackApiError, SlackRequestError
 from slack_sdk.signature import SignatureVerifier
 
 from app_home import publish_home_view
+from cache import workspace_client_cache
 from database_helpers import add_or_update_user, add_workspace, get_workspace_access_token
+from rate_limiter import SLACK_INTERACTIVE_MAX_WAIT, in_interactive_call, slack_rate_limiter
 from utils import fetch_and_store_users, should_skip_user
 
 logger = logging.getLogger(__name__)
 
+# How many times a call that got a 429 is queued again before the error is raised
+SLACK_RATE_LIMIT_RETRIES = int(os.environ.get("SLACK_RATE_LIMIT_RETRIES", "3"))
+
+# Keep-alive connection pool shared by every Slack client in this process
+SLACK_HTTP_POOL_SIZE = int(os.environ.get("SLACK_HTTP_POOL_SIZE", "10"))
+http_session = requests.Session()
+http_session.mount("https://", HTTPAdapter(pool_maxsize=SLACK_HTTP_POOL_SIZE))
+
+
+class SSLContextAdapter(HTTPAdapter):
+    """HTTPAdapter that opens TLS connections with a given ssl.SSLContext (WebClient's ssl)."""
+
+    def __init__(self, ssl_context, **kwargs):
+        self.ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(
+            request, verify, cert
+        )
+        pool_kwargs["ssl_context"] = self.ssl_context
+        # Let the context decide verification instead of requests' verify=True default
+        pool_kwargs["cert_reqs"] = self.ssl_context.verify_mode
+        return host_params, pool_kwargs
+
+
+def _to_message(headers):
+    """Copy response headers into the email.message.Message shape urllib responses have."""
+    message = email.message.Message()
+    for key, value in headers.items():
+        message[key] = value
+    return message
+
+
+class PooledWebClient(WebClient):
+    """WebClient that sends API calls over the shared keep-alive requests session.
+
+    The stock client opens a new urllib connection (and TLS handshake) per call; this only swaps
+    the transport, so retries and response parsing stay slack_sdk's own. It overrides the private
+    WebClient._perform_urllib_http_request_internal as of slack_sdk 3.33.3 (requirements.txt);
+    re-check the override when upgrading slack_sdk. A client created with ssl= gets its own
+    session that uses that SSLContext; proxy and timeout are passed through per request.
+
+    Calls are also paced by slack_rate_limiter per (workspace, method): they wait for a token
+    instead of failing, and a 429 pauses that method for Retry-After seconds before retrying.
+    Calls made inside interactive_calls() (the Slack request handlers) run in Slack's 3-second
+    response window, so they only wait briefly for a token and raise a 429 straight away
+    instead of sleeping through Retry-After.
+    """
+
+    def __init__(self, *args, rate_limit_key=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Workspace the token belongs to; not WebClient's team_id, which is sent with every call
+        self.rate_limit_key = rate_limit_key
+        if self.ssl is None:
+            self.http_session = http_session
+        else:
+            self.http_session = requests.Session()
+            self.http_session.mount(
+                "https://",
+                SSLContextAdapter(self.ssl, pool_maxsize=SLACK_HTTP_POOL_SIZE),
+            )
+
+    def api_call(self, api_method, **kwargs):
+        interactive = in_interactive_call()
+        max_wait = SLACK_INTERACTIVE_MAX_WAIT if interactive else None
+        for attempt in range(SLACK_RATE_LIMIT_RETRIES + 1):
+            slack_rate_limiter.acquire(self.rate_limit_key, api_method, max_wait=max_wait)
+            try:
+                return super().api_call(api_method, **kwargs)
+            except SlackApiError as e:
+                if e.response.status_code != 429:
+                    raise
+                retry_after = float(e.response.headers.get("Retry-After", 1))
+                slack_rate_limiter.backoff(self.rate_limit_key, api_method, retry_after)
+                if interactive or attempt == SLACK_RATE_LIMIT_RETRIES:
+                    raise
+                logger.warning(
+                    f"Rate limited on {api_method} for {self.rate_limit_key}; "
+                    f"retrying in {retry_after}s"
+                )
+                if api_method not in slack_rate_limiter.limits:
+                    time.sleep(retry_after)
+
+    def _perform_urllib_http_request_internal(self, url, req):
+        if not url.lower().startswith("http"):
+            raise SlackRequestError(f"Invalid URL detected: {url}")
+
+        proxies = {"http": self.proxy, "https": self.proxy} if self.proxy else None
+        try:
+            resp = self.http_session.post(
+                url,
+                data=req.data,
+                headers={key: str(value) for key, value in req.header_items()},
+                timeout=self.timeout,
+                proxies=proxies,
+            )
+        except requests.ConnectionError as e:
+            # Surface as URLError so slack_sdk's ConnectionErrorRetryHandler retries
+            # (e.g. a pooled connection the server already closed)
+            raise URLError(e) from e
+        headers = _to_message(resp.headers)
+        if resp.status_code >= 400:
+            # slack_sdk's error and retry handling expects urllib's HTTPError
+            raise HTTPError(url, resp.status_code, resp.reason, headers, io.BytesIO(resp.content))
+
+        if headers.get_content_type() == "application/gzip":
+            return {"status": resp.status_code, "headers": headers, "body": resp.content}
+        charset = headers.get_content_charset() or "utf-8"
+        return {
+            "status": resp.status_code,
+            "headers": headers,
+            "body": resp.content.decode(charset),
+        }
+
+
 # Slack bot token and client setup
 SLACK_BOT_TOKEN = os.environ.get("SLACK_BOT_TOKEN")
 if not SLACK_BOT_TOKEN:
     logger.error("SLACK_BOT_TOKEN is not set!")
 
-client = WebClient(token=SLACK_BOT_TOKEN)
+client = PooledWebClient(token=SLACK_BOT_TOKEN)
 
 # Slack signing secret and signature verifier setup
 SLACK_SIGNING_SECRET = os.environ.get("SLACK_SIGNING_SECRET")
@@ -32,8 +156,13 @@ signature_verifier = SignatureVerifier(signing_secret=SLACK_SIGNING_SECRET)
 def get_slack_client(team_id=None):
     """
     Returns a Slack client for a specific workspace. If no team_id is provided, returns the default client.
+    Workspace clients are cached per team, so the token is only read and decrypted on a miss.
     """
     if team_id:
+        cached_client = workspace_client_cache.get(team_id)
+        if cached_client is not None:
+            return cached_client
+
         try:
             logger.debug(f"Attempting to retrieve access token for team_id: {team_id}")
             access_token = get_workspace_access_token(team_id)
@@ -46,7 +175,9 @@ def get_slack_client(team_id=None):
                     else "******"
                 )
                 logger.debug(f"Using access token: {masked_token}")
-                return WebClient(token=access_token)
+                workspace_client = PooledWebClient(token=access_token, rate_limit_key=team_id)
+                workspace_client_cache.set(team_id, workspace_client)
+                return workspace_client
             else:
                 logger.warning(
                     f"No access token found for team_id: {team_id}. Falling back to default bot token."
@@ -55,7 +186,7 @@ def get_slack_client(team_id=None):
             logger.error(f"Error retrieving access token for team_id {team_id}: {e}")
 
     logger.debug("Using default Slack client with SLACK_BOT_TOKEN.")
-    return WebClient(token=os.environ.get("SLACK_BOT_TOKEN"))
+    return client
 
 
 def verify_slack_signature(request):
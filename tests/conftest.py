@@ -47,16 +47,58 @@ def create_tables():
 def clean_db():
     """Truncate all tables between tests."""
     yield
+    from cache import (
+        dm_channel_cache,
+        grid_file_cache,
+        leaderboard_cache,
+        workspace_client_cache,
+    )
     from db import Session
-    from models import QuizSession, Score, ScoreHistory, User, Workspace
+    from models import (
+        LeaderboardEntry,
+        PreparedQuiz,
+        QuizSession,
+        Score,
+        ScoreDaily,
+        ScoreHistory,
+        User,
+        Workspace,
+    )
 
     with Session() as session:
+        session.query(LeaderboardEntry).delete()
+        session.query(PreparedQuiz).delete()
         session.query(ScoreHistory).delete()
+        session.query(ScoreDaily).delete()
         session.query(QuizSession).delete()
         session.query(Score).delete()
         session.query(User).delete()
         session.query(Workspace).delete()
         session.commit()
+    leaderboard_cache.invalidate()
+    workspace_client_cache.invalidate()
+    grid_file_cache.invalidate()
+    dm_channel_cache.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def isolated_avatar_cache(tmp_path):
+    """Give every test an empty on-disk avatar cache."""
+    from avatar_cache import AvatarCache
+
+    cache = AvatarCache(str(tmp_path / "avatars"), max_bytes=64 * 1024 * 1024, max_age=3600)
+    with patch("image_utils.avatar_cache", cache):
+        yield cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_grid_dir(tmp_path):
+    """Keep prepared quiz grids written by a test inside its own temporary directory."""
+    from quiz_store import prepared_quizzes
+
+    grid_dir = str(tmp_path / "grids")
+    with patch.object(prepared_quizzes, "grid_dir", grid_dir):
+        yield grid_dir
 
 
 # ── helpers ──────────────────────────────────────────────────────────────────
@@ -76,6 +118,22 @@ def make_user():
     return _make
 
 
+@pytest.fixture
+def set_streak():
+    """Factory: set a user's current streak and last answer time."""
+    from db import Session
+    from models import User
+
+    def _set(user_id, streak, last_answered_at=None):
+        with Session() as s:
+            s.query(User).filter_by(id=user_id).update(
+                {User.current_streak: streak, User.last_answered_at: last_answered_at}
+            )
+            s.commit()
+
+    return _set
+
+
 @pytest.fixture
 def make_workspace():
     """Factory: create a Workspace row and return it."""
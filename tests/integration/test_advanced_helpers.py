@@ -1,15 +1,19 @@
 """Tests for database_helpers functions requiring richer data setup."""
 
 from database_helpers import (
+    SCORE_HISTORY_RETENTION_DAYS,
+    backfill_leaderboard_entries,
+    backfill_score_daily,
+    compact_score_history,
     get_all_workspaces,
     get_fun_stats,
+    get_period_start,
     get_random_user_images,
+    get_team_leaderboard,
     get_top_scores,
     get_top_scores_period,
     get_workspace_access_token,
     update_score,
-    update_user_quiz_schedule,
-    update_user_streak,
 )
 
 
@@ -69,6 +73,22 @@ class TestGetTopScores:
         scores = get_top_scores()
         assert scores[0][0] == "High"
 
+    def test_limit_applied_after_ordering(self, make_user):
+        for i in range(4):
+            make_user(user_id=f"U{i:03d}", name=f"Player{i}")
+            for _ in range(10):
+                update_score(f"U{i:03d}", i + 1, is_correct=True)
+        scores = get_top_scores(limit=2)
+        assert [s[0] for s in scores] == ["Player3", "Player2"]
+
+    def test_leaderboard_index_exists(self):
+        from sqlalchemy import inspect
+
+        from db import engine
+
+        index_names = {ix["name"] for ix in inspect(engine).get_indexes("scores")}
+        assert "ix_scores_leaderboard" in index_names
+
 
 class TestGetTopScoresPeriod:
     def test_empty_returns_empty(self):
@@ -87,6 +107,15 @@ class TestGetTopScoresPeriod:
         assert len(scores) == 1
         assert scores[0][0] == "Recent"
 
+    def test_ranked_and_limited(self, make_user):
+        from datetime import datetime, timedelta
+
+        for i in range(4):
+            make_user(user_id=f"U{i:03d}", name=f"Player{i}")
+            update_score(f"U{i:03d}", i + 1, is_correct=True)
+        start = datetime.utcnow() - timedelta(hours=1)
+        assert [s[0] for s in get_top_scores_period(start, limit=2)] == ["Player3", "Player2"]
+
     def test_scores_before_period_excluded(self, make_user):
         from datetime import datetime, timedelta
 
@@ -98,14 +127,209 @@ class TestGetTopScoresPeriod:
         assert scores == []
 
 
+class TestScoreDaily:
+    @staticmethod
+    def _history(session, user_id, created_at, points=10, is_correct=True):
+        from models import ScoreHistory
+
+        session.add(
+            ScoreHistory(
+                user_id=user_id, score=points, is_correct=is_correct, created_at=created_at
+            )
+        )
+
+    def test_update_score_maintains_rollup(self, make_user):
+        from db import Session
+        from models import ScoreDaily
+
+        make_user(user_id="U001")
+        update_score("U001", 10, is_correct=True)
+        update_score("U001", 2, is_correct=False)
+        with Session() as session:
+            row = session.query(ScoreDaily).one()
+            assert row.day == get_period_start("day")
+            assert (row.score, row.total_attempts, row.correct_attempts) == (12, 2, 1)
+
+    def test_period_scores_read_rollups_for_whole_days(self, make_user):
+        from db import Session
+        from models import ScoreHistory
+
+        make_user(user_id="U001", name="Rolled")
+        update_score("U001", 10, is_correct=True)
+        with Session() as session:
+            session.query(ScoreHistory).delete()
+            session.commit()
+
+        scores = get_top_scores_period(get_period_start("day"))
+        assert [(s[0], s[3], s[4]) for s in scores] == [("Rolled", 10, 1)]
+
+    def test_partial_day_start_adds_raw_history(self, make_user):
+        from datetime import timedelta
+
+        from db import Session
+        from models import ScoreDaily
+
+        make_user(user_id="U001", name="Partial")
+        yesterday = get_period_start("day") - timedelta(days=1)
+        with Session() as session:
+            self._history(session, "U001", yesterday + timedelta(hours=6))
+            self._history(session, "U001", yesterday + timedelta(hours=20), points=2)
+            session.add(
+                ScoreDaily(
+                    team_id="T001",
+                    user_id="U001",
+                    day=yesterday,
+                    score=12,
+                    total_attempts=2,
+                    correct_attempts=2,
+                )
+            )
+            session.commit()
+        update_score("U001", 5, is_correct=True)
+
+        scores = get_top_scores_period(yesterday + timedelta(hours=12))
+        assert [(s[3], s[4]) for s in scores] == [(7, 2)]
+
+    def test_compaction_keeps_rollups(self, make_user):
+        from datetime import timedelta
+
+        from db import Session
+        from models import ScoreHistory
+
+        make_user(user_id="U001")
+        old = get_period_start("day") - timedelta(days=SCORE_HISTORY_RETENTION_DAYS + 1)
+        with Session() as session:
+            self._history(session, "U001", old)
+            session.commit()
+        backfill_score_daily()
+        update_score("U001", 10, is_correct=True)
+
+        assert compact_score_history() == 1
+        with Session() as session:
+            assert session.query(ScoreHistory).count() == 1
+        assert get_top_scores_period(old)[0][3] == 20
+
+    def test_backfill_groups_history_by_user_and_day(self, make_user):
+        from datetime import timedelta
+
+        from db import Session
+        from models import ScoreDaily
+
+        make_user(user_id="U001")
+        make_user(user_id="U002")
+        today = get_period_start("day")
+        with Session() as session:
+            self._history(session, "U001", today + timedelta(minutes=1))
+            self._history(session, "U001", today + timedelta(minutes=2), 2, False)
+            self._history(session, "U001", today - timedelta(hours=1))
+            self._history(session, "U002", today + timedelta(minutes=3))
+            session.commit()
+
+        assert backfill_score_daily() == 3
+        with Session() as session:
+            row = session.query(ScoreDaily).filter_by(user_id="U001", day=today).one()
+            assert (row.score, row.total_attempts, row.correct_attempts) == (12, 2, 1)
+        # Second run is a no-op once the table is populated
+        assert backfill_score_daily() == 0
+
+
+class TestTeamLeaderboard:
+    def test_rankings_are_scoped_to_team(self, make_user):
+        make_user(user_id="U001", name="TeamA", team_id="TA")
+        make_user(user_id="U002", name="TeamB", team_id="TB")
+        update_score("U001", 10, is_correct=True)
+        update_score("U002", 20, is_correct=True)
+
+        for period in ("day", "week"):
+            assert [s[0] for s in get_team_leaderboard("TA", period)] == ["TeamA"]
+            assert [s[0] for s in get_team_leaderboard("TB", period)] == ["TeamB"]
+
+    def test_all_time_requires_minimum_attempts(self, make_user):
+        make_user(user_id="U001", name="Newbie", team_id="TA")
+        for _ in range(9):
+            update_score("U001", 10, is_correct=True)
+        assert get_team_leaderboard("TA", "all") == []
+
+        update_score("U001", 10, is_correct=False)
+        name, pct, image, score, attempts, streak = get_team_leaderboard("TA", "all")[0]
+        assert (name, score, attempts, pct) == ("Newbie", 100, 10, 90.0)
+
+    def test_sorted_and_limited(self, make_user):
+        for i in range(4):
+            make_user(user_id=f"U{i:03d}", name=f"Player{i}", team_id="TA")
+            update_score(f"U{i:03d}", i + 1, is_correct=True)
+        assert [s[0] for s in get_team_leaderboard("TA", "day", limit=2)] == [
+            "Player3",
+            "Player2",
+        ]
+
+    def test_unknown_period_raises(self):
+        import pytest
+
+        with pytest.raises(ValueError):
+            get_team_leaderboard("TA", "month")
+
+    def test_backfill_builds_entries_from_existing_scores(self, make_user):
+        from db import Session
+        from models import LeaderboardEntry
+
+        make_user(user_id="U001", name="Veteran", team_id="TA")
+        for _ in range(10):
+            update_score("U001", 5, is_correct=True)
+        with Session() as session:
+            session.query(LeaderboardEntry).delete()
+            session.commit()
+
+        assert backfill_leaderboard_entries() == 1
+        assert get_team_leaderboard("TA", "all")[0][3] == 50
+        # Second run is a no-op once the table is populated
+        assert backfill_leaderboard_entries() == 0
+
+    def test_only_all_time_entries_are_stored(self, make_user):
+        from db import Session
+        from models import LeaderboardEntry
+
+        make_user(user_id="U001", team_id="TA")
+        update_score("U001", 10, is_correct=True)
+        with Session() as session:
+            assert [e.period for e in session.query(LeaderboardEntry)] == ["all"]
+
+    def test_day_board_sums_only_todays_rollups(self, make_user):
+        from datetime import timedelta
+
+        from db import Session
+        from models import ScoreDaily
+
+        make_user(user_id="U001", name="Yesterday", team_id="TA")
+        make_user(user_id="U002", name="Today", team_id="TA")
+        with Session() as session:
+            session.add(
+                ScoreDaily(
+                    team_id="TA",
+                    day=get_period_start("day") - timedelta(days=1),
+                    user_id="U001",
+                    score=100,
+                    total_attempts=10,
+                    correct_attempts=10,
+                )
+            )
+            session.commit()
+        update_score("U002", 5, is_correct=True)
+        update_score("U002", 5, is_correct=False)
+
+        assert [(s[0], s[1], s[3], s[4]) for s in get_team_leaderboard("TA", "day")] == [
+            ("Today", 50.0, 10, 2)
+        ]
+
+
 class TestGetFunStats:
     def test_empty_db_returns_empty_dict(self):
-        assert get_fun_stats() == {}
+        assert get_fun_stats("T001") == {}
 
-    def test_streak_master_identified(self, make_user):
+    def test_streak_master_identified(self, make_user, set_streak):
         make_user(user_id="U001", name="StreakKing")
-        update_user_streak("U001", 5, None)
-        stats = get_fun_stats()
+        set_streak("U001", 5)
+        stats = get_fun_stats("T001")
         assert "streak_master" in stats
         assert stats["streak_master"]["name"] == "StreakKing"
         assert stats["streak_master"]["value"] == 5
@@ -114,48 +338,23 @@ class TestGetFunStats:
         make_user(user_id="U001", name="Dedicated")
         for _ in range(15):
             update_score("U001", 10, is_correct=True)
-        stats = get_fun_stats()
+        stats = get_fun_stats("T001")
         assert "most_dedicated" in stats
         assert stats["most_dedicated"]["name"] == "Dedicated"
         assert stats["most_dedicated"]["value"] == 15
 
-
-class TestUpdateUserQuizSchedule:
-    def test_updates_schedule(self, make_user):
-        from datetime import datetime, timedelta
-
-        make_user(user_id="U001")
-        next_quiz = datetime.utcnow() + timedelta(hours=2)
-        update_user_quiz_schedule("U001", next_quiz)
-        from database_helpers import get_user
-
-        user = get_user("U001")
-        assert user.next_random_quiz_at is not None
-
-    def test_missing_user_does_not_raise(self):
-        from datetime import datetime, timedelta
-
-        # Should silently do nothing
-        update_user_quiz_schedule("UNOPE", datetime.utcnow() + timedelta(hours=1))
-
-
-class TestUpdateUserStreak:
-    def test_sets_streak(self, make_user):
-        from datetime import datetime
-
-        make_user(user_id="U001")
-        now = datetime.utcnow()
-        update_user_streak("U001", 3, now)
-        from database_helpers import get_user
-
-        user = get_user("U001")
-        assert user.current_streak == 3
-        assert user.last_answered_at is not None
-
-    def test_missing_user_does_not_raise(self):
-        from datetime import datetime
-
-        update_user_streak("UNOPE", 5, datetime.utcnow())
+    def test_other_workspaces_are_not_shown(self, make_user, set_streak):
+        make_user(user_id="U001", name="Elsewhere", team_id="T002")
+        set_streak("U001", 9)
+        update_score("U001", 10, is_correct=True)
+        make_user(user_id="U002", name="Local", team_id="T001")
+        set_streak("U002", 1)
+        update_score("U002", 10, is_correct=True)
+
+        stats = get_fun_stats("T001")
+        assert stats["streak_master"]["name"] == "Local"
+        assert stats["most_dedicated"]["name"] == "Local"
+        assert get_fun_stats("T003") == {}
 
 
 class TestGetWorkspaceAccessToken:
@@ -1,10 +1,16 @@
 """Integration tests for database_helpers.py against a real SQLite DB."""
 
+import threading
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
 import pytest
+from sqlalchemy.exc import SQLAlchemyError
 
 from database_helpers import (
     add_or_update_user,
     add_workspace,
+    claim_users_due_for_quiz,
     create_or_update_quiz_session,
     delete_quiz_session,
     delete_user_score,
@@ -16,12 +22,14 @@ from database_helpers import (
     get_opted_in_user_count,
     get_user,
     get_user_attempts,
-    get_user_name,
     get_user_score,
-    get_users_due_for_quiz,
     get_workspace_access_token,
     has_user_opted_in,
+    iter_users_due_for_quiz,
+    record_quiz_answer,
     reset_quiz_session,
+    schedule_next_random_quizzes,
+    sync_team_users,
     update_score,
     update_user_difficulty_mode,
     update_user_opt_in,
@@ -65,22 +73,101 @@ class TestUser:
     def test_no_users_for_team(self):
         assert does_user_exist("TNOPE") is False
 
-    def test_get_user_name(self, make_user):
+    def test_user_name_is_decrypted(self, make_user):
         make_user(user_id="U002", name="Diana")
-        assert get_user_name("U002") == "Diana"
+        assert get_user("U002").name == "Diana"
 
-    def test_get_user_name_unknown(self):
-        assert get_user_name("UNOPE") == "Unknown"
+    def test_unchanged_profile_is_not_rewritten(self, make_user):
+        make_user(user_id="U003", name="Same", image="http://img", team_id="T001")
+        before = get_user("U003").name_encrypted
+        add_or_update_user("U003", "Same", "http://img", "T001")
+        assert get_user("U003").name_encrypted == before
 
     def test_update_user_name(self, make_user):
         make_user(user_id="U003", name="Old Name", team_id="T001")
         add_or_update_user("U003", "New Name", "http://img", "T001")
-        assert get_user_name("U003") == "New Name"
+        assert get_user("U003").name == "New Name"
 
     def test_get_user_returns_none_for_missing(self):
         assert get_user("UNOPE") is None
 
 
+# ── Bulk user sync ───────────────────────────────────────────────────────────
+
+
+class TestSyncTeamUsers:
+    def test_adds_new_users(self):
+        counts = sync_team_users("T001", [("U001", "Alice", "http://a"), ("U002", "Bob", None)])
+        assert counts == {"added": 2, "updated": 0, "unchanged": 0}
+        assert get_user("U001").name == "Alice"
+        assert get_user("U002").image is None
+
+    def test_only_changed_users_are_rewritten(self, make_user):
+        make_user(user_id="U001", name="Alice", image="http://a", team_id="T001")
+        make_user(user_id="U002", name="Bob", image="http://b", team_id="T001")
+        before = get_user("U001").name_encrypted
+
+        counts = sync_team_users(
+            "T001", [("U001", "Alice", "http://a"), ("U002", "Robert", "http://b")]
+        )
+
+        assert counts == {"added": 0, "updated": 1, "unchanged": 1}
+        assert get_user("U001").name_encrypted == before
+        assert get_user("U002").name == "Robert"
+
+    def test_user_of_another_team_is_skipped(self, make_user):
+        make_user(user_id="U001", name="Alice", team_id="T001")
+        counts = sync_team_users(
+            "T002", [("U001", "Alice", "http://a"), ("U002", "Bob", "http://b")]
+        )
+        assert counts["added"] == 1
+        assert get_user("U001").team_id == "T001"
+
+    def test_unchanged_profile_is_skipped_by_digest(self, make_user):
+        make_user(user_id="U001", name="Alice", image="http://a", team_id="T001")
+        with patch("models.decrypt_value") as mock_decrypt:
+            counts = sync_team_users("T001", [("U001", "Alice", "http://a")])
+        mock_decrypt.assert_not_called()
+        assert counts["unchanged"] == 1
+
+    def test_legacy_row_without_digest_gets_backfilled(self, make_user):
+        from db import Session
+        from models import User, profile_digest
+
+        make_user(user_id="U001", name="Alice", image="http://a", team_id="T001")
+        with Session() as session:
+            session.query(User).filter_by(id="U001").update({User.profile_digest: None})
+            session.commit()
+        before = get_user("U001").name_encrypted
+
+        counts = sync_team_users("T001", [("U001", "Alice", "http://a")])
+
+        user = get_user("U001")
+        assert counts["unchanged"] == 1
+        assert user.name_encrypted == before
+        assert user.profile_digest == profile_digest("Alice", "http://a")
+
+    def test_profile_without_name_does_not_lose_the_page(self, make_user):
+        make_user(user_id="U003", name="Dave", image="http://d", team_id="T001")
+        counts = sync_team_users(
+            "T001",
+            [
+                ("U001", "Alice", "http://a"),
+                ("U002", "", "http://b"),
+                ("U003", None, "http://d"),
+                ("U004", "Carol", "http://c"),
+            ],
+        )
+        assert counts == {"added": 2, "updated": 0, "unchanged": 0}
+        assert get_user("U001").name == "Alice"
+        assert get_user("U002") is None
+        assert get_user("U003").name == "Dave"
+        assert get_user("U004").name == "Carol"
+
+    def test_empty_profiles_is_a_no_op(self):
+        assert sync_team_users("T001", []) == {"added": 0, "updated": 0, "unchanged": 0}
+
+
 # ── Opt-in ───────────────────────────────────────────────────────────────────
 
 
@@ -150,6 +237,35 @@ class TestScores:
         assert attempts == 2
         assert correct == 2
 
+    def test_concurrent_updates_are_not_lost(self, make_user):
+        make_user(user_id="U035")
+
+        def answer():
+            for _ in range(10):
+                update_score("U035", 3, is_correct=True)
+
+        threads = [threading.Thread(target=answer) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert get_user_score("U035") == (240, 80, 80)
+
+    def test_increment_compiles_to_postgres_upsert(self):
+        from sqlalchemy.dialects import postgresql
+
+        from database_helpers import _increment_counters
+        from models import Score
+
+        session = MagicMock()
+        session.get_bind.return_value.dialect.name = "postgresql"
+        _increment_counters(session, Score, {"user_id": "U036"}, 10, True)
+
+        sql = str(session.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+        assert "ON CONFLICT (user_id) DO UPDATE" in sql
+        assert "scores.score + excluded.score" in sql
+
     def test_get_user_attempts(self, make_user):
         make_user(user_id="U034")
         update_score("U034", 10)
@@ -194,6 +310,64 @@ class TestQuizSession:
         assert session.correct_user_id == "U_SECOND"
 
 
+class TestRecordQuizAnswer:
+    @staticmethod
+    def _points(user, is_correct, now):
+        return 4, (10 if is_correct else 2)
+
+    def test_records_correct_answer(self, make_user):
+        make_user(user_id="U044", name="Player")
+        make_user(user_id="U045", name="Answer")
+        create_or_update_quiz_session("U044", "U045")
+
+        answer = record_quiz_answer("U044", "U045", self._points)
+
+        assert answer["correct_user_id"] == "U045"
+        assert answer["is_correct"] is True
+        assert answer["streak"] == 4
+        assert answer["points"] == 10
+        assert answer["names"]["U045"] == "Answer"
+        assert get_user_score("U044") == (10, 1, 1)
+        assert get_user("U044").current_streak == 4
+        assert get_active_quiz_session("U044") is None
+
+    def test_wrong_answer_returns_both_names(self, make_user):
+        make_user(user_id="U044", name="Player")
+        make_user(user_id="U045", name="Answer")
+        make_user(user_id="U046", name="Picked")
+        create_or_update_quiz_session("U044", "U045")
+
+        answer = record_quiz_answer("U044", "U046", self._points)
+
+        assert answer["is_correct"] is False
+        assert answer["names"]["U045"] == "Answer"
+        assert answer["names"]["U046"] == "Picked"
+        assert get_user_score("U044") == (2, 1, 0)
+
+    def test_second_answer_is_not_scored(self, make_user):
+        make_user(user_id="U044")
+        create_or_update_quiz_session("U044", "U045")
+
+        assert record_quiz_answer("U044", "U045", self._points) is not None
+        assert record_quiz_answer("U044", "U045", self._points) is None
+        assert get_user_score("U044") == (10, 1, 1)
+
+    def test_no_session_returns_none(self, make_user):
+        make_user(user_id="U044")
+        calculate = MagicMock()
+        assert record_quiz_answer("U044", "U045", calculate) is None
+        calculate.assert_not_called()
+
+    def test_database_error_keeps_session(self, make_user):
+        make_user(user_id="U044")
+        create_or_update_quiz_session("U044", "U045")
+        with patch("database_helpers._add_score", side_effect=SQLAlchemyError("boom")):
+            with pytest.raises(SQLAlchemyError):
+                record_quiz_answer("U044", "U045", self._points)
+        assert get_active_quiz_session("U044") is not None
+        assert get_user_score("U044") == (0, 0, 0)
+
+
 # ── Colleagues ────────────────────────────────────────────────────────────────
 
 
@@ -279,14 +453,88 @@ class TestUsersDueForQuiz:
     def test_opted_in_user_with_no_schedule_is_due(self, make_user):
         make_user(user_id="U110", team_id="T110")
         update_user_opt_in("U110", True)
-        due = get_users_due_for_quiz()
-        assert any(u.id == "U110" for u in due)
+        assert ("U110", "T110") in list(iter_users_due_for_quiz())
 
     def test_opted_out_user_not_due(self, make_user):
         make_user(user_id="U111", team_id="T111")
         # opted_in defaults to False
-        due = get_users_due_for_quiz()
-        assert not any(u.id == "U111" for u in due)
+        assert all(user_id != "U111" for user_id, _ in iter_users_due_for_quiz())
+
+    def test_iterator_pages_through_due_users(self, make_user):
+        now = datetime.utcnow()
+        for i in range(7):
+            make_user(user_id=f"U14{i}", team_id="T140")
+            update_user_opt_in(f"U14{i}", True)
+        # Two users share a schedule time, so the keyset must break ties on id
+        schedule_next_random_quizzes(
+            {
+                "U140": now - timedelta(minutes=5),
+                "U141": now - timedelta(minutes=10),
+                "U142": now - timedelta(minutes=10),
+                "U143": now + timedelta(hours=1),
+            }
+        )
+        make_user(user_id="U149", team_id="T140")  # Not opted in
+
+        due = list(iter_users_due_for_quiz(batch_size=2, now=now))
+
+        assert due == [
+            ("U144", "T140"),
+            ("U145", "T140"),
+            ("U146", "T140"),
+            ("U141", "T140"),
+            ("U142", "T140"),
+            ("U140", "T140"),
+        ]
+
+    def test_iterator_with_no_due_users(self, make_user):
+        make_user(user_id="U150", team_id="T150")
+        assert list(iter_users_due_for_quiz()) == []
+
+    def test_claim_leases_due_users_once(self, make_user):
+        make_user(user_id="U110", team_id="T110")
+        make_user(user_id="U111", team_id="T111")
+        make_user(user_id="U112", team_id="T110")
+        update_user_opt_in("U110", True)
+        update_user_opt_in("U112", True)
+        schedule_next_random_quizzes({"U112": datetime.utcnow() + timedelta(hours=1)})
+
+        lease_until = datetime.utcnow() + timedelta(minutes=30)
+        assert claim_users_due_for_quiz(10, lease_until) == [("U110", "T110")]
+        # Claimed users are no longer due
+        assert claim_users_due_for_quiz(10, lease_until) == []
+        user = get_user("U110")
+        assert user.next_random_quiz_at == lease_until
+        assert user.last_quiz_sent_at is not None
+
+    def test_claim_respects_limit(self, make_user):
+        for i in range(3):
+            make_user(user_id=f"U12{i}", team_id="T120")
+            update_user_opt_in(f"U12{i}", True)
+        lease_until = datetime.utcnow() + timedelta(minutes=30)
+        assert len(claim_users_due_for_quiz(2, lease_until)) == 2
+        assert len(claim_users_due_for_quiz(2, lease_until)) == 1
+
+    def test_claim_skips_users_claimed_after_selection(self, make_user):
+        make_user(user_id="U125", team_id="T125")
+        update_user_opt_in("U125", True)
+        lease_until = datetime.utcnow() + timedelta(minutes=30)
+        # Another worker claims U125 after this one selected it as a candidate
+        with patch(
+            "database_helpers.iter_users_due_for_quiz",
+            return_value=iter([("U125", "T125")]),
+        ):
+            schedule_next_random_quizzes({"U125": lease_until})
+            assert claim_users_due_for_quiz(10, lease_until) == []
+
+    def test_schedule_next_random_quizzes(self, make_user):
+        make_user(user_id="U130", team_id="T130")
+        make_user(user_id="U131", team_id="T130")
+        first = datetime.utcnow() + timedelta(minutes=45)
+        second = datetime.utcnow() + timedelta(hours=3)
+        schedule_next_random_quizzes({"U130": first, "U131": second})
+        assert get_user("U130").next_random_quiz_at == first
+        assert get_user("U131").next_random_quiz_at == second
 
 
 # ── get_user_access_token ─────────────────────────────────────────────────────
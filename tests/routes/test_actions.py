@@ -183,6 +183,37 @@ class TestNextQuizAction:
                 )
         assert resp.status_code == 200
 
+    def test_next_quiz_keeps_button_when_queue_is_full(self, flask_client, make_user):
+        make_user(user_id="U001", team_id="T001")
+        message = {"ts": "111.222", "blocks": []}
+        mock_client = MagicMock()
+        with (
+            patch("app.get_slack_client", return_value=mock_client),
+            patch("app.background_tasks") as background_tasks,
+        ):
+            background_tasks.submit.return_value = None
+            background_tasks.in_flight.return_value = False
+            resp = _post_action(flask_client, action_id="next_quiz", message=message)
+
+        assert resp.status_code == 200
+        mock_client.chat_update.assert_not_called()
+        assert "busy" in mock_client.chat_postEphemeral.call_args.kwargs["text"]
+
+    def test_next_quiz_already_in_flight_disables_button(self, flask_client, make_user):
+        make_user(user_id="U001", team_id="T001")
+        message = {"ts": "111.222", "blocks": []}
+        mock_client = MagicMock()
+        with (
+            patch("app.get_slack_client", return_value=mock_client),
+            patch("app.background_tasks") as background_tasks,
+        ):
+            background_tasks.submit.return_value = None
+            background_tasks.in_flight.return_value = True
+            _post_action(flask_client, action_id="next_quiz", message=message)
+
+        mock_client.chat_postEphemeral.assert_not_called()
+        mock_client.chat_update.assert_called_once()
+
 
 # ── start_quiz_home ───────────────────────────────────────────────────────────
 
@@ -199,6 +230,49 @@ class TestStartQuizHomeAction:
                     )
         assert resp.status_code == 200
 
+    def test_start_quiz_home_shares_dedupe_key_with_next_quiz(self, flask_client, make_user):
+        make_user(user_id="U001", team_id="T001")
+        with (
+            patch("app.get_slack_client", return_value=MagicMock()),
+            patch("app.background_tasks") as background_tasks,
+            patch("app.publish_home_view"),
+        ):
+            _post_action(flask_client, action_id="start_quiz_home", user_id="U001", team_id="T001")
+        assert background_tasks.submit.call_args.kwargs["key"] == ("send_quiz", "U001")
+
+    def test_start_quiz_home_tells_user_when_queue_is_full(self, flask_client, make_user):
+        make_user(user_id="U001", team_id="T001")
+        mock_client = MagicMock()
+        with (
+            patch("app.get_slack_client", return_value=mock_client),
+            patch("app.background_tasks") as background_tasks,
+            patch("app.publish_home_view"),
+        ):
+            background_tasks.submit.return_value = None
+            background_tasks.in_flight.return_value = False
+            resp = _post_action(
+                flask_client, action_id="start_quiz_home", user_id="U001", team_id="T001"
+            )
+
+        assert resp.status_code == 200
+        kwargs = mock_client.chat_postMessage.call_args.kwargs
+        assert kwargs["channel"] == "U001"
+        assert "busy" in kwargs["text"]
+
+    def test_start_quiz_home_already_in_flight_is_quiet(self, flask_client, make_user):
+        make_user(user_id="U001", team_id="T001")
+        mock_client = MagicMock()
+        with (
+            patch("app.get_slack_client", return_value=mock_client),
+            patch("app.background_tasks") as background_tasks,
+            patch("app.publish_home_view"),
+        ):
+            background_tasks.submit.return_value = None
+            background_tasks.in_flight.return_value = True
+            _post_action(flask_client, action_id="start_quiz_home", user_id="U001", team_id="T001")
+
+        mock_client.chat_postMessage.assert_not_called()
+
 
 # ── toggle_opt_in_home ────────────────────────────────────────────────────────
 
@@ -97,6 +97,31 @@ class TestCommandWipeAllScores:
         with patch("app.is_user_workspace_admin", return_value=True):
             resp = _cmd(flask_client, text="wipe-all-scores", user_id="UADMIN")
         assert resp.status_code == 200
+        assert b"Wiping all scores" in resp.data
+
+    def test_wipe_not_claimed_when_queue_is_full(self, flask_client, make_user):
+        make_user(user_id="UADMIN")
+        with (
+            patch("app.is_user_workspace_admin", return_value=True),
+            patch("app.background_tasks") as background_tasks,
+        ):
+            background_tasks.submit.return_value = None
+            background_tasks.in_flight.return_value = False
+            resp = _cmd(flask_client, text="wipe-all-scores", user_id="UADMIN")
+        assert resp.status_code == 200
+        assert b"no scores were wiped" in resp.data
+        assert b"Wiping all scores" not in resp.data
+
+    def test_wipe_already_in_progress(self, flask_client, make_user):
+        make_user(user_id="UADMIN")
+        with (
+            patch("app.is_user_workspace_admin", return_value=True),
+            patch("app.background_tasks") as background_tasks,
+        ):
+            background_tasks.submit.return_value = None
+            background_tasks.in_flight.return_value = True
+            resp = _cmd(flask_client, text="wipe-all-scores", user_id="UADMIN")
+        assert b"already in progress" in resp.data
 
 
 # ── reset-score command ───────────────────────────────────────────────────────
@@ -234,6 +259,18 @@ class TestLeaderboardBlocks:
         ]
         assert any("Alice" in t for t in section_texts)
 
+    def test_team_leaderboard_reads_precomputed_entries(self):
+        from leaderboard import get_leaderboard_blocks
+
+        sample = [("Alice", 80.0, "http://img", 100, 10, 3)]
+        with patch("leaderboard.get_team_leaderboard", return_value=sample) as mock_team:
+            with patch("leaderboard.get_top_scores") as mock_global:
+                blocks = get_leaderboard_blocks("T001")
+        mock_global.assert_not_called()
+        assert {c.args[1] for c in mock_team.call_args_list} == {"day", "week", "all"}
+        assert all(c.args[0] == "T001" for c in mock_team.call_args_list)
+        assert any("Alice" in b.get("text", {}).get("text", "") for b in blocks)
+
 
 # ── game_manager generate_quiz_data ──────────────────────────────────────────
 
@@ -277,7 +314,7 @@ class TestFetchAndStoreUsers:
         from utils import fetch_and_store_users
 
         # Should return without calling Slack
-        with patch("utils.fetch_users") as mock_fetch:
+        with patch("utils.iter_user_pages") as mock_fetch:
             fetch_and_store_users("T001", update_existing=False)
         mock_fetch.assert_not_called()
 
@@ -295,9 +332,27 @@ class TestFetchAndStoreUsers:
         ]
         from utils import fetch_and_store_users
 
-        with patch("utils.fetch_users", return_value=fake_users):
+        with patch("utils.iter_user_pages", return_value=iter([fake_users])):
             fetch_and_store_users("T001", update_existing=True)
 
+    def test_syncs_each_page_in_one_batch(self, make_workspace):
+        make_workspace(team_id="T001")
+        fake_users = [
+            {"id": "U001", "real_name": "Alice", "profile": {"image_512": "http://a.jpg"}},
+            {"id": "UBOT", "real_name": "Bot", "is_bot": True, "profile": {}},
+            {"id": "U002", "real_name": "Bob", "profile": {"image_192": "http://b.jpg"}},
+        ]
+        from utils import fetch_and_store_users
+
+        pages = [fake_users[:2], fake_users[2:]]
+        with patch("utils.iter_user_pages", return_value=iter(pages)):
+            with patch("utils.sync_team_users") as mock_sync:
+                fetch_and_store_users("T001", update_existing=True)
+        assert [c.args for c in mock_sync.call_args_list] == [
+            ("T001", [("U001", "Alice", "http://a.jpg")]),
+            ("T001", [("U002", "Bob", "http://b.jpg")]),
+        ]
+
     def test_raises_when_no_team_id(self):
         from utils import fetch_and_store_users
 
@@ -29,6 +29,30 @@ class TestIndex:
         assert b"FaceSinq" in resp.data
 
 
+class TestMetrics:
+    def test_metrics_reports_cache_stats(self, flask_client):
+        with patch("app.METRICS_TOKEN", "s3cret"):
+            resp = flask_client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert data["prepared_quizzes"]["size"] == 0
+        assert "queue_wait_avg" in data["background_tasks"]
+        assert "hit_rate" in data["leaderboard_cache"]
+        assert "hits" in data["decrypt_cache"]
+        assert data["score_history_buffer"]["dropped"] == 0
+
+    def test_metrics_requires_the_token(self, flask_client):
+        with patch("app.METRICS_TOKEN", "s3cret"):
+            assert flask_client.get("/metrics").status_code == 401
+            resp = flask_client.get("/metrics", headers={"Authorization": "Bearer nope"})
+            assert resp.status_code == 401
+
+    def test_metrics_disabled_without_a_token(self, flask_client):
+        with patch("app.METRICS_TOKEN", None):
+            resp = flask_client.get("/metrics", headers={"Authorization": "Bearer "})
+        assert resp.status_code == 404
+
+
 # ── signature rejection ───────────────────────────────────────────────────────
 
 
@@ -131,6 +155,20 @@ class TestCommandQuiz:
         assert resp.status_code == 200
         assert b"Quiz" in resp.data
 
+    def test_quiz_command_sends_as_an_interactive_call(self, flask_client):
+        from rate_limiter import in_interactive_call
+
+        seen = []
+
+        def send(user_id, team_id):
+            seen.append(in_interactive_call())
+            return True, "Quiz sent!"
+
+        with patch("app.send_quiz_to_user", side_effect=send):
+            _cmd(flask_client, text="quiz", user_id="U001")
+        assert seen == [True]
+        assert in_interactive_call() is False
+
     def test_quiz_error_returns_generic_message(self, flask_client):
         with patch("app.send_quiz_to_user", return_value=(False, "An error occurred.")):
             resp = _cmd(flask_client, text="quiz")
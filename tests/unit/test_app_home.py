@@ -55,11 +55,9 @@ class TestGetHomeView:
         all_text = str(result["blocks"])
         assert "Enabled" in all_text
 
-    def test_with_streak_master_stat(self, make_user):
+    def test_with_streak_master_stat(self, make_user, set_streak):
         make_user(user_id="U001", name="KingStreak", team_id="T001")
-        from database_helpers import update_user_streak
-
-        update_user_streak("U001", 7, None)
+        set_streak("U001", 7)
 
         from app_home import get_home_view
 
@@ -0,0 +1,93 @@
+"""Tests for avatar_cache.py and the cache-aware avatar fetch in image_utils."""
+
+import io
+import os
+from unittest.mock import MagicMock, patch
+
+from PIL import Image
+
+from avatar_cache import AvatarCache
+
+SLACK_URL = "https://avatars.slack-edge.com/avatar.jpg"
+
+
+def _jpeg_response(status=200, headers=None):
+    buf = io.BytesIO()
+    Image.new("RGB", (512, 512), color=(0, 128, 255)).save(buf, format="JPEG")
+    resp = MagicMock()
+    resp.status_code = status
+    resp.content = buf.getvalue()
+    resp.headers = headers or {}
+    return resp
+
+
+class TestAvatarCache:
+    def test_store_then_load_roundtrip(self, tmp_path):
+        cache = AvatarCache(str(tmp_path), max_bytes=10**7, max_age=60)
+        cache.store("u", Image.new("RGB", (4, 4), color=(1, 2, 3)), etag='"abc"')
+        image, meta = cache.load("u")
+        assert image.size == (4, 4)
+        assert image.getpixel((0, 0)) == (1, 2, 3)
+        assert meta["etag"] == '"abc"'
+        assert cache.is_fresh(meta)
+
+    def test_miss_returns_none(self, tmp_path):
+        cache = AvatarCache(str(tmp_path), max_bytes=10**7, max_age=60)
+        assert cache.load("missing") == (None, None)
+
+    def test_replacing_an_entry_keeps_total_accurate(self, tmp_path):
+        cache = AvatarCache(str(tmp_path), max_bytes=10**7, max_age=60)
+        for etag in ('"1"', '"2"', '"3"'):
+            cache.store("u", Image.new("RGB", (10, 10)), etag=etag)
+        cache.store("v", Image.new("RGB", (10, 10)))
+        on_disk = sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path))
+        assert cache._total_bytes == on_disk
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        entry_bytes = 10 * 10 * 3 + 150  # Pixels plus JSON sidecar
+        cache = AvatarCache(str(tmp_path), max_bytes=entry_bytes * 2 + 100, max_age=60)
+        for i, url in enumerate(("a", "b")):
+            cache.store(url, Image.new("RGB", (10, 10)))
+            pixels_path, _ = cache._paths(url)
+            os.utime(pixels_path, (1000 + i, 1000 + i))
+        cache.load("a")  # "a" becomes most recently used
+        cache.store("c", Image.new("RGB", (10, 10)))
+
+        assert cache.load("b") == (None, None)
+        assert cache.load("a")[0] is not None
+        assert cache.load("c")[0] is not None
+
+
+class TestCachedFetchImage:
+    def test_second_fetch_is_served_from_disk(self, isolated_avatar_cache):
+        from image_utils import fetch_image
+
+        with patch("image_utils.http_session.get", return_value=_jpeg_response()) as mock_get:
+            first = fetch_image(SLACK_URL)
+            second = fetch_image(SLACK_URL)
+        assert mock_get.call_count == 1
+        assert first.size == second.size == (400, 400)
+
+    def test_stale_entry_is_revalidated_with_validators(self, isolated_avatar_cache):
+        from image_utils import fetch_image
+
+        isolated_avatar_cache.max_age = 0
+        first = _jpeg_response(headers={"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024"})
+        not_modified = MagicMock(status_code=304)
+        with patch("image_utils.http_session.get", side_effect=[first, not_modified]) as mock_get:
+            fetch_image(SLACK_URL)
+            image = fetch_image(SLACK_URL)
+
+        assert image is not None
+        sent = mock_get.call_args_list[1].kwargs["headers"]
+        assert sent == {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 Jan 2024"}
+
+    def test_stale_entry_used_when_cdn_fails(self, isolated_avatar_cache):
+        from image_utils import fetch_image
+
+        isolated_avatar_cache.max_age = 0
+        with patch(
+            "image_utils.http_session.get", side_effect=[_jpeg_response(), Exception("down")]
+        ):
+            fetch_image(SLACK_URL)
+            assert fetch_image(SLACK_URL) is not None
@@ -0,0 +1,64 @@
+"""Tests for the shared background executor."""
+
+import threading
+
+import pytest
+
+from background import BackgroundExecutor
+
+
+@pytest.fixture
+def executor():
+    ex = BackgroundExecutor(max_workers=2, max_queue=3)
+    yield ex
+    ex._executor.shutdown(wait=True)
+
+
+class TestBackgroundExecutor:
+    def test_runs_task_and_records_stats(self, executor):
+        future = executor.submit(lambda a, b: a + b, 1, 2)
+        assert future.result(timeout=2) == 3
+
+        stats = executor.stats()
+        assert stats["submitted"] == 1
+        assert stats["completed"] == 1
+        assert stats["pending"] == 0
+        assert stats["queue_wait_max"] >= 0.0
+
+    def test_deduplicates_in_flight_keys(self, executor):
+        release = threading.Event()
+        first = executor.submit(release.wait, 2, key=("send_quiz", "U001"))
+        assert executor.submit(release.wait, 2, key=("send_quiz", "U001")) is None
+        assert executor.in_flight(("send_quiz", "U001"))
+        # Other users are not affected
+        other = executor.submit(lambda: "ok", key=("send_quiz", "U002"))
+        assert other.result(timeout=2) == "ok"
+
+        release.set()
+        first.result(timeout=2)
+        assert executor.stats()["deduplicated"] == 1
+        assert not executor.in_flight(("send_quiz", "U001"))
+        # Once finished, the same key can be submitted again
+        again = executor.submit(lambda: "again", key=("send_quiz", "U001"))
+        assert again.result(timeout=2) == "again"
+
+    def test_rejects_when_queue_is_full(self, executor):
+        release = threading.Event()
+        futures = [executor.submit(release.wait, 2) for _ in range(3)]
+        assert executor.submit(release.wait, 2) is None
+        assert executor.stats()["rejected"] == 1
+
+        release.set()
+        for future in futures:
+            future.result(timeout=2)
+        assert executor.stats()["pending"] == 0
+
+    def test_failures_are_logged_and_counted(self, executor):
+        def boom():
+            raise RuntimeError("boom")
+
+        executor.submit(boom, key="boom").result(timeout=2)
+        stats = executor.stats()
+        assert stats["failed"] == 1
+        assert stats["completed"] == 1
+        assert executor.submit(lambda: 1, key="boom").result(timeout=2) == 1
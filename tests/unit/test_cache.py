@@ -0,0 +1,105 @@
+"""Unit tests for cache.py — TTL cache behaviour and leaderboard invalidation."""
+
+from unittest.mock import patch
+
+from cache import TTLCache, invalidate_leaderboard_cache, leaderboard_cache
+
+
+class TestTTLCache:
+    def test_set_then_get_is_a_hit(self):
+        cache = TTLCache(ttl=60)
+        cache.set("k", [1])
+        assert cache.get("k") == [1]
+        assert cache.stats()["hits"] == 1
+
+    def test_missing_key_is_a_miss(self):
+        cache = TTLCache(ttl=60)
+        assert cache.get("nope") is None
+        assert cache.stats()["misses"] == 1
+
+    def test_expired_entry_is_a_miss(self):
+        cache = TTLCache(ttl=10)
+        with patch("cache.time.monotonic", return_value=100.0):
+            cache.set("k", "v")
+        with patch("cache.time.monotonic", return_value=111.0):
+            assert cache.get("k") is None
+        assert cache.stats()["size"] == 0
+
+    def test_zero_ttl_disables_caching(self):
+        cache = TTLCache(ttl=0)
+        cache.set("k", "v")
+        assert cache.get("k") is None
+
+    def test_hit_rate(self):
+        cache = TTLCache(ttl=60)
+        cache.set("k", "v")
+        cache.get("k")
+        cache.get("k")
+        cache.get("other")
+        assert abs(cache.stats()["hit_rate"] - 2 / 3) < 1e-9
+
+    def test_maxsize_evicts_least_recently_used(self):
+        cache = TTLCache(ttl=60, maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "a" becomes most recently used
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        stats = cache.stats()
+        assert stats["size"] == 2
+        assert stats["evictions"] == 1
+
+    def test_invalidate_with_predicate(self):
+        cache = TTLCache(ttl=60)
+        cache.set(("T1", "day"), 1)
+        cache.set(("T2", "day"), 2)
+        cache.invalidate(lambda key: key[0] == "T1")
+        assert cache.get(("T1", "day")) is None
+        assert cache.get(("T2", "day")) == 2
+
+
+class TestInvalidateLeaderboardCache:
+    def test_team_invalidation_keeps_other_teams(self):
+        leaderboard_cache.set(("T1", "day"), 1)
+        leaderboard_cache.set(("T2", "day"), 2)
+        leaderboard_cache.set((None, "day"), 3)
+        invalidate_leaderboard_cache("T1")
+        assert leaderboard_cache.get(("T1", "day")) is None
+        assert leaderboard_cache.get((None, "day")) is None
+        assert leaderboard_cache.get(("T2", "day")) == 2
+
+    def test_update_score_invalidates_team_leaderboard(self, make_user):
+        from database_helpers import update_score
+        from leaderboard import get_leaderboard_blocks
+
+        make_user(user_id="U001", name="Alice", team_id="T001")
+        first = get_leaderboard_blocks("T001")
+        assert get_leaderboard_blocks("T001") == first  # served from cache
+
+        update_score("U001", 10, is_correct=True)
+        texts = [b.get("text", {}).get("text", "") for b in get_leaderboard_blocks("T001")]
+        assert any("Alice" in t for t in texts)
+
+    def test_wipe_all_scores_clears_cache(self):
+        from database_helpers import wipe_all_scores
+
+        leaderboard_cache.set(("T1", "all"), [])
+        wipe_all_scores()
+        assert leaderboard_cache.stats()["size"] == 0
+
+
+class TestGridFileKey:
+    def test_depends_on_team_order_and_avatars(self):
+        from types import SimpleNamespace
+
+        from cache import grid_file_key
+
+        a = SimpleNamespace(id="U1", image="https://a")
+        b = SimpleNamespace(id="U2", image="https://b")
+        assert grid_file_key("T1", [a, b]) == grid_file_key("T1", [a, b])
+        assert grid_file_key("T1", [a, b]) != grid_file_key("T1", [b, a])
+        assert grid_file_key("T1", [a, b]) != grid_file_key("T2", [a, b])
+        changed = SimpleNamespace(id="U2", image="https://b2")
+        assert grid_file_key("T1", [a, b]) != grid_file_key("T1", [a, changed])
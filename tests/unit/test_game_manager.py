@@ -8,28 +8,32 @@ class TestPrepareNextQuiz:
         for i in range(5):
             make_user(user_id=f"U{i:03d}", name=f"Person{i}", team_id="T001")
 
-        from game_manager import PENDING_QUIZZES, prepare_next_quiz
+        from game_manager import prepare_next_quiz
+        from quiz_store import prepared_quizzes
 
-        PENDING_QUIZZES.pop("U000", None)
         prepare_next_quiz("U000", "T001")
-        assert "U000" in PENDING_QUIZZES
-        PENDING_QUIZZES.pop("U000", None)
+        assert prepared_quizzes.count("U000") == 1
+
+        # Already topped up: nothing more is generated
+        with patch("game_manager.generate_quiz_data") as generate:
+            prepare_next_quiz("U000", "T001")
+        generate.assert_not_called()
 
     def test_no_entry_when_not_enough_colleagues(self, make_user):
         make_user(user_id="U001", team_id="T001")
 
-        from game_manager import PENDING_QUIZZES, prepare_next_quiz
+        from game_manager import prepare_next_quiz
+        from quiz_store import prepared_quizzes
 
-        PENDING_QUIZZES.pop("U001", None)
         prepare_next_quiz("U001", "T001")
-        assert "U001" not in PENDING_QUIZZES
+        assert prepared_quizzes.count("U001") == 0
 
     def test_no_entry_for_unknown_user(self):
-        from game_manager import PENDING_QUIZZES, prepare_next_quiz
+        from game_manager import prepare_next_quiz
+        from quiz_store import prepared_quizzes
 
-        PENDING_QUIZZES.pop("UNOPE", None)
         prepare_next_quiz("UNOPE", "T001")
-        assert "UNOPE" not in PENDING_QUIZZES
+        assert prepared_quizzes.count("UNOPE") == 0
 
 
 class TestSendQuizToUser:
@@ -73,18 +77,22 @@ class TestSendQuizToUser:
         for i in range(5):
             make_user(user_id=f"U{i:03d}", name=f"Person{i}", team_id="T001")
 
-        from game_manager import PENDING_QUIZZES, generate_quiz_data, send_quiz_to_user
+        from game_manager import generate_quiz_data, send_quiz_to_user
+        from quiz_store import prepared_quizzes
 
         quiz_data = generate_quiz_data("U000", "T001")
         assert quiz_data is not None
-        PENDING_QUIZZES["U000"] = quiz_data
+        prepared_quizzes.push("U000", "T001", quiz_data)
 
         mock_client = MagicMock()
         mock_client.chat_postMessage.return_value = {"ok": True, "ts": "123.456"}
-        with patch("game_manager.get_slack_client", return_value=mock_client):
+        with (
+            patch("game_manager.get_slack_client", return_value=mock_client),
+            patch("game_manager.prepare_next_quiz"),
+        ):
             success, msg = send_quiz_to_user("U000", "T001")
         assert success is True
-        assert "U000" not in PENDING_QUIZZES
+        assert prepared_quizzes.count("U000") == 0
 
 
 class TestSendQuizHardMode:
@@ -100,12 +108,51 @@ class TestSendQuizHardMode:
 
         mock_client = MagicMock()
         mock_client.chat_postMessage.return_value = {"ok": True, "ts": "123.456"}
-        mock_client.files_upload_v2.return_value = {"ok": True, "file": {"permalink": "http://x"}}
+        mock_client.files_upload_v2.return_value = {"ok": True, "file": {"id": "FGRID"}}
+        with patch("game_manager.get_slack_client", return_value=mock_client):
+            with patch("game_manager.generate_grid_image_bytes", return_value=b"fakegrid"):
+                success, msg = send_quiz_to_user("U000", "T001")
+        assert success is True
+
+        # The grid is uploaded unshared and embedded above the answer buttons
+        assert "channel" not in mock_client.files_upload_v2.call_args.kwargs
+        blocks = mock_client.chat_postMessage.call_args.kwargs["blocks"]
+        assert blocks[1] == {
+            "type": "image",
+            "slack_file": {"id": "FGRID"},
+            "alt_text": "Four colleagues, numbered 1 to 4",
+        }
+        assert blocks[2]["block_id"] == "answer_buttons"
+
+    def test_hard_mode_shares_grid_when_embedding_fails(self, make_user):
+        from slack_sdk.errors import SlackApiError
+
+        for i in range(5):
+            make_user(user_id=f"U{i:03d}", name=f"Person{i}", team_id="T001")
+
+        from database_helpers import update_user_difficulty_mode
+
+        update_user_difficulty_mode("U000", "hard")
+
+        from game_manager import send_quiz_to_user
+
+        mock_client = MagicMock()
+        mock_client.conversations_open.return_value = {"channel": {"id": "D001"}}
+        mock_client.files_upload_v2.return_value = {"ok": True, "file": {"id": "FGRID"}}
+        mock_client.chat_postMessage.side_effect = [
+            SlackApiError("err", {"error": "invalid_blocks"}),
+            {"ok": True, "ts": "123.456"},
+        ]
         with patch("game_manager.get_slack_client", return_value=mock_client):
             with patch("game_manager.generate_grid_image_bytes", return_value=b"fakegrid"):
                 success, msg = send_quiz_to_user("U000", "T001")
         assert success is True
 
+        share = mock_client.files_upload_v2.call_args_list[1]
+        assert share.kwargs["channel"] == "D001"
+        blocks = mock_client.chat_postMessage.call_args.kwargs["blocks"]
+        assert all(block["type"] != "image" for block in blocks)
+
     def test_hard_mode_continues_when_grid_upload_fails(self, make_user):
         from slack_sdk.errors import SlackApiError
 
@@ -127,6 +174,138 @@ class TestSendQuizHardMode:
                 success, msg = send_quiz_to_user("U000", "T001")
         assert success is True
 
+    def test_hard_mode_without_a_grid_falls_back_to_easy_mode(self, make_user):
+        for i in range(5):
+            make_user(user_id=f"U{i:03d}", name=f"Person{i}", team_id="T001")
+
+        from database_helpers import update_user_difficulty_mode
+
+        update_user_difficulty_mode("U000", "hard")
+
+        from game_manager import send_quiz_to_user
+
+        mock_client = MagicMock()
+        mock_client.chat_postMessage.return_value = {"ok": True, "ts": "123.456"}
+        with patch("game_manager.get_slack_client", return_value=mock_client):
+            with patch("game_manager.generate_grid_image_bytes", return_value=None):
+                success, msg = send_quiz_to_user("U000", "T001")
+        assert success is True
+
+        mock_client.files_upload_v2.assert_not_called()
+        blocks = mock_client.chat_postMessage.call_args.kwargs["blocks"]
+        assert blocks[1]["type"] == "image"
+        buttons = [button["text"]["text"] for button in blocks[2]["elements"]]
+        assert all(text.startswith("Person") for text in buttons)
+
+
+class TestGridFileReuse:
+    def _send_twice(self, make_user):
+        for i in range(5):
+            make_user(user_id=f"U{i:03d}", name=f"Person{i}", team_id="T001")
+
+        from database_helpers import delete_quiz_session, update_user_difficulty_mode
+
+        update_user_difficulty_mode("U000", "hard")
+
+        from game_manager import send_quiz_to_user
+
+        mock_client = MagicMock()
+        mock_client.chat_postMessage.return_value = {"ok": True, "ts": "123.456"}
+        mock_client.files_upload_v2.return_value = {"ok": True, "file": {"id": "FGRID"}}
+        # Same correct answer and option order every time
+        with (
+            patch("game_manager.get_slack_client", return_value=mock_client),
+            patch("game_manager.prepare_next_quiz"),
+            patch("game_manager.random.choice", side_effect=lambda seq: seq[0]),
+            patch("game_manager.random.sample", side_effect=lambda seq, k: seq[:k]),
+            patch("game_manager.random.shuffle"),
+            patch("game_manager.generate_grid_image_bytes", return_value=b"fakegrid") as render,
+        ):
+            send_quiz_to_user("U000", "T001")
+            delete_quiz_session("U000")
+            send_quiz_to_user("U000", "T001")
+        return mock_client, render
+
+    def test_identical_grid_is_rendered_and_uploaded_once(self, make_user):
+        mock_client, render = self._send_twice(make_user)
+
+        render.assert_called_once()
+        mock_client.files_upload_v2.assert_called_once()
+        for call in mock_client.chat_postMessage.call_args_list:
+            assert call.kwargs["blocks"][1]["slack_file"] == {"id": "FGRID"}
+
+    def test_prepared_quiz_skips_rendering_for_uploaded_grid(self, make_user):
+        for i in range(5):
+            make_user(user_id=f"U{i:03d}", name=f"Person{i}", team_id="T001")
+
+        from cache import grid_file_cache, grid_file_key
+        from database_helpers import update_user_difficulty_mode
+        from game_manager import generate_quiz_data
+
+        update_user_difficulty_mode("U000", "hard")
+        with (
+            patch("game_manager.random.shuffle"),
+            patch("game_manager.random.choice", side_effect=lambda seq: seq[0]),
+            patch("game_manager.random.sample", side_effect=lambda seq, k: seq[:k]),
+        ):
+            first = generate_quiz_data("U000", "T001")
+            grid_file_cache.set(grid_file_key("T001", first["options"]), "FGRID")
+            with patch("game_manager.generate_grid_image_bytes") as render:
+                second = generate_quiz_data("U000", "T001")
+        render.assert_not_called()
+        assert second["grid_bytes"] is None
+
+
+class TestDmChannel:
+    def test_opens_once_then_uses_memory_and_database(self, make_user):
+        make_user(user_id="U001", team_id="T001")
+        from cache import dm_channel_cache
+        from database_helpers import get_dm_channel_id
+        from game_manager import get_dm_channel
+
+        client = MagicMock()
+        client.conversations_open.return_value = {"channel": {"id": "D001"}}
+        assert get_dm_channel(client, "U001") == "D001"
+        assert get_dm_channel(client, "U001") == "D001"
+        assert get_dm_channel_id("U001") == "D001"
+
+        # A fresh process (empty memory layer) still skips conversations_open
+        dm_channel_cache.invalidate()
+        assert get_dm_channel(client, "U001") == "D001"
+        client.conversations_open.assert_called_once()
+
+    def test_reopens_when_stored_channel_is_gone(self, make_user):
+        from slack_sdk.errors import SlackApiError
+
+        make_user(user_id="U001", team_id="T001")
+        from database_helpers import get_dm_channel_id, set_dm_channel_id
+        from game_manager import send_message_to_user
+
+        set_dm_channel_id("U001", "DSTALE")
+        client = MagicMock()
+        client.conversations_open.return_value = {"channel": {"id": "DNEW"}}
+        client.chat_postMessage.side_effect = [
+            SlackApiError("err", {"error": "channel_not_found"}),
+            {"ok": True},
+        ]
+        send_message_to_user(client, "U001", "hello")
+
+        channels = [c.kwargs["channel"] for c in client.chat_postMessage.call_args_list]
+        assert channels == ["DSTALE", "DNEW"]
+        assert get_dm_channel_id("U001") == "DNEW"
+
+    def test_other_errors_are_not_retried(self, make_user):
+        from slack_sdk.errors import SlackApiError
+
+        make_user(user_id="U001", team_id="T001")
+        from game_manager import send_message_to_user
+
+        client = MagicMock()
+        client.conversations_open.return_value = {"channel": {"id": "D001"}}
+        client.chat_postMessage.side_effect = SlackApiError("err", {"error": "not_authed"})
+        send_message_to_user(client, "U001", "hello")
+        client.chat_postMessage.assert_called_once()
+
 
 def _build_quiz_payload(correct_user_id, selected_user_id, option_user_ids, action_idx=0):
     """Build a minimal Slack quiz-response payload dict."""
@@ -209,17 +388,79 @@ class TestHandleQuizResponse:
 
         mock_client.chat_postMessage.assert_called_once()
 
-    def test_streak_increments_on_consecutive_day(self, make_user):
+    def test_database_error_asks_user_to_try_again(self, make_user):
+        from sqlalchemy.exc import OperationalError
+
+        from game_manager import handle_quiz_response
+
+        payload = _build_quiz_payload("U001", "U001", ["U001", "U002", "U003", "U004"])
+        mock_client = MagicMock()
+        with (
+            patch("game_manager.get_slack_client", return_value=mock_client),
+            patch(
+                "game_manager.record_quiz_answer",
+                side_effect=OperationalError("UPDATE", {}, Exception("database is locked")),
+            ),
+        ):
+            handle_quiz_response("U000", "U001", payload, "T001")
+
+        mock_client.chat_update.assert_not_called()
+        text = mock_client.chat_postMessage.call_args.kwargs["text"]
+        assert "try again" in text
+
+    def test_double_click_is_scored_once(self, make_user):
+        for i in range(5):
+            make_user(user_id=f"U{i:03d}", name=f"Person{i}", team_id="T001")
+
+        from database_helpers import create_or_update_quiz_session, get_user_score
+
+        create_or_update_quiz_session("U000", "U001")
+
+        from game_manager import handle_quiz_response
+
+        mock_client = MagicMock()
+        with patch("game_manager.get_slack_client", return_value=mock_client):
+            for _ in range(2):
+                payload = _build_quiz_payload("U001", "U001", [f"U{i:03d}" for i in range(1, 5)])
+                handle_quiz_response("U000", "U001", payload, "T001")
+
+        mock_client.chat_update.assert_called_once()
+        mock_client.chat_postMessage.assert_called_once()
+        assert get_user_score("U000")[1] == 1
+
+    def test_incorrect_answer_names_come_from_answer(self, make_user):
+        for i in range(5):
+            make_user(user_id=f"U{i:03d}", name=f"Person{i}", team_id="T001")
+
+        from database_helpers import create_or_update_quiz_session
+
+        create_or_update_quiz_session("U000", "U001")
+
+        from game_manager import handle_quiz_response
+
+        payload = _build_quiz_payload(
+            "U001", "U002", [f"U{i:03d}" for i in range(1, 5)], action_idx=1
+        )
+        payload["message"]["blocks"][0]["text"]["text"] = "🔥 Hard Mode: Who is this?"
+        mock_client = MagicMock()
+        with patch("game_manager.get_slack_client", return_value=mock_client):
+            handle_quiz_response("U000", "U002", payload, "T001")
+
+        text = mock_client.chat_update.call_args.kwargs["text"]
+        assert "*Person2*" in text
+        assert "*Person1*" in text
+
+    def test_streak_increments_on_consecutive_day(self, make_user, set_streak):
         from datetime import datetime, timedelta
 
         for i in range(5):
             make_user(user_id=f"U{i:03d}", name=f"Person{i}", team_id="T001")
 
-        from database_helpers import create_or_update_quiz_session, update_user_streak
+        from database_helpers import create_or_update_quiz_session
 
         # Set last_answered to yesterday
         yesterday = datetime.utcnow() - timedelta(days=1)
-        update_user_streak("U000", 3, yesterday)
+        set_streak("U000", 3, yesterday)
         create_or_update_quiz_session("U000", "U001")
 
         from database_helpers import get_user
@@ -233,17 +474,17 @@ class TestHandleQuizResponse:
         user = get_user("U000")
         assert user.current_streak == 4
 
-    def test_streak_resets_after_missed_day(self, make_user):
+    def test_streak_resets_after_missed_day(self, make_user, set_streak):
         from datetime import datetime, timedelta
 
         for i in range(5):
             make_user(user_id=f"U{i:03d}", name=f"Person{i}", team_id="T001")
 
-        from database_helpers import create_or_update_quiz_session, update_user_streak
+        from database_helpers import create_or_update_quiz_session
 
         # Last answered two days ago — missed a day
         two_days_ago = datetime.utcnow() - timedelta(days=2)
-        update_user_streak("U000", 5, two_days_ago)
+        set_streak("U000", 5, two_days_ago)
         create_or_update_quiz_session("U000", "U001")
 
         from database_helpers import get_user
@@ -277,24 +518,66 @@ class TestHandleQuizResponse:
 
 
 class TestProcessRandomQuizzes:
-    def test_no_users_due_does_not_call_send(self):
-        # get_users_due_for_quiz is imported inside process_random_quizzes, so patch there
+    def test_skips_outside_office_hours(self):
         from game_manager import process_random_quizzes
 
-        with patch("database_helpers.get_users_due_for_quiz", return_value=[]):
-            with patch("game_manager.send_quiz_to_user") as mock_send:
-                process_random_quizzes()
-        mock_send.assert_not_called()
+        with (
+            patch("game_manager._within_office_hours", return_value=False),
+            patch("database_helpers.claim_users_due_for_quiz") as claim,
+        ):
+            process_random_quizzes()
+        claim.assert_not_called()
 
-    def test_sends_quiz_to_due_users(self, make_user):
-        make_user(user_id="U001", team_id="T001")
+    def test_no_users_due_does_not_call_send(self):
+        # claim_users_due_for_quiz is imported inside process_random_quizzes, so patch there
         from game_manager import process_random_quizzes
 
-        mock_user = MagicMock()
-        mock_user.id = "U001"
-        mock_user.team_id = "T001"
+        with (
+            patch("game_manager._within_office_hours", return_value=True),
+            patch("database_helpers.claim_users_due_for_quiz", return_value=[]),
+            patch("game_manager.send_quiz_to_user") as mock_send,
+        ):
+            process_random_quizzes()
+        mock_send.assert_not_called()
 
-        with patch("database_helpers.get_users_due_for_quiz", return_value=[mock_user]):
-            with patch("game_manager.send_quiz_to_user", return_value=(True, "ok")):
-                with patch("database_helpers.update_user_quiz_schedule"):
-                    process_random_quizzes()
+    def test_sends_claimed_batches_and_reschedules(self):
+        from game_manager import process_random_quizzes, random_quiz_stats
+
+        batches = [[("U001", "T001"), ("U002", "T001")], [("U003", "T002")]]
+        with (
+            patch("game_manager._within_office_hours", return_value=True),
+            patch("game_manager.RANDOM_QUIZ_BATCH_SIZE", 2),
+            patch("database_helpers.claim_users_due_for_quiz", side_effect=batches) as claim,
+            patch("database_helpers.schedule_next_random_quizzes") as schedule,
+            patch(
+                "game_manager.send_quiz_to_user",
+                side_effect=lambda uid, tid: (uid != "U002", "ok"),
+            ) as mock_send,
+        ):
+            process_random_quizzes()
+
+        # A short batch means nobody else is due: no third claim
+        assert claim.call_count == 2
+        assert {c.args for c in mock_send.call_args_list} == {
+            ("U001", "T001"),
+            ("U002", "T001"),
+            ("U003", "T002"),
+        }
+        # Failed sends are rescheduled too
+        scheduled = [set(c.args[0]) for c in schedule.call_args_list]
+        assert scheduled == [{"U001", "U002"}, {"U003"}]
+        assert random_quiz_stats["claimed"] == 3
+        assert random_quiz_stats["sent"] == 2
+        assert random_quiz_stats["failed"] == 1
+
+    def test_send_errors_count_as_failures(self):
+        from game_manager import process_random_quizzes, random_quiz_stats
+
+        with (
+            patch("game_manager._within_office_hours", return_value=True),
+            patch("database_helpers.claim_users_due_for_quiz", return_value=[("U001", "T001")]),
+            patch("database_helpers.schedule_next_random_quizzes"),
+            patch("game_manager.send_quiz_to_user", side_effect=RuntimeError("boom")),
+        ):
+            process_random_quizzes()
+        assert random_quiz_stats["failed"] == 1
@@ -0,0 +1,117 @@
+"""Tests for the score_history write-behind buffer."""
+
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.exc import SQLAlchemyError
+
+from db import Session
+from history_buffer import HistoryBuffer
+from models import ScoreHistory
+
+
+def _row(user_id="U001", points=10):
+    return {
+        "user_id": user_id,
+        "score": points,
+        "is_correct": True,
+        "created_at": datetime.utcnow(),
+    }
+
+
+def _history_count():
+    with Session() as session:
+        return session.query(ScoreHistory).count()
+
+
+@pytest.fixture
+def buffer():
+    buf = HistoryBuffer(batch_size=3, flush_interval=60, max_queue=5)
+    yield buf
+    buf.close()
+
+
+class TestHistoryBuffer:
+    def test_disabled_without_flush_interval(self):
+        assert HistoryBuffer(batch_size=3, flush_interval=0, max_queue=5).enabled is False
+
+    def test_flush_bulk_inserts_in_batches(self, buffer, make_user):
+        make_user(user_id="U001")
+        for _ in range(4):
+            assert buffer.add(_row())
+
+        assert buffer.flush() == 4
+        assert _history_count() == 4
+        stats = buffer.stats()
+        assert stats["flushes"] == 2
+        assert stats["pending"] == 0
+        assert stats["lag_seconds"] == 0.0
+
+    def test_full_batch_wakes_flush_thread(self, make_user):
+        make_user(user_id="U001")
+        buf = HistoryBuffer(batch_size=2, flush_interval=60, max_queue=5)
+        flushed = []
+        with patch.object(buf, "flush", side_effect=lambda: flushed.append(1)):
+            buf.add(_row())
+            buf.add(_row())
+            for _ in range(100):
+                if flushed:
+                    break
+                buf._stopped.wait(0.01)
+        buf.close()
+        assert flushed
+        assert _history_count() == 2
+
+    def test_drops_rows_when_full(self, buffer):
+        for _ in range(5):
+            assert buffer.add(_row())
+        assert buffer.add(_row()) is False
+        stats = buffer.stats()
+        assert stats["dropped"] == 1
+        assert stats["pending"] == 5
+        assert stats["lag_seconds"] >= 0.0
+
+    def test_failed_flush_counts_dropped_rows(self, buffer):
+        buffer.add(_row())
+        with patch("history_buffer.Session") as mock_session:
+            mock_session.return_value.__enter__.return_value.execute.side_effect = SQLAlchemyError(
+                "boom"
+            )
+            assert buffer.flush() == 0
+        stats = buffer.stats()
+        assert stats["failed_flushes"] == 1
+        assert stats["dropped"] == 1
+
+    def test_close_writes_pending_rows(self, make_user):
+        make_user(user_id="U001")
+        buf = HistoryBuffer(batch_size=10, flush_interval=60, max_queue=20)
+        buf.add(_row())
+        buf.close()
+        assert _history_count() == 1
+        assert buf.stats()["flushed"] == 1
+
+
+class TestBufferedScoring:
+    def test_update_score_defers_history_until_flush(self, make_user):
+        from database_helpers import get_user_score, update_score
+
+        make_user(user_id="U001")
+        buf = HistoryBuffer(batch_size=10, flush_interval=60, max_queue=20)
+        with patch("database_helpers.score_history_buffer", buf):
+            update_score("U001", 10, is_correct=True)
+            assert get_user_score("U001") == (10, 1, 1)
+            assert _history_count() == 0
+            buf.close()
+        assert _history_count() == 1
+
+    def test_delete_user_score_flushes_first(self, make_user):
+        from database_helpers import delete_user_score, update_score
+
+        make_user(user_id="U001")
+        buf = HistoryBuffer(batch_size=10, flush_interval=60, max_queue=20)
+        with patch("database_helpers.score_history_buffer", buf):
+            update_score("U001", 10, is_correct=True)
+            delete_user_score("U001")
+            buf.close()
+        assert _history_count() == 0
@@ -14,6 +14,7 @@ def _make_fake_image_response(color=(255, 0, 0), size=(100, 100)):
     mock_resp = MagicMock()
     mock_resp.status_code = 200
     mock_resp.content = buf.read()
+    mock_resp.headers = {}
     return mock_resp
 
 
@@ -63,3 +64,221 @@ class TestGenerateGridImageBytes:
         with patch("image_utils.requests.get", side_effect=responses):
             result = generate_grid_image_bytes(["http://img.jpg"] * 4)
         assert result is None or isinstance(result, bytes)
+
+
+SLACK_URL = "https://avatars.slack-edge.com/avatar.jpg"
+
+
+class TestFetchImages:
+    def test_downloads_through_shared_session(self):
+        from image_utils import fetch_images
+
+        with patch("image_utils.http_session.get", return_value=_make_fake_image_response()) as g:
+            images = fetch_images([f"{SLACK_URL}?v={i}" for i in range(4)])
+        assert g.call_count == 4
+        assert all(img is not None for img in images)
+
+    def test_blocked_and_failed_urls_become_none(self):
+        from image_utils import fetch_images
+
+        bad = MagicMock(status_code=404)
+        with patch("image_utils.http_session.get", return_value=bad):
+            images = fetch_images(["http://not-slack.example/x.jpg", SLACK_URL])
+        assert images == [None, None]
+
+    def test_downloads_run_concurrently(self):
+        import threading
+
+        from image_utils import fetch_images
+
+        barrier = threading.Barrier(4, timeout=2)
+
+        def _get(url, **kwargs):
+            barrier.wait()  # Only passes if all four downloads are in flight at once
+            return _make_fake_image_response()
+
+        with patch("image_utils.http_session.get", side_effect=_get):
+            images = fetch_images([SLACK_URL] * 4)
+        assert all(img is not None for img in images)
+
+    def test_late_images_become_placeholders(self):
+        import threading
+
+        from image_utils import fetch_images, generate_grid_image_bytes
+
+        release = threading.Event()
+
+        def _get(url, **kwargs):
+            if "slow" in url:
+                release.wait(2)
+            return _make_fake_image_response()
+
+        urls = [SLACK_URL, "https://avatars.slack-edge.com/slow.jpg"]
+        with patch("image_utils.http_session.get", side_effect=_get):
+            images = fetch_images(urls, deadline=0.2)
+            release.set()
+        assert images[0] is not None
+        assert images[1] is None
+
+        with patch("image_utils.fetch_images", return_value=[None] * 4):
+            assert isinstance(generate_grid_image_bytes([SLACK_URL] * 4), bytes)
+
+
+class TestComposeGrid:
+    def test_label_sprites_are_prerendered(self):
+        from image_utils import LABEL_SPRITES
+
+        assert len(LABEL_SPRITES) == 4
+        for sprite in LABEL_SPRITES:
+            assert sprite.mode == "RGBA"
+            # Outline pixels are opaque, the background stays transparent
+            assert sprite.getextrema()[3] == (0, 255)
+
+    def test_composites_labels_without_loading_fonts(self):
+        from image_utils import TILE_SIZE, compose_grid
+
+        tile = Image.new("RGB", TILE_SIZE, (255, 255, 255))
+        with patch("image_utils.ImageFont.load_default") as load_default:
+            grid = compose_grid([tile] * 4)
+        load_default.assert_not_called()
+
+        assert grid.size == (TILE_SIZE[0] * 2, TILE_SIZE[1] * 2)
+        # The label area of the first tile is no longer plain white
+        label_box = grid.crop((0, 0, 80, 100))
+        assert label_box.getcolors(10000) != [(80 * 100, (255, 255, 255))]
+
+    def test_missing_tile_becomes_placeholder(self):
+        from image_utils import TILE_SIZE, compose_grid
+
+        tile = Image.new("RGB", TILE_SIZE, (255, 255, 255))
+        grid = compose_grid([tile, tile, None, tile])
+        assert grid.getpixel((TILE_SIZE[0] - 5, TILE_SIZE[1] * 2 - 5)) == (128, 128, 128)
+
+
+class TestDecodeThumbnail:
+    def _encode(self, size, fmt):
+        buf = io.BytesIO()
+        Image.new("RGB", size, (0, 128, 255)).save(buf, format=fmt)
+        return buf.getvalue()
+
+    def test_large_jpeg_uses_draft_decoding(self):
+        from PIL import JpegImagePlugin
+
+        from image_utils import TILE_SIZE, decode_thumbnail
+
+        original = JpegImagePlugin.JpegImageFile.draft
+        with patch.object(
+            JpegImagePlugin.JpegImageFile, "draft", autospec=True, side_effect=original
+        ) as draft:
+            thumb = decode_thumbnail(self._encode((1600, 1600), "JPEG"))
+        draft.assert_called_once()
+        assert draft.call_args.args[1:] == ("RGB", TILE_SIZE)
+        assert thumb.size == TILE_SIZE
+        assert thumb.mode == "RGB"
+
+    def test_non_jpeg_is_resized(self):
+        from image_utils import TILE_SIZE, decode_thumbnail
+
+        thumb = decode_thumbnail(self._encode((192, 192), "PNG"))
+        assert thumb.size == TILE_SIZE
+        assert thumb.mode == "RGB"
+
+
+class TestRenderGrid:
+    def _tiles(self):
+        from image_utils import TILE_SIZE
+
+        return [Image.new("RGB", TILE_SIZE, (0, 128, 255))] * 4
+
+    def test_renders_inline_by_default(self):
+        from image_utils import render_grid
+
+        with (
+            patch("image_utils.GRID_RENDER_PROCESSES", 0),
+            patch("image_utils._get_render_pool") as get_pool,
+        ):
+            result = render_grid(self._tiles())
+        get_pool.assert_not_called()
+        assert Image.open(io.BytesIO(result)).format == "JPEG"
+
+    def test_renders_in_process_pool(self):
+        import threading
+
+        import image_utils
+
+        slots = threading.BoundedSemaphore(2)
+        with (
+            patch("image_utils.GRID_RENDER_PROCESSES", 1),
+            patch("image_utils._render_slots", slots),
+            patch("image_utils._render_pool", None),
+        ):
+            try:
+                result = image_utils.render_grid(self._tiles())
+                pool = image_utils._render_pool
+                assert pool is not None
+            finally:
+                if image_utils._render_pool is not None:
+                    image_utils._render_pool.shutdown()
+
+        assert Image.open(io.BytesIO(result)).size == (800, 800)
+        # Both slots are free again once the render completed
+        assert slots.acquire(blocking=False) and slots.acquire(blocking=False)
+
+    def test_full_queue_renders_inline(self):
+        import threading
+
+        from image_utils import generate_grid_image_bytes
+
+        slots = threading.BoundedSemaphore(1)
+        slots.acquire()
+        with (
+            patch("image_utils.GRID_RENDER_PROCESSES", 1),
+            patch("image_utils.GRID_RENDER_QUEUE_TIMEOUT", 0.01),
+            patch("image_utils._render_slots", slots),
+            patch("image_utils.fetch_images", return_value=self._tiles()),
+            patch("image_utils._get_render_pool") as get_pool,
+        ):
+            result = generate_grid_image_bytes([SLACK_URL] * 4)
+        get_pool.assert_not_called()
+        assert Image.open(io.BytesIO(result)).format == "JPEG"
+
+    def test_broken_pool_is_reset_and_grid_rendered_inline(self):
+        import threading
+        from concurrent.futures import Future
+        from concurrent.futures.process import BrokenProcessPool
+
+        import image_utils
+
+        failed = Future()
+        failed.set_exception(BrokenProcessPool("worker died"))
+        pool = MagicMock()
+        pool.submit.return_value = failed
+        slots = threading.BoundedSemaphore(1)
+        with (
+            patch("image_utils.GRID_RENDER_PROCESSES", 1),
+            patch("image_utils._render_slots", slots),
+            patch("image_utils._render_pool", pool),
+        ):
+            result = image_utils.render_grid(self._tiles())
+            assert image_utils._render_pool is None
+        assert Image.open(io.BytesIO(result)).format == "JPEG"
+        pool.shutdown.assert_called_once()
+        assert slots.acquire(blocking=False)
+
+    def test_slow_render_falls_back_to_inline(self):
+        import threading
+        from concurrent.futures import Future
+
+        import image_utils
+
+        pool = MagicMock()
+        pool.submit.return_value = Future()  # Never completes
+        slots = threading.BoundedSemaphore(1)
+        with (
+            patch("image_utils.GRID_RENDER_PROCESSES", 1),
+            patch("image_utils.GRID_RENDER_TIMEOUT", 0.01),
+            patch("image_utils._render_slots", slots),
+            patch("image_utils._render_pool", pool),
+        ):
+            result = image_utils.render_grid(self._tiles())
+        assert Image.open(io.BytesIO(result)).format == "JPEG"
@@ -46,6 +46,33 @@ class TestUserEncryptionProperties:
         assert user.image_encrypted != "https://example.com/img.jpg"
 
 
+class TestProfileDigest:
+    def test_digest_is_stable_for_same_profile(self):
+        from models import profile_digest
+
+        assert profile_digest("Alice", "http://a") == profile_digest("Alice", "http://a")
+
+    def test_digest_changes_with_any_field(self):
+        from models import profile_digest
+
+        base = profile_digest("Alice", "http://a")
+        assert profile_digest("Alicia", "http://a") != base
+        assert profile_digest("Alice", "http://b") != base
+
+    def test_digest_is_not_plain_sha256(self):
+        import hashlib
+
+        from models import profile_digest
+
+        assert profile_digest("Alice", "") != hashlib.sha256(b"Alice\x1f").hexdigest()
+
+    def test_set_profile_stores_digest(self, make_user):
+        from models import profile_digest
+
+        user = make_user(name="Alice", image="http://a")
+        assert user.profile_digest == profile_digest("Alice", "http://a")
+
+
 class TestUserDefaults:
     def test_opted_in_defaults_false(self, make_user):
         user = make_user()
@@ -58,3 +85,42 @@ class TestUserDefaults:
     def test_repr_includes_name(self, make_user):
         user = make_user(name="Carol")
         assert "Carol" in repr(user)
+
+
+class TestDecryptCache:
+    def test_repeat_decrypt_is_a_cache_hit(self):
+        from models import decrypt_cache
+
+        enc = encrypt_value("Cached Name")
+        decrypt_cache.clear()
+        assert decrypt_value(enc) == "Cached Name"
+        assert decrypt_value(enc) == "Cached Name"
+        stats = decrypt_cache.stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 1
+
+    def test_lru_eviction_drops_oldest_entry(self):
+        from models import DecryptCache
+
+        cache = DecryptCache(maxsize=2)
+        cache.put("a", "1")
+        cache.put("b", "2")
+        cache.get("a")  # "a" becomes most recently used
+        cache.put("c", "3")
+        assert cache.get("b") is None
+        assert cache.get("a") == "1"
+        assert cache.get("c") == "3"
+        assert cache.stats()["size"] == 2
+
+    def test_zero_size_disables_caching(self):
+        from models import DecryptCache
+
+        cache = DecryptCache(maxsize=0)
+        cache.put("a", "1")
+        assert cache.get("a") is None
+
+    def test_stats_helper_exposes_counters(self):
+        from models import get_decrypt_cache_stats
+
+        stats = get_decrypt_cache_stats()
+        assert {"hits", "misses", "size", "maxsize"} <= stats.keys()
@@ -0,0 +1,187 @@
+"""Tests for the persistent prepared-quiz store."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def team(make_user):
+    for i in range(6):
+        make_user(user_id=f"U{i:03d}", name=f"Person{i}", team_id="T001")
+
+
+def _quiz(correct="U001", options=("U001", "U002", "U003", "U004"), grid=None):
+    from database_helpers import get_user
+
+    difficulty = "hard" if grid else "easy"
+    return {
+        "correct_choice": get_user(correct),
+        "options": [get_user(uid) for uid in options],
+        "grid_bytes": grid,
+        "difficulty": difficulty,
+    }
+
+
+def _store(**kwargs):
+    from quiz_store import PreparedQuizStore, prepared_quizzes
+
+    defaults = {"per_user": 2, "ttl": 3600, "max_rows": 100, "grid_dir": prepared_quizzes.grid_dir}
+    return PreparedQuizStore(**{**defaults, **kwargs})
+
+
+class TestPushAndPop:
+    def test_round_trips_ids_and_grid(self, team):
+        store = _store()
+        assert store.push("U000", "T001", _quiz(grid=b"jpeg-bytes"))
+
+        quiz = store.pop("U000")
+        assert quiz["correct_choice"].id == "U001"
+        assert quiz["correct_choice"].name == "Person1"
+        assert [o.id for o in quiz["options"]] == ["U001", "U002", "U003", "U004"]
+        assert quiz["grid_bytes"] == b"jpeg-bytes"
+        assert quiz["difficulty"] == "hard"
+        assert store.pop("U000") is None
+        assert (store.hits, store.misses, store.stored) == (1, 1, 1)
+
+    def test_grid_is_kept_on_disk_until_popped(self, team, isolated_grid_dir):
+        import os
+
+        from db import Session
+        from models import PreparedQuiz
+
+        store = _store()
+        store.push("U000", "T001", _quiz(grid=b"jpeg-bytes"))
+        with Session() as session:
+            grid_file = session.query(PreparedQuiz.grid_file).scalar()
+        assert os.listdir(isolated_grid_dir) == [grid_file]
+
+        assert store.pop("U000")["grid_bytes"] == b"jpeg-bytes"
+        assert os.listdir(isolated_grid_dir) == []
+
+    def test_missing_grid_file_pops_without_grid(self, team, isolated_grid_dir):
+        import os
+
+        store = _store()
+        store.push("U000", "T001", _quiz(grid=b"jpeg-bytes"))
+        for name in os.listdir(isolated_grid_dir):
+            os.remove(os.path.join(isolated_grid_dir, name))
+
+        quiz = store.pop("U000")
+        assert quiz["grid_bytes"] is None
+        assert quiz["difficulty"] == "hard"
+
+    def test_pops_oldest_first(self, team):
+        store = _store()
+        store.push("U000", "T001", _quiz(correct="U001"))
+        store.push("U000", "T001", _quiz(correct="U002"))
+        assert store.pop("U000")["correct_choice"].id == "U001"
+        assert store.pop("U000")["correct_choice"].id == "U002"
+
+    def test_keeps_at_most_per_user(self, team):
+        store = _store(per_user=2)
+        for correct in ("U001", "U002", "U003"):
+            store.push("U000", "T001", _quiz(correct=correct))
+        assert store.count("U000") == 2
+        assert store.evicted == 1
+        assert store.pop("U000")["correct_choice"].id == "U002"
+
+    def test_expired_quiz_is_not_served(self, team):
+        from db import Session
+        from models import PreparedQuiz
+
+        store = _store(ttl=60)
+        store.push("U000", "T001", _quiz())
+        with Session() as session:
+            session.query(PreparedQuiz).update(
+                {PreparedQuiz.created_at: datetime.utcnow() - timedelta(seconds=120)}
+            )
+            session.commit()
+
+        assert store.count("U000") == 0
+        assert store.pop("U000") is None
+        assert store.evicted == 1
+
+    def test_discards_quiz_when_option_user_is_gone(self, team):
+        from db import Session
+        from models import User
+
+        store = _store()
+        store.push("U000", "T001", _quiz())
+        with Session() as session:
+            session.query(User).filter_by(id="U003").delete()
+            session.commit()
+
+        assert store.pop("U000") is None
+        assert store.count("U000") == 0
+
+
+class TestEviction:
+    def test_prune_drops_expired_and_overflow(self, team):
+        from db import Session
+        from models import PreparedQuiz
+
+        store = _store(per_user=5, max_rows=2)
+        for user_id in ("U000", "U005", "U005", "U005"):
+            store.push(user_id, "T001", _quiz())
+        with Session() as session:
+            session.query(PreparedQuiz).filter_by(user_id="U000").update(
+                {PreparedQuiz.created_at: datetime.utcnow() - timedelta(days=2)}
+            )
+            session.commit()
+
+        assert store.prune() == 2
+        assert store.count("U000") == 0
+        assert store.count("U005") == 2
+
+    def test_evicted_quizzes_take_their_grids_with_them(self, team, isolated_grid_dir):
+        import os
+
+        store = _store(per_user=1)
+        store.push("U000", "T001", _quiz(grid=b"first"))
+        store.push("U000", "T001", _quiz(grid=b"second"))
+        assert len(os.listdir(isolated_grid_dir)) == 1
+
+        assert store.discard("U000") == 1
+        assert os.listdir(isolated_grid_dir) == []
+
+    def test_prune_removes_orphaned_grids(self, team, isolated_grid_dir):
+        import os
+        import time
+
+        store = _store(ttl=60)
+        store.push("U000", "T001", _quiz(grid=b"live"))
+        os.makedirs(isolated_grid_dir, exist_ok=True)
+        orphan = os.path.join(isolated_grid_dir, "orphan.jpg")
+        with open(orphan, "wb") as f:
+            f.write(b"left behind")
+        os.utime(orphan, (time.time() - 120, time.time() - 120))
+
+        store.prune()
+        assert not os.path.exists(orphan)
+        assert store.pop("U000")["grid_bytes"] == b"live"
+
+    def test_discard_user(self, team):
+        store = _store()
+        store.push("U000", "T001", _quiz())
+        store.push("U005", "T001", _quiz())
+        assert store.discard("U000") == 1
+        assert store.count("U005") == 1
+
+    def test_difficulty_change_drops_prepared_quizzes(self, team):
+        from database_helpers import update_user_difficulty_mode
+        from quiz_store import prepared_quizzes
+
+        prepared_quizzes.push("U000", "T001", _quiz())
+        update_user_difficulty_mode("U000", "easy")
+        assert prepared_quizzes.count("U000") == 1
+        update_user_difficulty_mode("U000", "hard")
+        assert prepared_quizzes.count("U000") == 0
+
+    def test_stats(self, team):
+        store = _store()
+        store.push("U000", "T001", _quiz())
+        stats = store.stats()
+        assert stats["size"] == 1
+        assert stats["stored"] == 1
+        assert stats["hit_rate"] == 0.0
@@ -0,0 +1,114 @@
+"""Tests for the per-workspace Slack rate limiter."""
+
+from unittest.mock import patch
+
+from rate_limiter import SlackRateLimiter, TokenBucket, in_interactive_call, interactive_calls
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _patched_clock():
+    clock = FakeClock()
+    return clock, (
+        patch("rate_limiter.time.monotonic", clock.monotonic),
+        patch("rate_limiter.time.sleep", clock.sleep),
+    )
+
+
+class TestTokenBucket:
+    def test_burst_then_paced(self):
+        clock, (mono, sleep) = _patched_clock()
+        with mono, sleep:
+            bucket = TokenBucket(rate=2, capacity=3)
+            waits = [bucket.acquire() for _ in range(5)]
+        assert waits[:3] == [0.0, 0.0, 0.0]
+        assert waits[3] == 0.5
+        assert waits[4] == 0.5
+
+    def test_pause_blocks_until_retry_after(self):
+        clock, (mono, sleep) = _patched_clock()
+        with mono, sleep:
+            bucket = TokenBucket(rate=10, capacity=10)
+            bucket.pause(30)
+            waited = bucket.acquire()
+        assert waited >= 30
+        assert clock.now >= 1030
+
+    def test_max_wait_gives_up_without_taking_a_token(self):
+        clock, (mono, sleep) = _patched_clock()
+        with mono, sleep:
+            bucket = TokenBucket(rate=1, capacity=1)
+            assert bucket.acquire(max_wait=0.5) == 0.0
+            assert bucket.acquire(max_wait=0.5) is None
+            assert clock.sleeps == [0.5]
+            # The half second already waited counts towards the next token
+            assert bucket.acquire() == 0.5
+
+
+class TestSlackRateLimiter:
+    def test_buckets_are_per_team_and_method(self):
+        clock, (mono, sleep) = _patched_clock()
+        with mono, sleep:
+            limiter = SlackRateLimiter({"chat.update": 60}, burst=1)
+            limiter.acquire("T1", "chat.update")
+            limiter.acquire("T2", "chat.update")
+            assert clock.sleeps == []
+            limiter.acquire("T1", "chat.update")
+        assert clock.sleeps == [1.0]
+        stats = limiter.stats()
+        assert stats["calls"] == 3
+        assert stats["throttled"] == 1
+        assert stats["buckets"] == 2
+
+    def test_max_wait_falls_through_unpaced(self):
+        clock, (mono, sleep) = _patched_clock()
+        with mono, sleep:
+            limiter = SlackRateLimiter({"views.publish": 60}, burst=1)
+            limiter.backoff("T1", "views.publish", 30)
+            assert limiter.acquire("T1", "views.publish", max_wait=0.5) is False
+        assert clock.sleeps == [0.5]
+        stats = limiter.stats()
+        assert stats["unpaced"] == 1
+        assert stats["wait_seconds"] == 0.5
+
+    def test_unlisted_methods_are_not_limited(self):
+        limiter = SlackRateLimiter({"chat.update": 60}, burst=1)
+        for _ in range(10):
+            limiter.acquire("T1", "users.info")
+        assert limiter.stats()["calls"] == 0
+
+    def test_backoff_pauses_only_that_bucket(self):
+        clock, (mono, sleep) = _patched_clock()
+        with mono, sleep:
+            limiter = SlackRateLimiter({"chat.update": 600, "views.publish": 600}, burst=1)
+            limiter.backoff("T1", "chat.update", 5)
+            limiter.acquire("T1", "views.publish")
+            assert clock.sleeps == []
+            limiter.acquire("T1", "chat.update")
+        assert sum(clock.sleeps) >= 5
+        assert limiter.stats()["rate_limited"] == 1
+
+
+class TestInteractiveCalls:
+    def test_marks_only_the_block(self):
+        assert in_interactive_call() is False
+        with interactive_calls():
+            assert in_interactive_call() is True
+        assert in_interactive_call() is False
+
+    def test_not_inherited_by_worker_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=1) as pool, interactive_calls():
+            assert pool.submit(in_interactive_call).result() is False
@@ -0,0 +1,47 @@
+"""Tests for the startup schema updates in update_db_schema.py."""
+
+from unittest.mock import MagicMock, patch
+
+from update_db_schema import COLUMNS, INDEXES, add_columns, add_indexes
+
+
+def _engine(fail_first=True):
+    """A mock engine whose first begin() block fails, like an ALTER of an existing column."""
+    engine = MagicMock()
+    connections = []
+
+    def begin():
+        connection = MagicMock()
+        if fail_first and not connections:
+            connection.execute.side_effect = Exception("column already exists")
+        connections.append(connection)
+        context = MagicMock()
+        context.__enter__.return_value = connection
+        return context
+
+    engine.begin.side_effect = begin
+    return engine, connections
+
+
+class TestAddColumns:
+    def test_each_column_runs_in_its_own_transaction(self):
+        engine, connections = _engine()
+        with patch("update_db_schema.engine", engine):
+            add_columns()
+
+        # A failing ALTER does not stop the columns after it
+        assert len(connections) == len(COLUMNS)
+        for connection, ddl in zip(connections, COLUMNS.values()):
+            assert str(connection.execute.call_args.args[0]) == ddl
+
+    def test_rerun_against_real_database_is_harmless(self):
+        add_columns()
+        add_columns()
+
+
+class TestAddIndexes:
+    def test_each_index_runs_in_its_own_transaction(self):
+        engine, connections = _engine()
+        with patch("update_db_schema.engine", engine):
+            add_indexes()
+        assert len(connections) == len(INDEXES)
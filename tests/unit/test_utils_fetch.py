@@ -5,10 +5,10 @@ from unittest.mock import MagicMock, patch
 import pytest
 
 
-class TestFetchUsers:
+class TestIterUserPages:
     def test_returns_members_list(self, make_workspace):
         make_workspace(team_id="T001", token="xoxb-token")
-        from utils import fetch_users
+        from utils import iter_user_pages
 
         mock_client = MagicMock()
         mock_client.users_list.return_value = {
@@ -16,28 +16,74 @@ class TestFetchUsers:
             "members": [{"id": "U001"}, {"id": "U002"}],
         }
         with patch("utils.WebClient", return_value=mock_client):
-            result = fetch_users("T001")
-        assert len(result) == 2
+            pages = list(iter_user_pages("T001"))
+        assert pages == [[{"id": "U001"}, {"id": "U002"}]]
 
     def test_raises_when_no_access_token(self, make_workspace):
         make_workspace(team_id="T001", token="")
-        from utils import fetch_users
+        from utils import iter_user_pages
 
-        # Patch time.sleep so tenacity's exponential backoff doesn't actually wait
+        # Patch time.sleep so a Retry-After wait would not slow the test down
         with patch("time.sleep"):
             with pytest.raises(Exception):
-                fetch_users("T001")
+                list(iter_user_pages("T001"))
 
     def test_raises_when_response_not_ok(self, make_workspace):
         make_workspace(team_id="T001", token="xoxb-token")
-        from utils import fetch_users
+        from utils import iter_user_pages
 
         mock_client = MagicMock()
         mock_client.users_list.return_value = {"ok": False, "error": "invalid_auth"}
         with patch("utils.WebClient", return_value=mock_client):
             with patch("time.sleep"):
                 with pytest.raises(Exception):
-                    fetch_users("T001")
+                    list(iter_user_pages("T001"))
+
+    def test_follows_next_cursor_until_exhausted(self, make_workspace):
+        make_workspace(team_id="T001", token="xoxb-token")
+        from utils import iter_user_pages
+
+        mock_client = MagicMock()
+        mock_client.users_list.side_effect = [
+            {"ok": True, "members": [{"id": "U001"}], "response_metadata": {"next_cursor": "c2"}},
+            {"ok": True, "members": [{"id": "U002"}], "response_metadata": {"next_cursor": ""}},
+        ]
+        with patch("utils.WebClient", return_value=mock_client):
+            pages = list(iter_user_pages("T001", page_size=1))
+        assert pages == [[{"id": "U001"}], [{"id": "U002"}]]
+        assert mock_client.users_list.call_args_list[1].kwargs == {"cursor": "c2", "limit": 1}
+
+    def test_rate_limit_waits_for_retry_after(self, make_workspace):
+        from slack_sdk.errors import SlackApiError
+
+        make_workspace(team_id="T001", token="xoxb-token")
+        from utils import iter_user_pages
+
+        rate_limited = MagicMock(status_code=429, headers={"Retry-After": "7"})
+        mock_client = MagicMock()
+        mock_client.users_list.side_effect = [
+            SlackApiError("ratelimited", rate_limited),
+            {"ok": True, "members": [{"id": "U001"}]},
+        ]
+        with patch("utils.WebClient", return_value=mock_client):
+            with patch("utils.time.sleep") as mock_sleep:
+                pages = list(iter_user_pages("T001"))
+        mock_sleep.assert_called_once_with(7)
+        assert pages == [[{"id": "U001"}]]
+
+    def test_non_rate_limit_error_is_raised(self, make_workspace):
+        from slack_sdk.errors import SlackApiError
+
+        make_workspace(team_id="T001", token="xoxb-token")
+        from utils import iter_user_pages
+
+        error_response = MagicMock(status_code=400)
+        error_response.__getitem__.return_value = "invalid_auth"
+        mock_client = MagicMock()
+        mock_client.users_list.side_effect = SlackApiError("bad", error_response)
+        with patch("utils.WebClient", return_value=mock_client):
+            with pytest.raises(SlackApiError):
+                list(iter_user_pages("T001"))
 
 
 class TestFetchAndStoreSingleUser:
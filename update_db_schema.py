@@ -8,62 +8,64 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def add_columns():
-    with engine.connect() as connection:
-        try:
-            # Add last_quiz_sent_at
-            logger.info("Adding last_quiz_sent_at column...")
-            connection.execute(text("ALTER TABLE users ADD COLUMN last_quiz_sent_at DATETIME"))
-            logger.info("Added last_quiz_sent_at column.")
-        except Exception as e:
-            logger.warning(f"Could not add last_quiz_sent_at (might already exist): {e}")
+# Columns added to tables after they were first created, in the order they were introduced.
+COLUMNS = {
+    "last_quiz_sent_at": "ALTER TABLE users ADD COLUMN last_quiz_sent_at DATETIME",
+    "next_random_quiz_at": "ALTER TABLE users ADD COLUMN next_random_quiz_at DATETIME",
+    "total_attempts": "ALTER TABLE scores ADD COLUMN total_attempts INTEGER DEFAULT 0",
+    "current_streak": "ALTER TABLE users ADD COLUMN current_streak INTEGER DEFAULT 0",
+    "last_answered_at": "ALTER TABLE users ADD COLUMN last_answered_at DATETIME",
+    "difficulty_mode": "ALTER TABLE users ADD COLUMN difficulty_mode VARCHAR DEFAULT 'easy'",
+    "profile_digest": "ALTER TABLE users ADD COLUMN profile_digest VARCHAR",
+    "dm_channel_id": "ALTER TABLE users ADD COLUMN dm_channel_id VARCHAR",
+    "grid_file": "ALTER TABLE prepared_quizzes ADD COLUMN grid_file VARCHAR",
+}
 
-        try:
-            # Add next_random_quiz_at
-            logger.info("Adding next_random_quiz_at column...")
-            connection.execute(text("ALTER TABLE users ADD COLUMN next_random_quiz_at DATETIME"))
-            logger.info("Added next_random_quiz_at column.")
-        except Exception as e:
-            logger.warning(f"Could not add next_random_quiz_at (might already exist): {e}")
 
+def add_columns():
+    for name, ddl in COLUMNS.items():
         try:
-            # Add total_attempts
-            logger.info("Adding total_attempts column...")
-            connection.execute(
-                text("ALTER TABLE scores ADD COLUMN total_attempts INTEGER DEFAULT 0")
-            )
-            logger.info("Added total_attempts column.")
+            # Each column gets its own transaction: on Postgres an ALTER for a column that
+            # already exists aborts the transaction, which would take every later one with it
+            with engine.begin() as connection:
+                logger.info(f"Adding {name} column...")
+                connection.execute(text(ddl))
+                logger.info(f"Added {name} column.")
         except Exception as e:
-            logger.warning(f"Could not add total_attempts (might already exist): {e}")
+            logger.warning(f"Could not add {name} (might already exist): {e}")
 
-        try:
-            # Add current_streak
-            logger.info("Adding current_streak column...")
-            connection.execute(
-                text("ALTER TABLE users ADD COLUMN current_streak INTEGER DEFAULT 0")
-            )
-            logger.info("Added current_streak column.")
-        except Exception as e:
-            logger.warning(f"Could not add current_streak (might already exist): {e}")
 
-        try:
-            # Add last_answered_at
-            logger.info("Adding last_answered_at column...")
-            connection.execute(text("ALTER TABLE users ADD COLUMN last_answered_at DATETIME"))
-            logger.info("Added last_answered_at column.")
-        except Exception as e:
-            logger.warning(f"Could not add last_answered_at (might already exist): {e}")
+# Indexes that create_all() will not add to tables that already exist.
+INDEXES = {
+    "ix_scores_leaderboard": (
+        "CREATE INDEX IF NOT EXISTS ix_scores_leaderboard "
+        "ON scores (score DESC) WHERE total_attempts >= 10"
+    ),
+    "ix_score_history_created_at": (
+        "CREATE INDEX IF NOT EXISTS ix_score_history_created_at ON score_history (created_at)"
+    ),
+    "ix_score_history_user_created": (
+        "CREATE INDEX IF NOT EXISTS ix_score_history_user_created "
+        "ON score_history (user_id, created_at)"
+    ),
+    "ix_users_due_quiz": (
+        "CREATE INDEX IF NOT EXISTS ix_users_due_quiz ON users (opted_in, next_random_quiz_at, id)"
+    ),
+}
+
 
+def add_indexes():
+    for name, ddl in INDEXES.items():
         try:
-            # Add difficulty_mode
-            logger.info("Adding difficulty_mode column...")
-            connection.execute(
-                text("ALTER TABLE users ADD COLUMN difficulty_mode VARCHAR DEFAULT 'easy'")
-            )
-            logger.info("Added difficulty_mode column.")
+            # Each index gets its own transaction so one failure cannot abort the rest on Postgres
+            with engine.begin() as connection:
+                logger.info(f"Adding {name} index...")
+                connection.execute(text(ddl))
+                logger.info(f"Added {name} index.")
         except Exception as e:
-            logger.warning(f"Could not add difficulty_mode (might already exist): {e}")
+            logger.warning(f"Could not add {name} index: {e}")
 
 
 if __name__ == "__main__":
     add_columns()
+    add_indexes()
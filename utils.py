@@ -2,11 +2,11 @@
 import logging
 import os
 import re
+import time
 from urllib.parse import urlparse
 
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
-from tenacity import retry, stop_after_attempt, wait_exponential
 
 from database_helpers import (
     add_or_update_user,
@@ -14,6 +14,7 @@ from database_helpers import (
     does_user_exist,
     get_all_workspaces,
     get_workspace_access_token,
+    sync_team_users,
 )
 from db import engine
 from models import Base
@@ -24,6 +25,10 @@ logger = logging.getLogger(__name__)
 SLACK_BOT_TOKEN = os.environ.get("SLACK_BOT_TOKEN")
 client = WebClient(token=SLACK_BOT_TOKEN)
 
+# users.list paging: Slack recommends no more than 200 members per page
+USERS_LIST_PAGE_SIZE = int(os.environ.get("USERS_LIST_PAGE_SIZE", "200"))
+USERS_LIST_MAX_ATTEMPTS = 5
+
 
 def extract_user_id_from_text(text):
     """Extracts the Slack user ID from the given command text."""
@@ -44,66 +49,55 @@ def extract_user_id_from_text(text):
         return None
 
 
-@retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=5, max=60))
-def fetch_users(team_id):
-    """Fetch all users for a specific Slack team."""
-    try:
-        # Use database_helpers to get the workspace access token
-        access_token = get_workspace_access_token(team_id)
-
-        if not access_token:
-            raise ValueError(f"No access token found for team_id: {team_id}")
-
-        logger.info(
-            f"Fetching users for team_id: {team_id} using access token: {access_token[:6]}..."
-        )
-
-        # Create a Slack client for this specific workspace
-        client = WebClient(token=access_token)
-
-        # Call Slack API to fetch users
-        logger.debug(f"Calling client.users_list() for team_id: {team_id}")
-        response = client.users_list()
+def _users_list_page(client, team_id, cursor, page_size):
+    """Fetch one users.list page, sleeping exactly as long as Slack's Retry-After asks."""
+    for attempt in range(1, USERS_LIST_MAX_ATTEMPTS + 1):
+        try:
+            response = client.users_list(cursor=cursor, limit=page_size)
+        except SlackApiError as e:
+            if e.response.status_code == 429 and attempt < USERS_LIST_MAX_ATTEMPTS:
+                retry_after = int(e.response.headers.get("Retry-After", 1))
+                logger.warning(f"Rate limited. Waiting for {retry_after} seconds before retrying.")
+                time.sleep(retry_after)
+                continue
+            logger.error(f"Slack API error for team_id {team_id}: {e.response['error']}")
+            raise e
 
-        # Log entire response for debugging purposes
         logger.debug(f"Slack API response for team_id {team_id}: ok={response.get('ok')}")
-
         if not response.get("ok"):
             logger.error(f"Slack API response not OK: {response}")
             raise Exception(f"Slack API response not OK: {response}")
+        return response
 
-        # Extract and return members list if the response is successful
-        members = response.get("members", [])
-        logger.info(f"Successfully fetched {len(members)} users for team_id {team_id}")
 
-        return members
+def iter_user_pages(team_id, page_size=None):
+    """Yield the members of a Slack team one users.list page at a time, following next_cursor."""
+    page_size = page_size or USERS_LIST_PAGE_SIZE
+    access_token = get_workspace_access_token(team_id)
 
-    except SlackApiError as e:
-        if e.response.status_code == 429:  # HTTP 429 Too Many Requests
-            retry_after = int(
-                e.response.headers.get("Retry-After", 20)
-            )  # Slack tells you how long to wait
-            logger.warning(f"Rate limited. Waiting for {retry_after} seconds before retrying.")
-            raise e  # Let tenacity handle the retry timing with exponential backoff
-        else:
-            # Handle other Slack API errors
-            logger.error(f"Slack API error for team_id {team_id}: {e.response['error']}")
-            raise e
+    if not access_token:
+        raise ValueError(f"No access token found for team_id: {team_id}")
 
-    except ValueError as e:
-        logger.error(f"ValueError: {str(e)}")
-        raise e
+    logger.info(f"Fetching users for team_id: {team_id} using access token: {access_token[:6]}...")
 
-    except Exception as e:
-        logger.exception(
-            f"Unexpected error occurred while fetching users for team_id {team_id}: {str(e)}"
-        )
-        raise e
+    # Create a Slack client for this specific workspace
+    client = WebClient(token=access_token)
+
+    cursor = None
+    while True:
+        logger.debug(f"Calling client.users_list() for team_id: {team_id}, cursor: {cursor}")
+        response = _users_list_page(client, team_id, cursor, page_size)
+        yield response.get("members", [])
+
+        cursor = (response.get("response_metadata") or {}).get("next_cursor")
+        if not cursor:
+            return
 
 
 def fetch_and_store_users(team_id, update_existing=False):
     """
     Fetch users from Slack and store them in the database for a specific workspace.
+    Pages are synced as they arrive, so memory use does not grow with the size of the workspace.
     """
     if not team_id:
         raise ValueError("team_id must be provided to fetch and store users.")
@@ -116,34 +110,32 @@ def fetch_and_store_users(team_id, update_existing=False):
         return
 
     try:
-        users = fetch_users(team_id)  # Fetch users from Slack using the correct team ID
-        logger.info(f"Fetched {len(users)} users from Slack for team {team_id}")
-
-        for user in users:
-            # Use the updated should_skip_user function to filter users more precisely
-            if should_skip_user(user):
-                logger.debug(
-                    f"Skipping user: {user.get('real_name', 'Unknown')} ({user.get('id')})"
+        fetched = 0
+        for users in iter_user_pages(team_id):
+            fetched += len(users)
+
+            profiles = []
+            for user in users:
+                # Use the updated should_skip_user function to filter users more precisely
+                if should_skip_user(user):
+                    logger.debug(
+                        f"Skipping user: {user.get('real_name', 'Unknown')} ({user.get('id')})"
+                    )
+                    continue
+
+                # Extract image URL with priority for higher resolution
+                profile = user.get("profile", {})
+                image = (
+                    profile.get("image_512")
+                    or profile.get("image_192")
+                    or profile.get("image_72", "")
                 )
-                continue
+                profiles.append((user.get("id"), user.get("real_name"), image))
+
+            # One query to diff the page against stored users, one transaction to write it
+            sync_team_users(team_id, profiles)
 
-            user_id = user.get("id")
-            name = user.get("real_name")
-
-            # Extract image URL with priority for higher resolution
-            profile = user.get("profile", {})
-            image = (
-                profile.get("image_512") or profile.get("image_192") or profile.get("image_72", "")
-            )
-
-            # Always use the correct team_id for updating/adding users
-            try:
-                logger.debug(f"Adding/updating user: {name} ({user_id}) for team {team_id}")
-                add_or_update_user(
-                    user_id, name, image, team_id
-                )  # Make sure `team_id` is passed correctly
-            except Exception as e:
-                logger.error(f"Failed to add/update user {user_id}: {str(e)}")
+        logger.info(f"Fetched {fetched} users from Slack for team {team_id}")
 
     except SlackApiError as e:
         logger.error(f"Failed to fetch users from Slack: {e.response['error']}")